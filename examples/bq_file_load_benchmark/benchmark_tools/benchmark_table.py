@@ -18,6 +18,7 @@ from __future__ import print_function
 import logging
 import re
 import time
+import uuid
 
 from google.api_core import exceptions
 from google.cloud import bigquery
@@ -166,9 +167,13 @@ class BenchmarkTable(object):
 
         The method creates an empty table using the schema from the staging
         table that the files were generated from. It uses the current
-        timestamp to name the benchmark table to create a random, unique name.
+        timestamp to name the benchmark table, with a random suffix so that
+        tables created concurrently within the same second have unique names.
         """
-        self.job_destination_table = '{0:d}'.format(int(time.time()))
+        self.job_destination_table = '{0:d}_{1:s}'.format(
+            int(time.time()),
+            uuid.uuid4().hex[:8],
+        )
         self.benchmark_table_util = table_util.TableUtil(
             self.job_destination_table,
             self.dataset_id,
@@ -176,18 +181,11 @@ class BenchmarkTable(object):
         )
         self.benchmark_table_util.create_table()
 
-    def load_from_gcs(self):
-        """Loads GCS files into the benchmark table and stores results.
-
-        Creates and runs a load job to load files the GCS URI into the
-        benchmark table. Then uses benchmark_result_util.BenchmarkResultUtil
-        to gather results and generate a results row, which it then inserts
-        into the BigQuery results table.
-
-        Raises:
-            google.api_core.exceptions.BadRequest: 400 Error while reading data,
-                error message: Total data size exceeds max allowed size
+    def start_load(self):
+        """Starts a load job from the GCS files into the benchmark table.
 
+        The load job is submitted without waiting for it to complete, so that
+        several benchmark tables can be loaded at the same time.
         """
         source_formats = file_constants.FILE_CONSTANTS['sourceFormats']
         job_config = bigquery.LoadJobConfig()
@@ -204,6 +202,21 @@ class BenchmarkTable(object):
             self.load_job.job_id,
             self.job_destination_table
         ))
+
+    def get_results_row(self):
+        """Waits for the load job to finish and returns its results row.
+
+        Uses benchmark_result_util.BenchmarkResultUtil to gather results of
+        the load job started by start_load(). If the load job fails with a
+        BadRequest, the benchmark table is deleted.
+
+        Returns:
+            A dict representing a row to be inserted into the BigQuery
+            results table, or None if the load job failed, for example with
+            400 Error while reading data, error message: Total data size
+            exceeds max allowed size.
+
+        """
         try:
             self.load_job.result()
             result = benchmark_result_util.BenchmarkResultUtil(
@@ -214,31 +227,41 @@ class BenchmarkTable(object):
                 project_id=self.bq_project,
                 bq_logs_dataset=self.bq_logs_dataset
             )
-            result_row = result.get_results_row()
-            logging.info('Inserting {0:s}'.format(str(result_row)))
-            insert_job = self.bq_client.insert_rows(
-                self.results_table,
-                [result_row],
-             )
-            if len(insert_job) == 0:
-                logging.info(('Results for table {0:s} loaded '
-                             'successfully.').format(
-                    self.job_destination_table
-                ))
-            else:
-                logging.error(insert_job)
+            return result.get_results_row()
         except exceptions.BadRequest as e:
             logging.error(e.message)
             self.bq_client.delete_table(self.benchmark_table_util.table_ref)
             logging.info('Deleting table {0:s}'.format(
                 self.job_destination_table
             ))
+            return None
 
+    def insert_results_rows(self, results_rows):
+        """Inserts results rows into the BigQuery results table.
 
+        Args:
+            results_rows(List[dict]): Rows returned by get_results_row().
+        """
+        logging.info('Inserting {0:d} results rows.'.format(len(results_rows)))
+        insert_job = self.bq_client.insert_rows(
+            self.results_table,
+            results_rows,
+        )
+        if len(insert_job) == 0:
+            logging.info('Results for {0:d} tables loaded successfully.'.format(
+                len(results_rows)
+            ))
+        else:
+            logging.error(insert_job)
 
+    def load_from_gcs(self):
+        """Loads GCS files into the benchmark table and stores results.
 
-
-
-
-
-
+        Creates and runs a load job to load files the GCS URI into the
+        benchmark table, waits for it to finish, and inserts the resulting
+        row into the BigQuery results table.
+        """
+        self.start_load()
+        result_row = self.get_results_row()
+        if result_row is not None:
+            self.insert_results_rows([result_row])
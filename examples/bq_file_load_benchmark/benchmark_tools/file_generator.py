@@ -15,10 +15,14 @@
 from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import hashlib
 import itertools
+import json
 import logging
+import os
+import threading
+import time
 
 import apache_beam as beam
 from apache_beam.io.gcp.internal.clients import bigquery as beam_bigquery
@@ -34,6 +38,13 @@ from benchmark_tools import parquet_util
 from benchmark_tools import table_util
 
 MAX_COMPOSABLE_BLOBS = 32
+# Copies that fail with one of these errors are retried with exponential
+# backoff before copy_blobs() gives up.
+RETRYABLE_COPY_ERRORS = (exceptions.TooManyRequests, exceptions.ServerError)
+MAX_COPY_RETRIES = 5
+COPY_RETRY_BACKOFF_SECONDS = 1
+# Number of copied files between writes of the copy checkpoint file.
+COPY_CHECKPOINT_INTERVAL = 100
 
 
 class FileGenerator(object):
@@ -72,6 +83,10 @@ class FileGenerator(object):
             saved in.
         dataflow_staging_location(str): GCS staging path for dataflow jobs.
         dataflow_temp_location(str): GCS temp path for dataflow jobs.
+        max_copy_workers(int): Maximum number of files copied at the same
+            time by copy_blobs().
+        copy_checkpoint_file(str): Path of the local json file recording how
+            far copy_blobs() got for each incomplete combination.
     """
 
     def __init__(
@@ -82,6 +97,8 @@ class FileGenerator(object):
             file_params,
             dataflow_staging_location,
             dataflow_temp_location,
+            max_copy_workers=32,
+            copy_checkpoint_file='copy_checkpoint.json',
     ):
         self.bq_client = bigquery.Client()
         self.gcs_client = storage.Client()
@@ -103,6 +120,8 @@ class FileGenerator(object):
         )
         self.dataflow_staging_location = dataflow_staging_location
         self.dataflow_temp_location = dataflow_temp_location
+        self.max_copy_workers = max_copy_workers
+        self.copy_checkpoint_file = copy_checkpoint_file
 
     def restart_incomplete_combination(self, restart_file):
 
@@ -113,7 +132,9 @@ class FileGenerator(object):
         program may time out, or a backend error will occur, meaning a
         combination may not have a complete set of files. When this happens,
         restart_incomplete_combination can be used to restart file generation
-        for a combination at the last file that was successfully created.
+        for a combination at the last file that was successfully created. If
+        the copy checkpoint file shows that more files of the combination were
+        copied than restart_file, generation restarts from the checkpoint.
 
         Args:
             restart_file(str): the file last successful file that was created
@@ -132,6 +153,13 @@ class FileGenerator(object):
                                .split('file')[1].split('.')[0])
         extension = restart_file.split('.')[1]
         num_files = int(restart_file.split('numFiles=')[1].split('/')[0])
+        checkpoint = self._load_copy_checkpoint().get(destination_path)
+        if checkpoint and checkpoint['lastCopied'] > restart_file_num:
+            restart_file_num = checkpoint['lastCopied']
+            logging.info('Restarting {0:s} from checkpoint at file{1:d}.'.format(
+                destination_path,
+                restart_file_num,
+            ))
         self.copy_blobs(
             source_blob_name,
             destination_path,
@@ -140,6 +168,50 @@ class FileGenerator(object):
             num_files,
         )
 
+    def _load_copy_checkpoint(self):
+        """Internal method for reading the copy checkpoint file.
+
+        Returns:
+            Dict mapping the destination_path of each incomplete combination
+            to a dict with the sourceBlobName, extension, numFiles, and
+            lastCopied file number of the combination. Every file up to and
+            including lastCopied has been copied.
+        """
+        if not os.path.exists(self.copy_checkpoint_file):
+            return {}
+        with open(self.copy_checkpoint_file, 'r') as input_file:
+            return json.load(input_file)
+
+    def _save_copy_checkpoint(self, destination_path, checkpoint):
+        """Internal method for updating the copy checkpoint file.
+
+        Args:
+            destination_path(str): Path of the combination being copied.
+            checkpoint(dict): Progress of the combination, as described in
+                _load_copy_checkpoint(). If None, the combination is removed
+                from the checkpoint file since it is complete.
+        """
+        checkpoints = self._load_copy_checkpoint()
+        if checkpoint is None:
+            checkpoints.pop(destination_path, None)
+        else:
+            checkpoints[destination_path] = checkpoint
+        # Write to a temporary file first so that an interrupted write never
+        # leaves a corrupt checkpoint file behind.
+        tmp_file = self.copy_checkpoint_file + '.tmp'
+        with open(tmp_file, 'w') as output_file:
+            json.dump(checkpoints, output_file, indent=2, sort_keys=True)
+        os.rename(tmp_file, self.copy_checkpoint_file)
+
+    def _new_copy_bucket(self):
+        """Internal method for creating a bucket object for a copy thread.
+
+        Returns:
+            A google.cloud.storage.bucket.Bucket for self.bucket_name with its
+            own google.cloud.storage.client.Client.
+        """
+        return storage.Client().bucket(self.bucket_name)
+
     def _get_staging_tables(self, dataset_ref):
         """Internal method for getting list of staging tables.
 
@@ -475,7 +547,10 @@ class FileGenerator(object):
         where n is the number of files (numFiles) in the combination
         (i.e. 10000 copies if numFiles in the combination is 100000). This is
         a faster method than extracting the staging table to a file n number
-        of times.
+        of times. Up to max_copy_workers copies run at the same time, and the
+        last file number up to which every file has been copied is saved in
+        the copy checkpoint file so that an interrupted combination can be
+        resumed.
 
         Args:
             source_blob_name(str): Name of the file to be copied.
@@ -499,21 +574,109 @@ class FileGenerator(object):
         """
 
         source_blob = self.bucket.get_blob(source_blob_name)
-        # Copy the source file until the combination has the correct number
-        # of files.
-        for n in range(start_num, num_files + 1):
-            file_string = 'file{0:d}'.format(n)
-            copied_destination = '{0:s}{1:s}.{2:s}'.format(
+        # Each copy thread uses a bucket of its own client, since a client's
+        # HTTP session pools fewer connections than there are copy workers.
+        thread_local = threading.local()
+
+        def _copy_blob(n):
+            """Copies the source blob to file n of the combination.
+
+            Retries with exponential backoff if GCS returns a rate limit or
+            server error.
+
+            Args:
+                n(int): The file number of the copied blob.
+
+            Returns:
+                The copied google.cloud.storage.blob.Blob.
+            """
+            copied_destination = '{0:s}file{1:d}.{2:s}'.format(
                 destination_path,
-                file_string,
+                n,
                 extension,
             )
-            copied_blob = self.bucket.copy_blob(
-                blob=source_blob,
-                destination_bucket=self.bucket,
-                new_name=copied_destination,
-            )
-            logging.info('Created file: {0:s}'.format(copied_blob.name))
+            bucket = getattr(thread_local, 'bucket', None)
+            if bucket is None:
+                bucket = thread_local.bucket = self._new_copy_bucket()
+            for attempt in range(MAX_COPY_RETRIES + 1):
+                try:
+                    return bucket.copy_blob(
+                        blob=source_blob,
+                        destination_bucket=bucket,
+                        new_name=copied_destination,
+                    )
+                except RETRYABLE_COPY_ERRORS as e:
+                    if attempt == MAX_COPY_RETRIES:
+                        raise
+                    delay = COPY_RETRY_BACKOFF_SECONDS * 2 ** attempt
+                    logging.warning('Retrying copy of {0:s} in {1:d} seconds '
+                                    'after error: {2:s}'.format(
+                                        copied_destination,
+                                        delay,
+                                        str(e),
+                                    ))
+                    time.sleep(delay)
+
+        checkpoint = {
+            'sourceBlobName': source_blob_name,
+            'extension': extension,
+            'numFiles': num_files,
+            'lastCopied': start_num - 1,
+        }
+        self._save_copy_checkpoint(destination_path, checkpoint)
+        # Copy the source file until the combination has the correct number
+        # of files. At most twice max_copy_workers copies are queued at a time
+        # so that few copies are left running if one fails.
+        file_nums = iter(range(start_num, num_files + 1))
+        in_flight = {}
+        # File numbers that were copied out of order, after a gap.
+        copied_nums = set()
+        with ThreadPoolExecutor(max_workers=self.max_copy_workers) as p:
+            try:
+                for n in itertools.islice(file_nums,
+                                          2 * self.max_copy_workers):
+                    in_flight[p.submit(_copy_blob, n)] = n
+                while in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    # Record every finished copy before raising the error of
+                    # a failed one.
+                    error = None
+                    for future in done:
+                        n = in_flight.pop(future)
+                        if future.exception() is not None:
+                            error = error or future.exception()
+                            continue
+                        copied_blob = future.result()
+                        logging.info('Created file: {0:s}'.format(
+                            copied_blob.name
+                        ))
+                        copied_nums.add(n)
+                        next_n = next(file_nums, None)
+                        if next_n is not None:
+                            in_flight[p.submit(_copy_blob, next_n)] = next_n
+                    # Advance the checkpoint over the files that have been
+                    # copied without a gap.
+                    last_saved = checkpoint['lastCopied']
+                    while checkpoint['lastCopied'] + 1 in copied_nums:
+                        checkpoint['lastCopied'] += 1
+                        copied_nums.remove(checkpoint['lastCopied'])
+                    if (checkpoint['lastCopied'] // COPY_CHECKPOINT_INTERVAL >
+                            last_saved // COPY_CHECKPOINT_INTERVAL):
+                        self._save_copy_checkpoint(destination_path,
+                                                   checkpoint)
+                    if error is not None:
+                        raise error
+            except BaseException:
+                logging.error('Copying stopped for {0:s}. Every file up to '
+                              'file{1:d} was copied. Rerun to resume from the '
+                              'checkpoint in {2:s}.'.format(
+                                  destination_path,
+                                  checkpoint['lastCopied'],
+                                  self.copy_checkpoint_file,
+                              ))
+                self._save_copy_checkpoint(destination_path, checkpoint)
+                raise
+        self._save_copy_checkpoint(destination_path, None)
 
     def create_files(self):
         """Creates all file combinations and store in GCS.
@@ -666,16 +829,37 @@ class FileGenerator(object):
                     # While this can be a risky assumption, it saves a lot of
                     # time, since combinations can contain as many as 10000
                     # files. If a combination is stopped in the middle of
-                    # generating a large number of files, the restart_
-                    # incomplete_combination() method can be used to ensure the
-                    # combination gets completed without taking the time to
-                    # check each file's existence here.
+                    # generating a large number of files, copy_blobs() records
+                    # its progress in the copy checkpoint file, and the
+                    # combination is resumed from there. Without a checkpoint,
+                    # the restart_incomplete_combination() method can be used
+                    # to ensure the combination gets completed without taking
+                    # the time to check each file's existence here.
                     first_of_n_blobs = '{0:s}{1:s}.{2:s}'.format(
                         destination_path,
                         file_string,
                         extension,
                     )
-                    if not storage.Blob(
+                    checkpoint = self._load_copy_checkpoint().get(
+                        destination_path
+                    )
+                    if checkpoint:
+                        # If copy_blobs() was stopped in the middle of the
+                        # combination, resume after the last file that was
+                        # copied.
+                        logging.info('Resuming {0:s} from checkpoint at '
+                                     'file{1:d}.'.format(
+                                         destination_path,
+                                         checkpoint['lastCopied'],
+                                     ))
+                        self.copy_blobs(
+                            file1_blob_name,
+                            destination_path,
+                            extension,
+                            checkpoint['lastCopied'] + 1,
+                            num_files,
+                        )
+                    elif not storage.Blob(
                             bucket=self.bucket,
                             name=first_of_n_blobs,
                     ).exists(self.gcs_client):
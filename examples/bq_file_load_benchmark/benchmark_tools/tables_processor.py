@@ -15,6 +15,7 @@
 from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
 
 from google.cloud import bigquery
@@ -58,6 +59,11 @@ class TablesProcessor(object):
         file_params(dict): Dictionary containing each file parameter and
             its possible values.
         bq_logs_dataset(str): Name of dataset hold BQ logs table.
+        max_concurrent_loads(int): Maximum number of benchmark load jobs
+            that run at the same time. Keep this well under the project's
+            BigQuery load job quotas.
+        results_batch_size(int): Number of results rows to collect from
+            finished load jobs before inserting them into the results table.
 
     """
 
@@ -74,6 +80,8 @@ class TablesProcessor(object):
             duplicate_benchmark_tables,
             file_params,
             bq_logs_dataset,
+            max_concurrent_loads=10,
+            results_batch_size=100,
     ):
         self.bq_project = bq_project
         self.gcs_project = gcs_project
@@ -90,6 +98,8 @@ class TablesProcessor(object):
         self.results_table_dataset_id = results_table_dataset_id
         self.duplicate_benchmark_tables = duplicate_benchmark_tables
         self.bq_logs_dataset = bq_logs_dataset
+        self.max_concurrent_loads = max_concurrent_loads
+        self.results_batch_size = results_batch_size
 
     def gather_files_with_benchmark_tables(self):
         """Generates file combinations that already have benchmark tables.
@@ -124,6 +134,10 @@ class TablesProcessor(object):
 
     def create_benchmark_tables(self):
         """Creates a benchmark table for each file combination in GCS bucket.
+
+        Up to max_concurrent_loads benchmark tables are created and loaded at
+        the same time. Results rows are collected as load jobs finish and are
+        inserted into the results table in batches of results_batch_size.
         """
 
         # Gather files combinations that already have benchmark tables.
@@ -134,32 +148,79 @@ class TablesProcessor(object):
             files_to_skip = files_with_benchmark_tables
         # Gather file combinations that exist in the GCS Bucket.
         existing_paths = self.bucket_util.get_existing_paths()
-        # Create a benchmark table for each existing file combination, and
-        # load the data from the file into the benchmark table.
+        paths_to_load = []
         for path in existing_paths:
             path = path.split('/')
             path = '/'.join(path[:len(path) - 1])
             if path not in files_to_skip:
+                paths_to_load.append(path)
+
+        def _create_benchmark_table(path):
+            """Creates a benchmark table and loads the data from the file.
+
+            Args:
+                path(str): Path of the file combination in the bucket.
 
-                if path in files_with_benchmark_tables:
-                    verb = 'Duplicating'
-                else:
-                    verb = 'Processing'
-                logging.info('{0:s} benchmark table for {1:s}'.format(
-                    verb,
-                    path,
-                ))
-                table = benchmark_table.BenchmarkTable(
-                    bq_project=self.bq_project,
-                    gcs_project=self.gcs_project,
-                    staging_project=self.staging_project,
-                    staging_dataset_id=self.staging_dataset_id,
-                    dataset_id=self.dataset_id,
-                    bucket_name=self.bucket_name,
-                    path=path,
-                    results_table_name=self.results_table_name,
-                    results_table_dataset_id=self.results_table_dataset_id,
-                    bq_logs_dataset=self.bq_logs_dataset,
-                )
-                table.create_table()
-                table.load_from_gcs()
+            Returns:
+                The benchmark_tools.benchmark_table.BenchmarkTable and its
+                results row, which is None if the load job failed.
+            """
+            if path in files_with_benchmark_tables:
+                verb = 'Duplicating'
+            else:
+                verb = 'Processing'
+            logging.info('{0:s} benchmark table for {1:s}'.format(
+                verb,
+                path,
+            ))
+            table = benchmark_table.BenchmarkTable(
+                bq_project=self.bq_project,
+                gcs_project=self.gcs_project,
+                staging_project=self.staging_project,
+                staging_dataset_id=self.staging_dataset_id,
+                dataset_id=self.dataset_id,
+                bucket_name=self.bucket_name,
+                path=path,
+                results_table_name=self.results_table_name,
+                results_table_dataset_id=self.results_table_dataset_id,
+                bq_logs_dataset=self.bq_logs_dataset,
+            )
+            table.create_table()
+            table.start_load()
+            return table, table.get_results_row()
+
+        # Create a benchmark table for each existing file combination, and
+        # load the data from the file into the benchmark table. Results rows
+        # are buffered so that they can be inserted in batches.
+        results_rows = []
+        table = None
+        num_failed = 0
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_loads) as p:
+            futures = dict(
+                (p.submit(_create_benchmark_table, path), path)
+                for path in paths_to_load
+            )
+            for future in as_completed(futures):
+                try:
+                    table, result_row = future.result()
+                except Exception:  # pylint: disable=broad-except
+                    # Keep the other loads running rather than losing the
+                    # results that are still buffered.
+                    logging.exception('Failed to create benchmark table for '
+                                      '{0:s}'.format(futures[future]))
+                    num_failed += 1
+                    continue
+                if result_row is None:
+                    num_failed += 1
+                    continue
+                results_rows.append(result_row)
+                if len(results_rows) >= self.results_batch_size:
+                    table.insert_results_rows(results_rows)
+                    results_rows = []
+        if results_rows:
+            table.insert_results_rows(results_rows)
+        logging.info('Done creating benchmark tables for {0:d} file '
+                     'combinations, {1:d} failed.'.format(
+                         len(paths_to_load),
+                         num_failed,
+                     ))
@@ -76,6 +76,21 @@ def parse_args(argv):
              'the middle of file creation. Can only be used with '
              '--create_files flag.'
     )
+    parser.add_argument(
+        '--max_copy_workers',
+        type=int,
+        default=32,
+        help='Maximum number of files to copy at the same time when creating '
+             'combinations with more than one file. Can only be used with '
+             '--create_files flag.'
+    )
+    parser.add_argument(
+        '--copy_checkpoint_file',
+        default='copy_checkpoint.json',
+        help='Local file that records the progress of combinations whose '
+             'files are being copied, so that they can be resumed if the '
+             'program stops. Can only be used with --create_files flag.'
+    )
     parser.add_argument(
         '--create_benchmark_tables',
         help='Flag to initiate process of creating benchmarked tables '
@@ -91,6 +106,21 @@ def parse_args(argv):
              '--create_benchmark_tables flag.',
         action='store_true'
     )
+    parser.add_argument(
+        '--max_concurrent_loads',
+        type=int,
+        default=10,
+        help='Maximum number of benchmark load jobs to run at the same time. '
+             'Can only be used with --create_benchmark_tables flag.'
+    )
+    parser.add_argument(
+        '--results_batch_size',
+        type=int,
+        default=100,
+        help='Number of results rows to collect from finished load jobs '
+             'before inserting them into the results table. Can only be '
+             'used with --create_benchmark_tables flag.'
+    )
     parser.add_argument(
         '--bq_project_id',
         help='Project ID that contains bigquery resources for running '
@@ -291,8 +321,12 @@ def main(argv=None):
     create_staging_tables = args.create_staging_tables
     create_files = args.create_files
     restart_file = args.restart_file
+    max_copy_workers = args.max_copy_workers
+    copy_checkpoint_file = args.copy_checkpoint_file
     create_benchmark_tables = args.create_benchmark_tables
     duplicate_benchmark_tables = args.duplicate_benchmark_tables
+    max_concurrent_loads = args.max_concurrent_loads
+    results_batch_size = args.results_batch_size
     bq_project_id = args.bq_project_id
     benchmark_dataset_id = args.benchmark_dataset_id
     staging_project_id=args.staging_project_id
@@ -357,6 +391,8 @@ def main(argv=None):
             file_params=file_params,
             dataflow_staging_location=dataflow_staging_location,
             dataflow_temp_location=dataflow_temp_location,
+            max_copy_workers=max_copy_workers,
+            copy_checkpoint_file=copy_checkpoint_file,
         )
         if restart_file:
             benchmark_file_generator.restart_incomplete_combination(
@@ -377,6 +413,8 @@ def main(argv=None):
             duplicate_benchmark_tables=duplicate_benchmark_tables,
             file_params=file_params,
             bq_logs_dataset=bq_logs_dataset,
+            max_concurrent_loads=max_concurrent_loads,
+            results_batch_size=results_batch_size,
         )
         benchmark_tables_processor.create_benchmark_tables()
 
@@ -252,4 +252,98 @@ class TestFileGenerator(object):
         self.bq_client.delete_dataset(
             self.dataset_ref,
             delete_contents=True
-        )
\ No newline at end of file
+        )
+
+class FakeBlob(object):
+    """Stands in for a google.cloud.storage.blob.Blob."""
+
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeBucket(object):
+    """Records copied blob names, failing the copies to fail_names once.
+
+    Attributes:
+        copied(List[str]): Names of the copied blobs.
+        fail_names(dict): Maps a blob name to the exception raised by its
+            first copy.
+    """
+
+    def __init__(self, fail_names=None):
+        self.copied = []
+        self.fail_names = dict(fail_names or {})
+
+    def get_blob(self, name):
+        return FakeBlob(name)
+
+    def copy_blob(self, blob, destination_bucket, new_name):
+        if new_name in self.fail_names:
+            raise self.fail_names.pop(new_name)
+        self.copied.append(new_name)
+        return FakeBlob(new_name)
+
+
+class TestCopyBlobs(object):
+    """Tests FileGenerator.copy_blobs() without GCP resources.
+
+    Attributes:
+        destination_path(str): Path of the combination being copied.
+        bucket(FakeBucket): Bucket shared by every copy thread.
+        file_generator(benchmark_tools.file_generator.FileGenerator): File
+            generator which copies to bucket.
+    """
+
+    def setup_method(self):
+        """Sets up a FileGenerator without calling GCP.
+        """
+        self.destination_path = ('fileType=csv/compression=none/numColumns=10/'
+                                 'columnTypes=100_STRING/numFiles=10/'
+                                 'tableSize=0MB/')
+        self.bucket = FakeBucket()
+        self.file_generator = file_generator.FileGenerator.__new__(
+            file_generator.FileGenerator
+        )
+        self.file_generator.bucket = self.bucket
+        self.file_generator.bucket_name = 'bucket'
+        self.file_generator.max_copy_workers = 1
+        self.file_generator._new_copy_bucket = lambda: self.bucket
+
+    def file_name(self, n):
+        return '{0:s}file{1:d}.csv'.format(self.destination_path, n)
+
+    def test_resume_skips_copied_blobs(self, tmpdir, monkeypatch):
+        """Tests a stopped copy is resumed after the last copied blob.
+
+        Args:
+            tmpdir: pytest fixture for a temporary directory.
+            monkeypatch: pytest fixture for patching the retry backoff.
+        """
+        monkeypatch.setattr(file_generator, 'COPY_RETRY_BACKOFF_SECONDS', 0)
+        self.file_generator.copy_checkpoint_file = str(
+            tmpdir.join('copy_checkpoint.json')
+        )
+        # A rate limit error is retried, a bad request stops copying.
+        self.bucket.fail_names = {
+            self.file_name(3): exceptions.TooManyRequests('slow down'),
+            self.file_name(6): exceptions.BadRequest('bad request'),
+        }
+        try:
+            self.file_generator.copy_blobs(
+                self.file_name(1), self.destination_path, 'csv', 2, 10
+            )
+            assert False, 'copy_blobs() should have raised BadRequest'
+        except exceptions.BadRequest:
+            pass
+        # The copy queued after file6 may finish, but isn't checkpointed.
+        assert self.bucket.copied[:4] == [
+            self.file_name(n) for n in range(2, 6)
+        ]
+        assert self.file_name(6) not in self.bucket.copied
+        checkpoint = self.file_generator._load_copy_checkpoint()
+        assert checkpoint[self.destination_path]['lastCopied'] == 5
+
+        self.bucket.copied = []
+        self.file_generator.restart_incomplete_combination(self.file_name(1))
+        assert self.bucket.copied == [self.file_name(n) for n in range(6, 11)]
+        assert self.file_generator._load_copy_checkpoint() == {}
@@ -0,0 +1,120 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import logging
+import threading
+
+from bq_file_load_benchmark.benchmark_tools import tables_processor
+
+
+class FakeBenchmarkTable(object):
+    """Stands in for benchmark_tools.benchmark_table.BenchmarkTable.
+
+    Loads of paths containing 'failedLoad' have no results row, and
+    benchmark tables for paths containing 'error' can't be created.
+
+    Attributes:
+        inserted_batches(List[List[dict]]): Batches of results rows inserted
+            by every table, in order.
+    """
+    inserted_batches = []
+    lock = threading.Lock()
+
+    def __init__(self, path, **kwargs):
+        self.path = path
+
+    def create_table(self):
+        if 'error' in self.path:
+            raise RuntimeError('table could not be created')
+
+    def start_load(self):
+        pass
+
+    def get_results_row(self):
+        if 'failedLoad' in self.path:
+            return None
+        return {'path': self.path}
+
+    def insert_results_rows(self, results_rows):
+        with self.lock:
+            FakeBenchmarkTable.inserted_batches.append(list(results_rows))
+
+
+class TestCreateBenchmarkTables(object):
+    """Tests TablesProcessor.create_benchmark_tables() without GCP resources.
+
+    Attributes:
+        tables_processor(benchmark_tools.tables_processor.TablesProcessor):
+            Tables processor whose bucket holds the file combinations.
+    """
+
+    def setup_method(self):
+        """Sets up a TablesProcessor without calling GCP.
+        """
+        FakeBenchmarkTable.inserted_batches = []
+        self.tables_processor = tables_processor.TablesProcessor.__new__(
+            tables_processor.TablesProcessor
+        )
+        self.tables_processor.bq_project = 'project'
+        self.tables_processor.gcs_project = 'project'
+        self.tables_processor.staging_project = 'project'
+        self.tables_processor.staging_dataset_id = 'staging_dataset'
+        self.tables_processor.dataset_id = 'dataset'
+        self.tables_processor.bucket_name = 'bucket'
+        self.tables_processor.results_table_name = 'results'
+        self.tables_processor.results_table_dataset_id = 'results_dataset'
+        self.tables_processor.duplicate_benchmark_tables = False
+        self.tables_processor.bq_logs_dataset = 'logs_dataset'
+        self.tables_processor.max_concurrent_loads = 3
+        self.tables_processor.results_batch_size = 2
+        self.tables_processor.gather_files_with_benchmark_tables = (
+            lambda: set()
+        )
+
+    def set_paths(self, paths):
+        """Sets the file combinations in the bucket, one file each."""
+
+        class FakeBucketUtil(object):
+            def get_existing_paths(self):
+                return ['{0:s}/file1.csv'.format(path) for path in paths]
+
+        self.tables_processor.bucket_util = FakeBucketUtil()
+
+    def test_create_benchmark_tables(self, monkeypatch, caplog):
+        """Tests results rows are inserted in batches and failures skipped.
+
+        Args:
+            monkeypatch: pytest fixture for patching BenchmarkTable.
+            caplog: pytest fixture for capturing the logged summary.
+        """
+        monkeypatch.setattr(tables_processor.benchmark_table,
+                            'BenchmarkTable', FakeBenchmarkTable)
+        paths = ['fileType=csv/numFiles={0:d}'.format(n) for n in range(5)]
+        self.set_paths(paths + ['fileType=csv/failedLoad', 'fileType=error'])
+        with caplog.at_level(logging.INFO):
+            self.tables_processor.create_benchmark_tables()
+
+        # Full batches are flushed while loads finish and the leftover row
+        # is flushed at the end.
+        batch_sizes = [len(batch)
+                       for batch in FakeBenchmarkTable.inserted_batches]
+        assert batch_sizes == [2, 2, 1]
+        inserted_paths = sorted(
+            row['path'] for batch in FakeBenchmarkTable.inserted_batches
+            for row in batch
+        )
+        assert inserted_paths == paths
+        assert ('Done creating benchmark tables for 7 file combinations, '
+                '2 failed.') in caplog.text
+
+    def test_create_benchmark_tables_without_results(self, monkeypatch):
+        """Tests nothing is inserted when every load fails.
+
+        Args:
+            monkeypatch: pytest fixture for patching BenchmarkTable.
+        """
+        monkeypatch.setattr(tables_processor.benchmark_table,
+                            'BenchmarkTable', FakeBenchmarkTable)
+        self.set_paths(['fileType=csv/failedLoad', 'fileType=error'])
+        self.tables_processor.create_benchmark_tables()
+        assert FakeBenchmarkTable.inserted_batches == []
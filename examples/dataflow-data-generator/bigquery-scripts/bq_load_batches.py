@@ -13,17 +13,27 @@
 # limitations under the License.
 
 import argparse
+import hashlib
 import json
 import os
-from math import floor
+import time
+import uuid
 import pandas as pd
+from google.api_core.exceptions import Conflict
 from google.cloud import bigquery as bq
 
 """
 This script is meant to orchestrate BigQuery load jobs of many
 json files on Google Cloud Storage. It ensures that each load
-stays under the 15 TB per load job limit. It operates on the
-output of gsutil -l.
+stays under the 15 TB and 10,000 source URI per load job limits.
+It operates on the output of gsutil -l.
+
+At most --max_in_flight load jobs run at once and failed batches are
+retried up to --max_retries times. The job id and outcome of each batch is
+recorded in --state_file so rerunning the same command after an
+interruption only loads the batches which have not succeeded. Load job ids
+are derived from the state file and the batch, so a job submitted just
+before an interruption is found again rather than loaded twice.
 
 Args:
     --project: GCP project ID
@@ -38,6 +48,10 @@ Args:
         table schema.
     --partitioning_column: name of the field for date partitioning.
     --max_bad_records: Number of permissible bad records per load job.
+    --max_in_flight: The maximum number of concurrent load jobs.
+    --max_retries: The number of times to retry a failed batch.
+    --state_file: Path to a json file recording the progress of each batch.
+        Defaults to the sources_file with a .state.json suffix.
 
 Example Usage:
 
@@ -89,45 +103,140 @@ def create_bq_table(bq_cli, dataset_id, table_id, schema_file,
     return table
 
 
-def parse_gsutil_long_output_file(filename):
+# 15TB per BQ load job.
+MAX_BATCH_BYTES = 15 * 10 ** 12
+# Source URIs per BQ load job.
+MAX_BATCH_URIS = 10000
+
+
+def parse_gsutil_long_output_file(filename, max_batch_bytes=MAX_BATCH_BYTES,
+                                  max_batch_uris=MAX_BATCH_URIS):
     """
     This function reads the specified file (which should be the output of
-    gsutil -l) and batches the URI's up into batches <= 15TB
+    gsutil -l) and batches the URI's up into batches <= 15TB with at most
+    max_batch_uris files each.
 
     Args:
         filename: (str) path to input file.
+        max_batch_bytes: (int) The maximum bytes to load in a single job.
+        max_batch_uris: (int) The maximum files to load in a single job.
 
     Returns:
         batches: (Array of list of str) Each list in this array
             contains GCS URIs to be loaded in a single job.
     """
-
-    # 15TB per BQ load job.
-    MAX_BATCH_BYTES = 15 * 10 ** 13
     # read output of gsutil ls -l
     df = pd.read_csv(filename, delim_whitespace=True, header=None,
                      skipfooter=1, usecols=[0, 2], names=['bytes', 'filename'],
                      engine='python')
-    # df = df.rename({0:'bytes', 2:'filename'}, axis='columns')
 
-    # sort files by size
-    df.sort_values(by='bytes', inplace=True)
+    return plan_batches(list(df['filename']), list(df['bytes']),
+                        max_batch_bytes=max_batch_bytes,
+                        max_batch_uris=max_batch_uris)
+
 
-    df['cum_sum_bytes'] = df['bytes'].cumsum()
+def plan_batches(uris, sizes, max_batch_bytes=MAX_BATCH_BYTES,
+                 max_batch_uris=MAX_BATCH_URIS):
+    """
+    Bin packs files into load jobs with first fit decreasing: the largest
+    remaining file goes into the first batch with room for both its bytes
+    and another URI.
 
-    df['batch_num'] = df['cum_sum_bytes'] // MAX_BATCH_BYTES
+    Args:
+        uris: (list of str) GCS URIs of the files to load.
+        sizes: (list of int) The size in bytes of each file.
+        max_batch_bytes: (int) The maximum bytes to load in a single job.
+        max_batch_uris: (int) The maximum files to load in a single job.
 
+    Returns:
+        batches: (Array of list of str) Each list in this array contains the
+            GCS URIs to be loaded in a single job, smallest file first.
+    """
+    # Files are placed largest first. sorted is stable so files of equal
+    # size keep their listing order.
+    order = sorted(range(len(uris)), key=lambda i: sizes[i], reverse=True)
     batches = []
-    total_batches = int(df['batch_num'].max() + 1)
-    for i in xrange(total_batches):
-        batches.append(list(df[df['batch_num'] == i]['filename']))
-    return batches
+    batch_bytes = []
+    # Index of the first batch which may still have room for another file.
+    first_open = 0
+    for i in order:
+        for b in range(first_open, len(batches)):
+            if len(batches[b]) < max_batch_uris and \
+                    batch_bytes[b] + sizes[i] <= max_batch_bytes:
+                batches[b].append(i)
+                batch_bytes[b] += sizes[i]
+                break
+        else:
+            batches.append([i])
+            batch_bytes.append(sizes[i])
+        # Batches which are full on URIs can never take another file.
+        while first_open < len(batches) and \
+                len(batches[first_open]) >= max_batch_uris:
+            first_open += 1
+    return [[uris[i] for i in sorted(batch, key=lambda i: (sizes[i], i))]
+            for batch in batches]
 
 
-def submit_jobs(bq_cli, job_config, dataset_id, table_id, batches):
+def batch_fingerprint(batch):
     """
-    Helper function to submit a single load job for each batch.
-    These jobs will run in parallel.
+    Identifies a batch by its URIs so progress recorded in a state file is
+    only reused for the same batch.
+    """
+    return hashlib.sha1('\n'.join(batch).encode('utf-8')).hexdigest()
+
+
+def batch_job_id(run_id, batch, submission):
+    """
+    The load job id of a batch's submission. Job ids are unique in a project,
+    so resubmitting a job which already exists fails with Conflict.
+
+    Args:
+        run_id: (str) Identifies the state file the batch belongs to.
+        batch: (list of str) GCS URIs loaded by the job.
+        submission: (int) The number of times the batch was submitted,
+            including this one.
+    """
+    return 'bq_load_batches_{}_{}_{}'.format(run_id, batch_fingerprint(batch),
+                                             submission)
+
+
+def load_state(state_file):
+    """
+    Reads the progress of each batch from state_file. Returns an empty
+    state if the file does not exist.
+
+    Returns:
+        state: (dict) Maps batch fingerprints to a dict with the batch's
+            'job_id', 'status', 'attempts' and 'submissions', and 'run_id'
+            to the id shared by the load jobs of the state file.
+    """
+    if not state_file or not os.path.exists(state_file):
+        return {}
+    with open(state_file, 'r') as sf:
+        return json.load(sf)
+
+
+def save_state(state_file, state):
+    """
+    Atomically writes the progress of each batch to state_file.
+    """
+    if not state_file:
+        return
+    tmp_file = state_file + '.tmp'
+    with open(tmp_file, 'w') as sf:
+        json.dump(state, sf, indent=2, sort_keys=True)
+    os.rename(tmp_file, state_file)
+
+
+def submit_jobs(bq_cli, job_config, dataset_id, table_id, batches,
+                max_in_flight=10, max_retries=3, poll_interval=10,
+                state_file=None):
+    """
+    Submits a load job for each batch, keeping at most max_in_flight jobs
+    running at once, and polls them until every batch has succeeded or
+    failed max_retries + 1 times. Batches recorded as done in state_file are
+    skipped and jobs recorded as running are polled rather than resubmitted
+    so the same rows are never appended twice.
 
     Args:
         bq_cli: (bigquery.Client) the client to use for loading.
@@ -137,18 +246,88 @@ def submit_jobs(bq_cli, job_config, dataset_id, table_id, batches):
         table_id: (str) destination BigQuery table id.
         batches: (Array of list of str) Each list in this array
             contains GCS URIs to be loaded in a single job.
-    """
+        max_in_flight: (int) The maximum number of concurrent load jobs.
+        max_retries: (int) The number of times to retry a failed batch.
+        poll_interval: (float) Seconds to wait between polling jobs.
+        state_file: (str) Path to a json file recording each batch's job.
 
+    Returns:
+        failed: (list of int) The indexes of batches which did not load.
+    """
     dataset = bq_cli.dataset(dataset_id)
     table_ref = dataset.table(table_id)
+    state = load_state(state_file)
+    if 'run_id' not in state:
+        state['run_id'] = uuid.uuid4().hex
+        save_state(state_file, state)
+
+    pending = []
+    running = {}
     for (i, batch) in enumerate(batches):
-        print('running load job {} of {}.'.format(i, len(batches)))
-        # API call.
-        bq_cli.load_table_from_uri(
-            source_uris=batch,
-            destination=table_ref,
-            job_config=job_config
-        )
+        batch_state = state.setdefault(batch_fingerprint(batch),
+                                       {'attempts': 0})
+        if batch_state.get('status') == 'DONE':
+            print('skipping load job {} of {} which already succeeded.'
+                  .format(i, len(batches)))
+        elif batch_state.get('status') == 'RUNNING':
+            # Resume polling the job a previous run submitted.
+            running[i] = bq_cli.get_job(batch_state['job_id'])
+        else:
+            # Each run retries a failed batch max_retries times.
+            batch_state['attempts'] = 0
+            pending.append(i)
+
+    failed = []
+    while pending or running:
+        while pending and len(running) < max_in_flight:
+            i = pending.pop(0)
+            batch_state = state[batch_fingerprint(batches[i])]
+            print('running load job {} of {}.'.format(i, len(batches)))
+            # Unlike attempts, submissions are never reset so every job of
+            # the batch gets a new id.
+            submission = batch_state.get('submissions', 0) + 1
+            job_id = batch_job_id(state['run_id'], batches[i], submission)
+            try:
+                # API call.
+                running[i] = bq_cli.load_table_from_uri(
+                    source_uris=batches[i],
+                    destination=table_ref,
+                    job_config=job_config,
+                    job_id=job_id
+                )
+            except Conflict:
+                # A previous run submitted the job but stopped before
+                # recording it.
+                running[i] = bq_cli.get_job(job_id)
+            batch_state.update(job_id=job_id, status='RUNNING',
+                               attempts=batch_state['attempts'] + 1,
+                               submissions=submission)
+            save_state(state_file, state)
+
+        if running:
+            time.sleep(poll_interval)
+
+        for i, job in list(running.items()):
+            # API call to refresh the job's status.
+            if not job.done():
+                continue
+            del running[i]
+            batch_state = state[batch_fingerprint(batches[i])]
+            if job.error_result is None:
+                batch_state['status'] = 'DONE'
+                print('load job {} of {} succeeded.'.format(i, len(batches)))
+            elif batch_state['attempts'] <= max_retries:
+                batch_state['status'] = 'FAILED'
+                print('load job {} of {} failed with {}, retrying.'.format(
+                    i, len(batches), job.error_result))
+                pending.append(i)
+            else:
+                batch_state['status'] = 'FAILED'
+                print('load job {} of {} failed with {}.'.format(
+                    i, len(batches), job.error_result))
+                failed.append(i)
+            save_state(state_file, state)
+    return sorted(failed)
 
 
 def main(argv=None):
@@ -173,6 +352,24 @@ def main(argv=None):
     parser.add_argument('--source_format', dest='source_format',
 
                         required=False, default='AVRO')
+    parser.add_argument('--max_batch_uris', dest='max_batch_uris', type=int,
+                        required=False, default=MAX_BATCH_URIS,
+                        help='The maximum number of files per load job.')
+    parser.add_argument('--max_in_flight', dest='max_in_flight', type=int,
+                        required=False, default=10,
+                        help='The maximum number of concurrent load jobs.')
+    parser.add_argument('--max_retries', dest='max_retries', type=int,
+                        required=False, default=3,
+                        help='The number of times to retry a failed batch.')
+    parser.add_argument('--poll_interval', dest='poll_interval', type=float,
+                        required=False, default=10,
+                        help='Seconds to wait between polling load jobs.')
+    parser.add_argument('--state_file', dest='state_file', required=False,
+                        default=None,
+                        help='A local json file recording the progress of '
+                             'each batch so an interrupted run can be '
+                             'resumed. Defaults to the sources_file with a '
+                             '.state.json suffix.')
 
     known_args, _ = parser.parse_known_args(argv)
 
@@ -182,7 +379,11 @@ def main(argv=None):
     job_config.source_format = known_args.source_format
     job_config.max_bad_records = known_args.max_bad_records
 
-    if known_args.create_table:
+    state_file = known_args.state_file or \
+        os.path.splitext(known_args.sources_file)[0] + '.state.json'
+
+    # When resuming from a state file the table was created by the first run.
+    if known_args.create_table and not os.path.exists(state_file):
         if known_args.schema_file:
             create_bq_table(
                 bq_cli, known_args.dataset,
@@ -192,11 +393,21 @@ def main(argv=None):
         else:
             raise argparse.ArgumentError('Cannot create table without schema.')
 
-    batches = parse_gsutil_long_output_file(filename=known_args.sources_file)
-
-    submit_jobs(bq_cli=bq_cli, job_config=job_config,
-                dataset_id=known_args.dataset, table_id=known_args.table,
-                batches=batches)
+    batches = parse_gsutil_long_output_file(
+        filename=known_args.sources_file,
+        max_batch_uris=known_args.max_batch_uris)
+
+    failed = submit_jobs(bq_cli=bq_cli, job_config=job_config,
+                         dataset_id=known_args.dataset,
+                         table_id=known_args.table,
+                         batches=batches,
+                         max_in_flight=known_args.max_in_flight,
+                         max_retries=known_args.max_retries,
+                         poll_interval=known_args.poll_interval,
+                         state_file=state_file)
+    if failed:
+        raise RuntimeError('{} of {} load jobs failed. Rerun this command to '
+                           'retry them.'.format(len(failed), len(batches)))
 
 
 if __name__ == "__main__":
@@ -14,6 +14,8 @@
 
 from __future__ import absolute_import
 import argparse
+import math
+import uuid
 from google.cloud import bigquery
 from google.api_core.exceptions import NotFound, BadRequest
 
@@ -25,6 +27,10 @@ class BigQueryTableResizer(object):
     populate large tables in BigQuery. This class assumes that source and
     destination tables are in the same project.
 
+    The copy jobs are planned up front by plan_copy_schedule and each round
+    of independent copy jobs runs in parallel, so the number of sequential
+    rounds grows with the log of the number of copies.
+
     Attributes:
         location (str): The location of the BigQuery tables ['US' or 'EU'].
         project (str): The GCP project id for these tables.
@@ -39,6 +45,8 @@ class BigQueryTableResizer(object):
         target_gb (int): The desired number of GB for the destination table.
             Note that this will be cast to a number of rows and will only be
             used if that number is greater than target_rows.
+        parallel_copies (int): The maximum number of copy jobs to run at
+            once when building the staging tables.
     Methods:
         resize(): Performs the duplication according to this DataResizer's
             attributes.
@@ -51,7 +59,8 @@ class BigQueryTableResizer(object):
                  destination_table=None,
                  target_rows=1000000,
                  target_gb=None,
-                 location='US'):
+                 location='US',
+                 parallel_copies=3):
         """
         Constructor for DataDuplicator object.
         Args:
@@ -74,8 +83,11 @@ class BigQueryTableResizer(object):
                 target_gb or target_rows. This can be the same as source_table.
                 It is a TableReference not a Table because it may not
                 exist prior to this call.
+            parallel_copies (int): The maximum number of copy jobs to run at
+                once when building the staging tables.
        """
         self.location = location
+        self.parallel_copies = parallel_copies
         # Validate project argument.
         try:
             self.client = bigquery.Client(project=project)
@@ -115,87 +127,198 @@ class BigQueryTableResizer(object):
 
     def resize(self):
         """
-        This is the execute function of this class. It copies the source table
-        into the destination table and then copies the destination table into
-        itself until it reaches or exceeds the target_rows.
+        This is the execute function of this class. It appends whole copies
+        of the source table to the destination table, followed by a sample
+        of the source table for any remaining rows, so that the destination
+        table has exactly target_rows rows.
         """
+        source_rows = self.source_table.num_rows
+        try:
+            dest_rows = self.client.get_table(self.dest_table_ref).num_rows \
+                or 0
+        except NotFound:
+            dest_rows = 0
+
         # How many rows short of our target are we?
-        gap = self.target_rows - self.source_table.num_rows
+        gap = self.target_rows - dest_rows
+        print('{} rows in destination table with a target of {}, leaving a '
+              'gap of {}'.format(dest_rows, self.target_rows, gap))
+        if gap <= 0 or not source_rows:
+            return
+        n_copies, remainder = divmod(gap, source_rows)
+
+        rounds = plan_copy_schedule(n_copies, self.parallel_copies)
+        if remainder:
+            # The remainder is sampled into its own staging table alongside
+            # the first round and appended with the final round.
+            if not rounds:
+                rounds = [[([], _DESTINATION)]]
+            if len(rounds) < 2:
+                rounds.insert(0, [])
+            rounds[0].append(([], _REMAINDER))
+            rounds[-1][0][0].append(_REMAINDER)
+
+        staging_prefix = '{}_resize_{}'.format(self.dest_table_ref.table_id,
+                                               uuid.uuid4().hex[:8])
+        table_refs = {}
+        for round_num, copy_steps in enumerate(rounds):
+            print('Running round {} of {} with {} jobs.'.format(
+                round_num + 1, len(rounds), len(copy_steps)))
+            jobs = []
+            for sources, destination in copy_steps:
+                dest_ref = self._get_table_ref(destination, staging_prefix,
+                                               table_refs)
+                if destination == _REMAINDER:
+                    jobs.append(self._sample_source(remainder, dest_ref,
+                                                    source_rows))
+                    continue
+                copy_config = bigquery.CopyJobConfig()
+                copy_config.write_disposition = 'WRITE_APPEND' \
+                    if destination == _DESTINATION else 'WRITE_TRUNCATE'
+                jobs.append(self.client.copy_table(
+                    [self._get_table_ref(source, staging_prefix, table_refs)
+                     for source in sources],
+                    dest_ref,
+                    location=self.location,
+                    job_config=copy_config))
+            # Wait for this round's jobs to finish.
+            for job in jobs:
+                job.result()
+            if _REMAINDER in table_refs and round_num == 0:
+                self._check_remainder(remainder, table_refs[_REMAINDER])
+
+        for key, table_ref in table_refs.items():
+            if key not in (_SOURCE, _DESTINATION):
+                self.client.delete_table(table_ref)
+
+    def _get_table_ref(self, key, staging_prefix, table_refs):
+        """
+        Maps a table key from plan_copy_schedule to a TableReference. The
+        staging tables are created in the destination dataset.
+        """
+        if key not in table_refs:
+            if key == _SOURCE:
+                table_refs[key] = self.source_table.reference
+            elif key == _DESTINATION:
+                table_refs[key] = self.dest_table_ref
+            elif key == _REMAINDER:
+                table_refs[key] = self.client.dataset(
+                    self.dest_table_ref.dataset_id).table(
+                        staging_prefix + '_remainder')
+            else:
+                level, i = key
+                table_refs[key] = self.client.dataset(
+                    self.dest_table_ref.dataset_id).table(
+                        '{}_{}_{}'.format(staging_prefix, level, i))
+        return table_refs[key]
+
+    def _sample_source(self, rows, dest_ref, source_rows, sample=True):
+        """
+        Starts a query job writing rows rows of the source table to dest_ref.
+        With sample the query only reads a sample of the source table's
+        blocks rather than scanning the whole table for a LIMIT.
+        """
+        job_config = bigquery.QueryJobConfig()
+        job_config.destination = dest_ref
+        job_config.write_disposition = 'WRITE_TRUNCATE'
+        job_config.allow_large_results = True
+
+        tablesample = ''
+        if sample:
+            # Sample twice the fraction of rows needed because blocks are
+            # not all the same size.
+            percent = min(100, int(math.ceil(200.0 * rows / source_rows)))
+            tablesample = 'TABLESAMPLE SYSTEM ({} PERCENT)'.format(percent)
+        sql = """
+            SELECT *
+            FROM `{}.{}.{}` {}
+            LIMIT {}
+        """.format(self.project, self.source_table.dataset_id,
+                   self.source_table.table_id, tablesample, rows)
+
+        # API request to BigQuery with query and config defined above.
+        return self.client.query(
+            sql,
+            # Location must match that of the dataset(s) referenced in
+            # the query and of the destination table.
+            location=self.location,
+            job_config=job_config
+        )
 
-        while gap > 0:  # Copy until we've reached or exceeded target_rows
+    def _check_remainder(self, rows, dest_ref):
+        """
+        Falls back to a LIMIT query over the whole source table if the
+        sample did not contain enough rows.
+        """
+        if self.client.get_table(dest_ref).num_rows < rows:
+            print('Sample was short of {} rows, querying the whole source '
+                  'table.'.format(rows))
+            self._sample_source(rows, dest_ref, self.source_table.num_rows,
+                                sample=False).result()
 
-            # API requests to get the latest table info.
-            source_table = self.client.get_table(self.source_table)
-            try:
-                dest_table = self.client.get_table(self.dest_table_ref)
 
-            except NotFound:
-                dest_table = self.client.create_table(
-                    bigquery.Table(self.dest_table_ref)
-                )
+# Keys of the tables in a copy schedule. Staging tables are keyed by a
+# (level, index) tuple and hold (parallel_copies + 1) ** level copies of the
+# source table.
+_SOURCE = 'source'
+_DESTINATION = 'destination'
+_REMAINDER = 'remainder'
 
-            # Get the latest size of the dest_table.
-            # Note that for the first call these properties are None.
-            dest_rows = dest_table.num_rows
-            dest_bytes = dest_table.num_bytes
-            dest_gb = dest_bytes / float(1024 ** 3)
 
-            # Recalculate the gap.
-            if dest_rows:
-                gap = self.target_rows - dest_rows
-            else:
-                gap = self.target_rows
-
-            print('{} rows in table of size {} GB, with a target of {}, '
-                  'leaving a gap of {}'.format(
-                    dest_rows,
-                    round(dest_gb, 2), self.target_rows, gap))
-
-            # Greedily copy the largest of dest_table and source_table into
-            # dest_table without going over the target rows. The last query
-            # will be a subset of source_table via a limit query.
-            if gap < source_table.num_rows:
-                # This will be the last copy operation if target_rows is
-                # not a power of 2 times the number of rows originally in the
-                # source table. It is not a full copy.
-                job_config = bigquery.QueryJobConfig()
-                # Set the destination table
-
-                job_config.destination = self.dest_table_ref
-                job_config.write_disposition = 'WRITE_APPEND'
-                job_config.allow_large_results = True
-
-                sql = """
-                    SELECT *
-                    FROM `{}.{}.{}`
-                    LIMIT {}
-
-                """.format(self.project, self.source_table.dataset_id,
-                           self.source_table.table_id, gap)
-
-                # API request to BigQuery with query and config defined above.
-                query_job = self.client.query(
-                    sql,
-                    # Location must match that of the dataset(s) referenced in
-                    # the query and of the destination table.
-                    location=self.location,
-                    job_config=job_config
-                )
-                # Wait for query_job to finish.
-                query_job.result()
-            else:
-                if source_table.num_rows < dest_table.num_rows < gap:
-                    use_as_source_table = self.dest_table_ref
-                else:  # source_table.num_rows < gap < dest_table.num_rows
-                    use_as_source_table = self.source_table.reference
-                copy_config = bigquery.CopyJobConfig()
-                copy_config.write_disposition = 'WRITE_APPEND'
+def plan_copy_schedule(n_copies, parallel_copies=1):
+    """
+    Plans the copy jobs which append n_copies copies of the source table to
+    the destination table. n_copies is decomposed into base
+    parallel_copies + 1 digits (binary for a single copy per round). Each
+    round copies all the existing tables into parallel_copies new staging
+    tables, multiplying the rows staged by parallel_copies + 1, and the final
+    round appends the staging tables for each digit to the destination
+    table in one multi-source copy job.
 
-                copy_job = self.client.copy_table(use_as_source_table,
-                                                  self.dest_table_ref,
-                                                  job_config=copy_config)
-                # Wait for copy_job to finish.
-                copy_job.result()
+    Args:
+        n_copies (int): The number of copies of the source table to append.
+        parallel_copies (int): The maximum number of copy jobs per round.
+    Returns:
+        rounds (list): Rounds of (sources, destination) copy jobs keyed by
+            'source', 'destination' or a (level, index) staging table. The
+            jobs in a round are independent of each other.
+    """
+    if n_copies <= 0:
+        return []
+    radix = parallel_copies + 1
+    digits = []
+    while n_copies:
+        n_copies, digit = divmod(n_copies, radix)
+        digits.append(digit)
+
+    rounds = []
+    # Every table built so far. Level 0 holds the source table.
+    tables = [_SOURCE]
+    levels = [[_SOURCE]]
+    for level, digit in enumerate(digits):
+        # Below the top level each level gets parallel_copies new tables so
+        # the tables built so far always hold radix ** level copies. The top
+        # level only needs enough tables for its digit. A copy job cannot
+        # list the same table twice so level 0 pads the source with clones.
+        if level == len(digits) - 1:
+            n_new = digit - len(levels[level])
+        else:
+            n_new = parallel_copies
+        copy_steps = []
+        for i in range(n_new):
+            key = (level, i)
+            copy_steps.append((list(tables) if level else [_SOURCE], key))
+            levels[level].append(key)
+        if copy_steps:
+            rounds.append(copy_steps)
+        tables.extend(levels[level][1 if level == 0 else 0:])
+        levels.append([])
+
+    final_sources = []
+    for level, digit in enumerate(digits):
+        final_sources.extend(levels[level][:digit])
+    rounds.append([(final_sources, _DESTINATION)])
+    return rounds
 
 
 def parse_data_resizer_args(argv):
@@ -243,6 +366,13 @@ def parse_data_resizer_args(argv):
                         help='The location of the BigQuery Tables.',
                         default='US')
 
+    parser.add_argument('--parallel_copies', dest='parallel_copies',
+                        required=False, type=int,
+                        help='The maximum number of copy jobs to run at once. '
+                             'Each round multiplies the staged rows by '
+                             'parallel_copies + 1.',
+                        default=3)
+
     data_args = parser.parse_args(argv)
     return BigQueryTableResizer(
                 project=data_args.project,
@@ -252,7 +382,8 @@ def parse_data_resizer_args(argv):
                 destination_table=data_args.destination_table,
                 target_rows=data_args.target_rows,
                 target_gb=data_args.target_gb,
-                location=data_args.location)
+                location=data_args.location,
+                parallel_copies=data_args.parallel_copies)
 
 
 def run(argv=None):
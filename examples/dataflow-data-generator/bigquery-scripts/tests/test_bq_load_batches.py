@@ -17,9 +17,11 @@ import unittest
 import os
 import uuid
 from google.cloud import bigquery
+from google.api_core.exceptions import Conflict
 from google.api_core.retry import Retry
 
-from bq_load_batches import parse_gsutil_long_output_file
+from bq_load_batches import parse_gsutil_long_output_file, plan_batches, \
+    submit_jobs, batch_job_id, save_state, MAX_BATCH_BYTES
 
 
 
@@ -44,7 +46,7 @@ class TestBigQueryLoadBatches(unittest.TestCase):
            'gs://python-dataflow-example/data_files/usa_names.csv']
         ]
         self.assertEquals(actual_batch, expected_batch)
-        BYTES_IN_TB = 10**13
+        BYTES_IN_TB = 10**12
 
         # Test multiple batches mocking the gsutil output.
         with open (self.filename, 'w') as f:
@@ -71,5 +73,123 @@ class TestBigQueryLoadBatches(unittest.TestCase):
     def tearDown(self):
         cmd = 'rm ' + self.filename
         os.system(cmd)
+
+
+class FakeLoadJob(object):
+    """
+    Stands in for a bigquery.job.LoadJob which is done after one poll.
+    """
+    def __init__(self, job_id, error_result=None):
+        self.job_id = job_id
+        self.error_result = error_result
+
+    def done(self):
+        return True
+
+
+class FakeClient(object):
+    """
+    Records load jobs and fails the first attempt of the URIs in fail_once.
+    Like BigQuery, rejects a job id which was already used.
+    """
+    def __init__(self, fail_once=(), jobs=None):
+        self.fail_once = set(fail_once)
+        self.loads = []
+        self.jobs = dict(jobs or {})
+
+    def dataset(self, dataset_id):
+        return bigquery.DatasetReference('project', dataset_id)
+
+    def load_table_from_uri(self, source_uris, destination, job_config,
+                            job_id):
+        if job_id in self.jobs:
+            raise Conflict('Already Exists: Job {}'.format(job_id))
+        self.loads.append(source_uris)
+        error_result = None
+        if source_uris[0] in self.fail_once:
+            self.fail_once.remove(source_uris[0])
+            error_result = {'reason': 'backendError'}
+        self.jobs[job_id] = FakeLoadJob(job_id, error_result)
+        return self.jobs[job_id]
+
+    def get_job(self, job_id):
+        return self.jobs[job_id]
+
+
+class TestBigQueryLoadBatchPlanner(unittest.TestCase):
+    """
+    This is a unit test of the batch planning and job submission logic which
+    does not call GCP.
+    """
+    def test_plan_batches(self):
+        uris = ['gs://bucket/{}'.format(i) for i in range(5)]
+        # First fit decreasing puts 6 with 4 and 5 with 5.
+        batches = plan_batches(uris, [5, 6, 4, 5, 1], max_batch_bytes=10,
+                               max_batch_uris=10)
+        self.assertEqual(batches, [['gs://bucket/2', 'gs://bucket/1'],
+                                   ['gs://bucket/0', 'gs://bucket/3'],
+                                   ['gs://bucket/4']])
+
+        # The URI limit splits batches which are well under the byte limit.
+        batches = plan_batches(uris, [1] * 5, max_batch_bytes=10,
+                               max_batch_uris=2)
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual(sorted(sum(batches, [])), uris)
+
+    def test_plan_batches_byte_limit(self):
+        # Each load job is limited to 15 TB.
+        tb = 10 ** 12
+        self.assertEqual(MAX_BATCH_BYTES, 15 * tb)
+        uris = ['gs://bucket/{}'.format(i) for i in range(4)]
+        sizes = [8 * tb, 8 * tb, 7 * tb, 15 * tb + 1]
+        batches = plan_batches(uris, sizes)
+        self.assertEqual(batches, [['gs://bucket/3'],
+                                   ['gs://bucket/2', 'gs://bucket/0'],
+                                   ['gs://bucket/1']])
+
+    def test_submit_jobs_retries_and_resumes(self):
+        state_file = '/tmp/bq_load_batches_{}.state.json'.format(uuid.uuid4())
+        batches = [['gs://bucket/{}'.format(i)] for i in range(4)]
+        client = FakeClient(fail_once=['gs://bucket/2'])
+        try:
+            failed = submit_jobs(client, None, 'dataset', 'table', batches,
+                                 max_in_flight=2, poll_interval=0,
+                                 state_file=state_file)
+            self.assertEqual(failed, [])
+            # Only the failed batch is loaded twice.
+            self.assertEqual(len(client.loads), 5)
+
+            # Rerunning with the same state file loads nothing.
+            client = FakeClient()
+            submit_jobs(client, None, 'dataset', 'table', batches,
+                        poll_interval=0, state_file=state_file)
+            self.assertEqual(client.loads, [])
+        finally:
+            os.remove(state_file)
+
+    def test_submit_jobs_finds_unrecorded_job(self):
+        # The previous run stopped after submitting the job of batch 0 but
+        # before recording it in the state file.
+        state_file = '/tmp/bq_load_batches_{}.state.json'.format(uuid.uuid4())
+        batches = [['gs://bucket/{}'.format(i)] for i in range(2)]
+        save_state(state_file, {'run_id': 'run'})
+        job_id = batch_job_id('run', batches[0], 1)
+        client = FakeClient(jobs={job_id: FakeLoadJob(job_id)})
+        try:
+            failed = submit_jobs(client, None, 'dataset', 'table', batches,
+                                 poll_interval=0, state_file=state_file)
+            self.assertEqual(failed, [])
+            self.assertEqual(client.loads, [batches[1]])
+        finally:
+            os.remove(state_file)
+
+    def test_submit_jobs_gives_up(self):
+        batches = [['gs://bucket/0']]
+        client = FakeClient(fail_once=['gs://bucket/0'])
+        failed = submit_jobs(client, None, 'dataset', 'table', batches,
+                             max_retries=0, poll_interval=0)
+        self.assertEqual(failed, [0])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -18,7 +18,7 @@ import uuid
 from google.cloud import bigquery
 from google.api_core.retry import Retry
 
-from bq_table_resizer import BigQueryTableResizer
+from bq_table_resizer import BigQueryTableResizer, plan_copy_schedule
 
 
 class TestBigQueryTableResizer(unittest.TestCase):
@@ -102,5 +102,40 @@ class TestBigQueryTableResizer(unittest.TestCase):
         self.client.delete_dataset(dataset, retry=Retry())
 
 
+class TestPlanCopySchedule(unittest.TestCase):
+    """
+    This is a unit test of the copy schedule planning which does not call
+    GCP.
+    """
+    def simulate(self, rounds):
+        """
+        Returns the number of source copies the schedule appends to the
+        destination.
+        """
+        copies = {'source': 1, 'destination': 0}
+        for copy_steps in rounds:
+            built = {}
+            for sources, destination in copy_steps:
+                # Copy jobs cannot list a table twice or read a table built
+                # in the same round.
+                self.assertEqual(len(set(sources)), len(sources))
+                for source in sources:
+                    self.assertIn(source, copies)
+                built[destination] = sum(copies[source] for source in sources)
+            copies.update(built)
+        return copies['destination']
+
+    def test_plan_copy_schedule(self):
+        for parallel_copies in [1, 3]:
+            for n_copies in range(1, 130):
+                rounds = plan_copy_schedule(n_copies, parallel_copies)
+                self.assertEqual(self.simulate(rounds), n_copies)
+        self.assertEqual(plan_copy_schedule(0), [])
+        # 100 = 1210 in base 4.
+        self.assertEqual([len(copy_steps)
+                          for copy_steps in plan_copy_schedule(100, 3)],
+                         [3, 3, 3, 1, 1])
+
+
 if __name__ == '__main__':
     unittest.main()
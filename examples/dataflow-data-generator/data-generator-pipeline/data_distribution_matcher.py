@@ -77,7 +77,7 @@ def run(argv=None):
     )
         
     if data_args.primary_key_cols:
-        rows |= EnforcePrimaryKeys(data_args.primary_key_col)
+        rows |= EnforcePrimaryKeys(data_args.primary_key_cols.split(','))
 
     if data_args.csv_schema_order:
         (rows
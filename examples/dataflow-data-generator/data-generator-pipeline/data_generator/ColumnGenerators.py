@@ -0,0 +1,661 @@
+# Copyright 2019 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Typed column generators for the performant data generator.
+
+A BigQuery schema is compiled once by compile_column_plan into a list of
+ColumnGenerator objects (a "plan"). All of the schema inspection (types,
+modes, VARCHAR lengths in descriptions, _max_ / _key / _id name conventions)
+happens at compile time so generating rows only executes the plan.
+
+Plans compiled with physical_types=True emit TIMESTAMP, DATETIME, DATE and
+TIME values in the physical types used by the Avro and Parquet sinks (epoch
+microseconds, epoch days and microseconds since midnight) rather than
+formatted strings.
+
+Every generate method takes an optional numpy RandomState so a seeded shard
+of rows can be regenerated exactly.
+"""
+
+import datetime
+import re
+import string
+import zlib
+
+import numpy as np
+
+# Characters to draw from when generating random strings.
+_ASCII_LETTERS = np.array(list(string.ascii_letters), dtype='S1')
+
+_DEFAULT_STRING_LENGTH = 36
+
+_UNIX_EPOCH = datetime.date(1970, 1, 1)
+_MICROSECONDS_PER_SECOND = 10 ** 6
+
+
+# Bounded key distributions over at most this many keys are sampled from a
+# precomputed alias table. Larger key sets are sampled directly from numpy.
+_MAX_ALIAS_TABLE_KEYS = 10 ** 6
+
+_ZIPF_EXPONENT = 1.25
+
+# Alias tables keyed by (n_keys, distribution) so each worker builds a table
+# once.
+_KEY_ALIAS_TABLES = {}
+
+
+class AliasTable(object):
+    """
+    Samples from a discrete distribution with Vose's alias method. Building
+    the table is O(k) for k outcomes after which each draw is O(1): pick an
+    outcome uniformly and either keep it or take its alias.
+    """
+    def __init__(self, weights, values=None):
+        """
+        Args:
+            weights (list): The non-negative relative weight of each outcome.
+            values (list): The value to return for each outcome. Defaults to
+                the index of the outcome.
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.ndim != 1 or not len(weights) or (weights < 0).any() \
+                or not weights.sum() > 0:
+            raise ValueError('Alias table weights must be non-negative with '
+                             'a positive sum.')
+        n = len(weights)
+        scaled = weights * (n / weights.sum())
+        self.prob = np.ones(n)
+        self.alias = np.arange(n)
+        small = np.flatnonzero(scaled < 1.0).tolist()
+        large = np.flatnonzero(scaled >= 1.0).tolist()
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] += scaled[less] - 1.0
+            if scaled[more] < 1.0:
+                small.append(more)
+            else:
+                large.append(more)
+        # Anything left over is only off from 1.0 by rounding error so keeps
+        # a probability of 1.0.
+        self.values = None if values is None else np.asarray(values)
+
+    def __len__(self):
+        return len(self.prob)
+
+    def sample(self, n, random_state=np.random):
+        """
+        Draws n values from the distribution.
+
+        Args:
+            n (int): The number of values to draw.
+            random_state (numpy.random.RandomState): The source of randomness.
+        Returns:
+            values (numpy.ndarray): n values.
+        """
+        idxs = random_state.randint(0, len(self.prob), size=n)
+        keep = random_state.random_sample(n) < self.prob[idxs]
+        idxs = np.where(keep, idxs, self.alias[idxs])
+        if self.values is None:
+            return idxs
+        return self.values[idxs]
+
+
+def get_key_alias_table(n_keys, distribution):
+    """
+    Returns the cached alias table for a bounded 'binomial' or 'zipf' key
+    distribution, building it on first use. Returns None for 'uniform' keys,
+    which numpy already draws in O(1), and for key sets too large to table.
+
+    Args:
+        n_keys (int): The cardinality of the key set.
+        distribution (str): One of 'uniform', 'binomial' or 'zipf'.
+    Returns:
+        table (AliasTable)
+    """
+    n_keys = int(n_keys)
+    if distribution == 'uniform' or n_keys > _MAX_ALIAS_TABLE_KEYS:
+        return None
+    if (n_keys, distribution) not in _KEY_ALIAS_TABLES:
+        if distribution == 'binomial':
+            # Binomial(n_keys, .5) pmf over [0, n_keys] in log space to avoid
+            # overflowing the binomial coefficients.
+            k = np.arange(1, n_keys + 1)
+            log_weights = np.concatenate(
+                [[0.0], np.cumsum(np.log(n_keys - k + 1.0) - np.log(k))])
+            table = AliasTable(np.exp(log_weights - log_weights.max()))
+        else:
+            # Zipf truncated to [1, n_keys].
+            keys = np.arange(1, n_keys + 1)
+            table = AliasTable(keys ** -_ZIPF_EXPONENT, values=keys)
+        _KEY_ALIAS_TABLES[(n_keys, distribution)] = table
+    return _KEY_ALIAS_TABLES[(n_keys, distribution)]
+
+
+def get_histogram_alias_table(key_set):
+    """
+    Builds an alias table to draw keys from a key set.
+
+    Args:
+        key_set (list): Either keys which are drawn uniformly or
+            (key, frequency) pairs, as in a bq_histogram_tool histogram
+            table, which are drawn in proportion to their frequency.
+    Returns:
+        table (AliasTable)
+    """
+    if key_set and isinstance(key_set[0], tuple):
+        keys, frequencies = zip(*key_set)
+        return AliasTable([float(frequency) for frequency in frequencies],
+                          values=list(keys))
+    return AliasTable(np.ones(len(key_set)), values=list(key_set))
+
+
+class KeySampler(object):
+    """
+    Hands out keys one at a time from batches drawn from an alias table, for
+    callers which need a single key per record.
+    """
+    def __init__(self, table, batch_size=10000, random_state=np.random):
+        self.table = table
+        self.batch_size = batch_size
+        self.random_state = random_state
+        self._keys = []
+
+    def next_key(self):
+        if not self._keys:
+            self._keys = self.table.sample(self.batch_size,
+                                           self.random_state).tolist()
+        return self._keys.pop()
+
+
+def draw_skewed_keys(n, n_keys, distribution=None, random_state=np.random):
+    """
+    Draws n keys from the key set [0, n_keys] according to distribution.
+
+    Args:
+        n (int): The number of keys to draw.
+        n_keys (int): The cardinality of the key set.
+        distribution (str): One of 'uniform', 'binomial' or 'zipf'.
+        random_state (numpy.random.RandomState): The source of randomness.
+            Defaults to the global numpy random state.
+    Returns:
+        keys (numpy.ndarray): n integer keys.
+    """
+    if distribution is None or distribution == 'None':
+        distribution = 'uniform'
+    distribution = distribution.lower()
+    if distribution not in ('uniform', 'binomial', 'zipf'):
+        raise ValueError(
+            'Unsupported key distribution: {}'.format(distribution))
+    table = get_key_alias_table(n_keys, distribution)
+    if table is not None:
+        return table.sample(n, random_state)
+    if distribution == 'binomial':
+        return random_state.binomial(int(n_keys), p=.5, size=n)
+    elif distribution == 'zipf':
+        # Key sets too large for an alias table rarely draw out of range so
+        # only those keys are redrawn.
+        keys = random_state.zipf(_ZIPF_EXPONENT, size=n)
+        out_of_range = keys > n_keys
+        while out_of_range.any():
+            keys[out_of_range] = random_state.zipf(_ZIPF_EXPONENT,
+                                                   size=out_of_range.sum())
+            out_of_range = keys > n_keys
+        return keys
+    return random_state.randint(1, n_keys, size=n)
+
+
+def generate_rows(plan, n, random_state=np.random):
+    """
+    Executes a plan to generate n rows.
+
+    Args:
+        plan (list): ColumnGenerator objects as returned by
+            compile_column_plan.
+        n (int): The number of rows to generate.
+        random_state (numpy.random.RandomState): The source of randomness.
+            Pass a seeded RandomState to generate the same rows each time.
+    Returns:
+        rows (list): n dictionaries mapping field names to values.
+    """
+    names = [column.name for column in plan]
+    columns = [column.generate(n, random_state) for column in plan]
+    return [dict(zip(names, values)) for values in zip(*columns)]
+
+
+class ColumnGenerator(object):
+    """
+    Generates the values for a single field of the schema.
+
+    Subclasses implement generate_array which returns a numpy array of n
+    values. This base class converts it to python values and applies the
+    null probability for NULLABLE fields.
+    """
+    def __init__(self, name, null_prob=0.0):
+        """
+        Args:
+            name (str): The name of the field.
+            null_prob (float): The probability a value is null. This should
+                be 0.0 for fields which are not NULLABLE.
+        """
+        self.name = name
+        self.null_prob = null_prob
+
+    def generate_array(self, n, random_state=np.random):
+        raise NotImplementedError
+
+    def generate_null_mask(self, n, random_state=np.random):
+        """
+        Returns a boolean array marking which of n values are null, or None
+        if no values should be null.
+        """
+        if self.null_prob > 0:
+            return random_state.random_sample(n) < self.null_prob
+        return None
+
+    def generate(self, n, random_state=np.random):
+        """
+        Generates n python values for this field.
+        """
+        values = self.generate_array(n, random_state).tolist()
+        is_null = self.generate_null_mask(n, random_state)
+        if is_null is not None:
+            for idx in np.flatnonzero(is_null).tolist():
+                values[idx] = None
+        return values
+
+
+class KeyColumnGenerator(ColumnGenerator):
+    """
+    Draws keys from [0, n_keys) for _key and _id columns. These are never
+    null.
+    """
+    def __init__(self, name, n_keys, distribution=None, as_string=False):
+        super(KeyColumnGenerator, self).__init__(name)
+        self.n_keys = n_keys
+        self.distribution = distribution
+        self.as_string = as_string
+
+    def generate_array(self, n, random_state=np.random):
+        return draw_skewed_keys(n, self.n_keys, self.distribution,
+                                random_state)
+
+    def generate(self, n, random_state=np.random):
+        keys = self.generate_array(n, random_state).tolist()
+        if self.as_string:
+            return [str(key) for key in keys]
+        return keys
+
+
+class FeistelPermutation(object):
+    """
+    A keyed bijection of [0, n). Indexes are encrypted with a balanced
+    Feistel network over the smallest even number of bits covering n and
+    values which land outside [0, n) are encrypted again (cycle walking)
+    until they fall inside it.
+    """
+    _ROUNDS = 4
+    _MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+    def __init__(self, n, seed=0):
+        """
+        Args:
+            n (int): The size of the domain. At most 2 ** 64.
+            seed (int or list): Seeds the round keys of the network.
+        """
+        self.n = int(n)
+        half_bits = max(1, ((self.n - 1).bit_length() + 1) // 2)
+        self.half_bits = np.uint64(half_bits)
+        self.mask = np.uint64((1 << half_bits) - 1)
+        self.round_keys = np.random.RandomState(seed).randint(
+            0, 2 ** 31 - 1, size=self._ROUNDS).astype(np.uint64)
+
+    def _encrypt(self, values):
+        left = values >> self.half_bits
+        right = values & self.mask
+        for round_key in self.round_keys:
+            # A multiply-xorshift round function. uint64 arrays wrap on
+            # overflow.
+            mixed = (right ^ round_key) * self._MULTIPLIER
+            mixed ^= mixed >> np.uint64(29)
+            left, right = right, left ^ (mixed & self.mask)
+        return (left << self.half_bits) | right
+
+    def permute(self, idxs):
+        """
+        Maps each index in [0, n) to its position in the permutation.
+
+        Args:
+            idxs (numpy.ndarray): Indexes in [0, n).
+        Returns:
+            values (numpy.ndarray): Distinct indexes get distinct values.
+        """
+        values = self._encrypt(np.asarray(idxs, dtype=np.uint64))
+        outside = values >= self.n
+        while outside.any():
+            values[outside] = self._encrypt(values[outside])
+            outside = values >= self.n
+        return values.astype(np.int64)
+
+
+class UniqueKeyColumnGenerator(KeyColumnGenerator):
+    """
+    Generates primary keys which are unique by construction. The key of row
+    i is a keyed permutation of i in [0, n_keys), so shards of rows which
+    seek to their first row index get distinct keys without a shuffle.
+    """
+    def __init__(self, name, n_keys, seed=0, as_string=False):
+        super(UniqueKeyColumnGenerator, self).__init__(name, n_keys,
+                                                       as_string=as_string)
+        # Each column gets its own permutation.
+        self.permutation = FeistelPermutation(
+            n_keys, seed=[int(seed), zlib.crc32(name.encode('utf-8'))
+                          & 0xffffffff])
+        self.next_row = 0
+
+    def seek(self, row_index):
+        """
+        Sets the index of the next row to generate a key for.
+        """
+        self.next_row = int(row_index)
+
+    def generate_array(self, n, random_state=np.random):
+        rows = np.arange(self.next_row, self.next_row + n, dtype=np.uint64)
+        self.next_row += n
+        return self.permutation.permute(rows)
+
+
+def seek_unique_keys(plan, row_index):
+    """
+    Seeks every UniqueKeyColumnGenerator in a plan to row_index.
+    """
+    for column in plan:
+        if isinstance(column, UniqueKeyColumnGenerator):
+            column.seek(row_index)
+
+
+class StringColumnGenerator(ColumnGenerator):
+    """
+    Generates random ascii strings of a fixed length.
+    """
+    def __init__(self, name, length=_DEFAULT_STRING_LENGTH, null_prob=0.0):
+        super(StringColumnGenerator, self).__init__(name, null_prob)
+        self.length = length
+
+    def generate_array(self, n, random_state=np.random):
+        if self.length == 0:
+            return np.array([u''] * n)
+        char_idxs = random_state.randint(0, len(_ASCII_LETTERS),
+                                         size=(n, self.length))
+        # View each row of characters as a single fixed width string.
+        return _ASCII_LETTERS[char_idxs].view(
+            'S%d' % self.length).ravel().astype('U%d' % self.length)
+
+
+class TimestampColumnGenerator(ColumnGenerator):
+    """
+    Generates timestamps between min_date and max_date formatted as
+    %Y-%m-%dT%H:%M:%S, or as microseconds since the epoch if physical.
+    """
+    def __init__(self, name, min_date, max_date, null_prob=0.0,
+                 physical=False):
+        super(TimestampColumnGenerator, self).__init__(name, null_prob)
+        self.start = np.datetime64(min_date, 's')
+        self.start_micros = (min_date - _UNIX_EPOCH).days * 24 * 60 * 60 * \
+            _MICROSECONDS_PER_SECOND
+        self.max_seconds = int((max_date - min_date).total_seconds())
+        self.physical = physical
+
+    def generate_array(self, n, random_state=np.random):
+        seconds = random_state.randint(0, self.max_seconds + 1, size=n)
+        if self.physical:
+            return self.start_micros + \
+                seconds.astype(np.int64) * _MICROSECONDS_PER_SECOND
+        # numpy formats datetime64[s] as %Y-%m-%dT%H:%M:%S.
+        return (self.start + seconds).astype('U19')
+
+
+class DateColumnGenerator(ColumnGenerator):
+    """
+    Generates dates between min_date and max_date formatted as %Y-%m-%d, or
+    as days since the epoch if physical.
+    """
+    def __init__(self, name, min_date, max_date, null_prob=0.0,
+                 physical=False):
+        super(DateColumnGenerator, self).__init__(name, null_prob)
+        self.start = np.datetime64(min_date, 'D')
+        self.start_days = (min_date - _UNIX_EPOCH).days
+        self.max_days = (max_date - min_date).days
+        self.physical = physical
+
+    def generate_array(self, n, random_state=np.random):
+        days = random_state.randint(0, self.max_days + 1, size=n)
+        if self.physical:
+            return self.start_days + days
+        return (self.start + days).astype('U10')
+
+
+class TimeColumnGenerator(ColumnGenerator):
+    """
+    Generates times of day formatted as %H:%M:%S, or as microseconds since
+    midnight if physical.
+    """
+    def __init__(self, name, null_prob=0.0, physical=False):
+        super(TimeColumnGenerator, self).__init__(name, null_prob)
+        self.physical = physical
+
+    def generate_array(self, n, random_state=np.random):
+        seconds = random_state.randint(0, 24 * 60 * 60, size=n)
+        if self.physical:
+            return seconds.astype(np.int64) * _MICROSECONDS_PER_SECOND
+        return np.array([u'%02d:%02d:%02d' % (s // 3600, s // 60 % 60, s % 60)
+                         for s in seconds.tolist()])
+
+
+class IntegerColumnGenerator(ColumnGenerator):
+    """
+    Generates integers uniformly from [min_int, max_int].
+    """
+    def __init__(self, name, min_int, max_int, null_prob=0.0):
+        super(IntegerColumnGenerator, self).__init__(name, null_prob)
+        self.min_int = min_int
+        self.max_int = max_int
+
+    def generate_array(self, n, random_state=np.random):
+        return random_state.randint(self.min_int, self.max_int + 1, size=n,
+                                    dtype=np.int64)
+
+
+class FloatColumnGenerator(ColumnGenerator):
+    """
+    Generates floats uniformly from [min_float, max_float] rounded to
+    precision decimal places.
+    """
+    def __init__(self, name, min_float, max_float, precision, null_prob=0.0):
+        super(FloatColumnGenerator, self).__init__(name, null_prob)
+        self.min_float = min_float
+        self.max_float = max_float
+        self.precision = precision
+
+    def generate_array(self, n, random_state=np.random):
+        return np.round(random_state.uniform(self.min_float, self.max_float,
+                                             size=n),
+                        self.precision)
+
+
+class BooleanColumnGenerator(ColumnGenerator):
+    """
+    Generates random booleans.
+    """
+    def generate_array(self, n, random_state=np.random):
+        return random_state.randint(0, 2, size=n).astype(bool)
+
+
+class NullColumnGenerator(ColumnGenerator):
+    """
+    Placeholder for types without a generator (ie. BYTES, GEOGRAPHY).
+    """
+    def generate(self, n, random_state=np.random):
+        return [None] * n
+
+
+class RecordColumnGenerator(ColumnGenerator):
+    """
+    Generates nested records by executing a nested plan. REPEATED records
+    are filled with 0-3 elements.
+    """
+    def __init__(self, name, plan, repeated=True, null_prob=0.0):
+        super(RecordColumnGenerator, self).__init__(name, null_prob)
+        self.plan = plan
+        self.repeated = repeated
+
+    def generate_counts(self, n, random_state=np.random):
+        """
+        Returns the number of elements in each of n REPEATED records.
+        """
+        return random_state.randint(0, 4, size=n)
+
+    def generate(self, n, random_state=np.random):
+        if not self.repeated:
+            values = generate_rows(self.plan, n, random_state)
+            is_null = self.generate_null_mask(n, random_state)
+            if is_null is not None:
+                for idx in np.flatnonzero(is_null).tolist():
+                    values[idx] = None
+            return values
+        counts = self.generate_counts(n, random_state)
+        nested_rows = generate_rows(self.plan, int(counts.sum()),
+                                    random_state)
+        ends = np.cumsum(counts).tolist()
+        return [nested_rows[end - count:end]
+                for count, end in zip(counts.tolist(), ends)]
+
+
+def _get_max_from_name(fieldname):
+    """
+    Parses the upper bound out of field names like 'quantity_max_100'.
+    """
+    if '_max_' in fieldname.lower():
+        return fieldname[fieldname.lower().find('_max_') + 5:]
+    return None
+
+
+def compile_column(field, data_gen, physical_types=False, unique_keys=(),
+                   seed=0):
+    """
+    Compiles a single BigQuery schema field to a ColumnGenerator.
+
+    Args:
+        field (dict): The BigQuery schema field.
+        data_gen (DataGenerator): Provides the constraints on generated
+            values.
+        physical_types (bool): Generate temporal types as the integers
+            Avro and Parquet store rather than formatted strings.
+        unique_keys (iterable): Names of primary key fields which are
+            generated unique by construction.
+        seed (int): Seeds the key permutations of unique_keys.
+    Returns:
+        column (ColumnGenerator)
+    """
+    fieldname = field[u'name']
+    field_type = field[u'type']
+    null_prob = data_gen.null_prob if field.get(u'mode') == 'NULLABLE' \
+        else 0.0
+
+    if fieldname in unique_keys:
+        if field_type not in ('INTEGER', 'STRING'):
+            raise ValueError('Unique primary key {} must be an INTEGER or '
+                             'STRING field.'.format(fieldname))
+        return UniqueKeyColumnGenerator(fieldname, data_gen.n_keys, seed=seed,
+                                        as_string=(field_type == 'STRING'))
+
+    # Key columns are drawn from [0, n_keys) and are never null.
+    if '_key' in fieldname.lower() or '_id' in fieldname.lower():
+        return KeyColumnGenerator(fieldname, data_gen.n_keys,
+                                  distribution=data_gen.key_skew,
+                                  as_string=(field_type == 'STRING'))
+
+    if field_type == 'RECORD':
+        return RecordColumnGenerator(
+            fieldname,
+            compile_column_plan(data_gen, fields=field[u'fields'],
+                                physical_types=physical_types),
+            repeated=(field.get(u'mode') == 'REPEATED'),
+            null_prob=null_prob)
+    elif field_type == 'STRING':
+        length = _DEFAULT_STRING_LENGTH
+        # If the description of the field is a RDMS schema like VARCHAR(255)
+        # then we generate a string of this length.
+        if field.get(u'description'):
+            extracted_numbers = re.findall(r'\d+', field[u'description'])
+            if extracted_numbers:
+                length = int(extracted_numbers[0])
+        return StringColumnGenerator(fieldname, length, null_prob)
+    elif field_type in ('TIMESTAMP', 'DATETIME'):
+        return TimestampColumnGenerator(fieldname, data_gen.min_date,
+                                        data_gen.max_date, null_prob,
+                                        physical=physical_types)
+    elif field_type == 'DATE':
+        return DateColumnGenerator(fieldname, data_gen.min_date,
+                                   data_gen.max_date, null_prob,
+                                   physical=physical_types)
+    elif field_type == 'TIME':
+        return TimeColumnGenerator(fieldname, null_prob,
+                                   physical=physical_types)
+    elif field_type == 'INTEGER':
+        max_int = data_gen.max_int
+        if _get_max_from_name(fieldname):
+            max_int = int(_get_max_from_name(fieldname))
+        min_int = 0 if data_gen.only_pos else -1 * max_int
+        return IntegerColumnGenerator(fieldname, min_int, max_int, null_prob)
+    elif field_type in ('FLOAT', 'NUMERIC'):
+        max_float = float(data_gen.max_float)
+        if _get_max_from_name(fieldname):
+            max_float = float(_get_max_from_name(fieldname))
+        min_float = 0.0 if data_gen.only_pos else -1.0 * max_float
+        return FloatColumnGenerator(fieldname, min_float, max_float,
+                                    data_gen.float_precision, null_prob)
+    elif field_type == 'BOOLEAN':
+        return BooleanColumnGenerator(fieldname, null_prob)
+    return NullColumnGenerator(fieldname)
+
+
+def compile_column_plan(data_gen, fields=None, physical_types=False,
+                        unique_keys=(), seed=0):
+    """
+    Compiles a BigQuery schema to a list of ColumnGenerators.
+
+    Args:
+        data_gen (DataGenerator): Provides the schema and the constraints on
+            generated values.
+        fields (list): The schema fields to compile. Defaults to the top
+            level fields of the data_gen schema.
+        physical_types (bool): Generate temporal types as the integers
+            Avro and Parquet store rather than formatted strings.
+        unique_keys (iterable): Names of top level primary key fields which
+            are generated unique by construction.
+        seed (int): Seeds the key permutations of unique_keys.
+    Returns:
+        plan (list): A ColumnGenerator for each field in fields.
+    """
+    if fields:
+        # Primary keys are top level fields.
+        unique_keys = ()
+    else:
+        fields = data_gen.schema[u'fields']
+    return [compile_column(field, data_gen, physical_types=physical_types,
+                           unique_keys=unique_keys, seed=seed)
+            for field in fields]
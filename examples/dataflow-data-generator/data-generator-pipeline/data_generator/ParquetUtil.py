@@ -13,11 +13,14 @@
 # limitations under the License.
 
 import json
+import numpy as np
 import pyarrow as pa
 import logging
 import datetime
 from TimeUtil import datetime_to_epoch_timestamp, date_to_epoch_date, \
 time_to_epoch_time
+from data_generator.ColumnGenerators import KeyColumnGenerator, \
+NullColumnGenerator, RecordColumnGenerator
 
 
 def get_pyarrow_translated_schema(string_schema):
@@ -154,3 +157,68 @@ def fix_record_for_parquet(record, schema):
             else:
                 record[field_name] = _fix_primitive(record, field) 
     return [record]
+
+
+def generate_record_batch(plan, n, pa_schema, random_state=np.random):
+    """
+    Executes a column plan to generate n rows directly as a
+    pyarrow.RecordBatch, skipping the per-row dictionary stage.
+    :param plan: list of ColumnGenerators compiled with physical_types=True.
+    :param n: number of rows to generate.
+    :param pa_schema: pyarrow schema from get_pyarrow_translated_schema.
+    :param random_state: numpy RandomState to generate the values from.
+    :return: pa.RecordBatch
+    """
+    pa_types = dict((field.name, field.type) for field in pa_schema)
+    arrays = [_generate_arrow_array(column, n, pa_types[column.name],
+                                    random_state)
+              for column in plan]
+    return pa.RecordBatch.from_arrays(arrays,
+                                      [column.name for column in plan])
+
+
+def _generate_arrow_array(column, n, pa_type, random_state=np.random):
+    """
+    Generates n values of a single column as a pyarrow array.
+    :param column: ColumnGenerator for this field.
+    :param n: number of values to generate.
+    :param pa_type: the pa.DataType of this field.
+    :param random_state: numpy RandomState to generate the values from.
+    :return: pa.Array
+    """
+    if isinstance(column, RecordColumnGenerator):
+        if not column.repeated:
+            return _generate_struct_array(column, n, pa_type, random_state)
+        counts = column.generate_counts(n, random_state)
+        offsets = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(counts, out=offsets[1:])
+        struct_array = _generate_struct_array(column, int(offsets[-1]),
+                                              pa_type.value_type,
+                                              random_state)
+        return pa.ListArray.from_arrays(pa.array(offsets), struct_array)
+    if isinstance(column, NullColumnGenerator):
+        return pa.array([None] * n, type=pa_type)
+
+    values = column.generate_array(n, random_state)
+    if isinstance(column, KeyColumnGenerator) and column.as_string:
+        values = values.astype('U')
+    elif pa.types.is_integer(pa_type) and values.dtype.kind == 'f':
+        # NUMERIC fields are stored as int64 in parquet.
+        values = values.astype(np.int64)
+    elif pa.types.is_date32(pa_type):
+        values = values.astype(np.int32)
+    return pa.array(values, type=pa_type,
+                    mask=column.generate_null_mask(n, random_state))
+
+
+def _generate_struct_array(column, n, pa_type, random_state=np.random):
+    """
+    Generates n nested records of a RECORD column as a pa.StructArray.
+    """
+    nested_types = dict((pa_type[i].name, pa_type[i].type)
+                        for i in range(pa_type.num_fields))
+    children = [_generate_arrow_array(nested, n, nested_types[nested.name],
+                                      random_state)
+                for nested in column.plan]
+    return pa.StructArray.from_arrays(
+        children, [nested.name for nested in column.plan])
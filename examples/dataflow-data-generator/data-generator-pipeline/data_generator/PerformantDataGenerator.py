@@ -20,20 +20,32 @@ import logging
 import math
 import numpy as np
 import random
+import os
 import re
+import shutil
 import string
+import tempfile
 from uuid import uuid4
 
 import apache_beam as beam
 import apache_beam.io.gcp.bigquery as beam_bigquery
+from apache_beam.io.filesystems import FileSystems
+from apache_beam.transforms.window import GlobalWindows
 from faker import Faker
 from faker_schema.faker_schema import FakerSchema
 from google.cloud import bigquery as bq
 from google.cloud import storage as gcs
 from scipy.stats import truncnorm
 from google.cloud.exceptions import NotFound
+import pyarrow as pa
+import pyarrow.parquet as pq
 import sys
 
+from data_generator.ColumnGenerators import compile_column_plan, \
+    draw_skewed_keys, generate_rows, get_histogram_alias_table, KeySampler, \
+    seek_unique_keys
+from data_generator.ParquetUtil import generate_record_batch
+
 class DataGenerator(object):
     """
     A class which contains the logic for data generation.
@@ -262,12 +274,21 @@ class DataGenerator(object):
             record: (dict) A single generated record.
             key_col: (str) The foreign key column in record.
             key_set: (apache_beam.pvalue.AsList) side input from the BigQuery
-                query against the fact table.
+                query against the fact table. Either the distinct keys, which
+                are drawn uniformly, or (key, frequency) pairs which are
+                drawn in proportion to their frequency.
         Returns:
             record (dict) The record mutated to have keys in key_col that join 
                 to the fact table.
         """
-        record[self.dest_joining_key_col] = np.random.choice(key_set)
+        # The side input is the same list for every record so the alias
+        # table is only rebuilt if a new key_set is passed.
+        if getattr(self, '_joinable_key_set', None) is not key_set:
+            self._joinable_key_set = key_set
+            self._joinable_key_sampler = KeySampler(
+                get_histogram_alias_table(key_set))
+        record[self.dest_joining_key_col] = \
+            self._joinable_key_sampler.next_key()
         return [record]
 
 
@@ -276,6 +297,16 @@ class FakeRowGen(beam.DoFn):
     This class wraps the logic defined in DataGenerator object and generates a
     fake record for each element it is passed.
     """
+    # The number of records generate_fake generates at a time.
+    row_buffer_size = 1000
+    # Whether temporal fields are generated as the physical types of the
+    # Avro and Parquet sinks rather than strings.
+    physical_types = False
+    # Primary key fields which are generated unique by construction and the
+    # seed of their key permutations.
+    unique_key_cols = ()
+    seed = None
+
     def __init__(self, data_gen):
         """
         This initiates some properties of the FakeRowGen DoFn including an
@@ -481,17 +512,71 @@ class FakeRowGen(beam.DoFn):
         return truncnorm.rvs(a, b, mu, sigma)
 
     def get_skewed_key(self, distribution=None):
-        if distribution is None or distribution == 'None':
-            distribution = 'uniform'
-        if distribution.lower() == 'binomial':
-            return np.random.binomial(int(self.data_gen.n_keys), p=.5)
-        elif distribution.lower() == 'zipf':
-            key = np.random.zipf(1.25)
-            while key > self.data_gen.n_keys:
-                key = np.random.zipf(1.25, 1)
-            return int(key)
-        elif distribution.lower() == 'uniform':
-            return int(np.random.randint(1, self.data_gen.n_keys))
+        """
+        Draws a single key according to distribution. Bounded 'binomial' and
+        'zipf' keys come from an alias table built once per worker.
+        """
+        return int(draw_skewed_keys(1, self.data_gen.n_keys, distribution)[0])
+
+    def get_skewed_keys(self, n, distribution=None):
+        """
+        This is the vectorized version of get_skewed_key which draws n keys
+        in a single call.
+
+        Args:
+            n (int): The number of keys to draw.
+            distribution (str): One of 'uniform', 'binomial' or 'zipf'.
+        Returns:
+            keys (numpy.ndarray): n keys in the range [0, n_keys].
+        """
+        return draw_skewed_keys(n, self.data_gen.n_keys, distribution)
+
+    def setup(self):
+        """
+        Compiles the schema to a plan of column generators once per DoFn
+        instance rather than inspecting the schema for every value.
+        """
+        self.get_plan()
+
+    def get_plan(self, exclude=()):
+        """
+        This method returns the compiled plan of ColumnGenerators for the
+        schema, omitting the fields named in exclude. Plans are compiled
+        lazily and cached so this also works on runners that do not call
+        DoFn.setup.
+
+        Args:
+            exclude (iterable): Field names which should not be generated
+                (ie. key columns provided by a histogram table).
+        """
+        exclude = frozenset(exclude)
+        if not hasattr(self, '_plans'):
+            self._plans = {}
+        if exclude not in self._plans:
+            self._plans[exclude] = [
+                column
+                for column in compile_column_plan(
+                    self.data_gen, physical_types=self.physical_types,
+                    unique_keys=self.unique_key_cols, seed=self.seed or 0)
+                if column.name not in exclude
+            ]
+        return self._plans[exclude]
+
+    def generate_fake_batch(self, n, exclude=(), random_state=np.random):
+        """
+        This method creates n fake records at once. Values are generated
+        column by column as numpy arrays and only zipped into python
+        dictionaries at the end.
+
+        Args:
+            n (int): The number of records to generate.
+            exclude (iterable): Field names which should not be generated.
+            random_state (numpy.random.RandomState): The source of
+                randomness for these records.
+        Returns:
+            rows (list): n dictionaries mapping field names to values.
+        """
+        return generate_rows(self.get_plan(exclude), n, random_state)
 
     def convert_key_types(self, keys):
         """
@@ -524,22 +609,19 @@ class FakeRowGen(beam.DoFn):
         """
 
         # Drop the key columns because we do not need to randomly generate them.
-        if key_dict:
-            for key in key_dict.keys():
-                fschema.pop(key, None)
-
-        # Random numbers which will be converted to the proper datatype later by
-        # sanity_check.
-        # We pregenerate this way for efficiency. Sanity check will not just peform
-        # deterministic actions.
-        random_numbers = np.random.randint(0, sys.maxint, size=len(fschema))
-
-        # Generate a fake record.
-        col_idx = 0
-        data = {}
-        for col_name in fschema.keys():
-            data = self.sanity_check(data, col_name, random_numbers[col_idx])
-            col_idx += 1
+        exclude = set(key_dict.keys()) if key_dict else set()
+        exclude.update(column.name for column in self.get_plan()
+                       if column.name not in fschema)
+        exclude = frozenset(exclude)
+
+        # Records are generated in batches and handed out one at a time as
+        # executing the plan for a single row is dominated by numpy overhead.
+        if not hasattr(self, '_row_buffers'):
+            self._row_buffers = {}
+        if not self._row_buffers.get(exclude):
+            self._row_buffers[exclude] = self.generate_fake_batch(
+                self.row_buffer_size, exclude=exclude)
+        data = self._row_buffers[exclude].pop()
 
         if key_dict:
             keys = self.convert_key_types(key_dict)
@@ -557,7 +639,10 @@ class FakeRowGen(beam.DoFn):
             element: A single element of the PCollection 
         """
 
-        faker_schema = self.data_gen.get_faker_schema()
+        # The faker schema only depends on data_gen so is built once.
+        if not hasattr(self, '_faker_schema'):
+            self._faker_schema = self.data_gen.get_faker_schema()
+        faker_schema = self._faker_schema
         try:
             # Here the element is treated as the dictionary representing a single row
             # of the histogram table.
@@ -569,7 +654,206 @@ class FakeRowGen(beam.DoFn):
         except AttributeError:
         # The contents of this element are ignored if they are a string.
             row = self.generate_fake(fschema=faker_schema, key_dict=element)
-            yield row 
+            yield row
+
+
+class BatchFakeRowGen(FakeRowGen):
+    """
+    This DoFn generates records in batches. Each element it is passed is a
+    (shard_index, start, stop) shard as returned by get_shard_ranges and the
+    records are emitted as dictionaries rather than json strings.
+    """
+    def __init__(self, data_gen, batch_size=10000, physical_types=False,
+                 seed=None, unique_key_cols=()):
+        """
+        Attributes:
+            data_gen(DataGenerator): defines the shape of the data should be
+                generated by this DoFn.
+            batch_size(int): The maximum number of records to generate with
+                a single call to generate_fake_batch.
+            physical_types(bool): Emit TIMESTAMP, DATETIME, DATE and TIME
+                values as epoch micros, epoch days and micros since midnight
+                so they can be written to Avro or Parquet as is.
+            seed(int): Combined with the shard index to seed the random
+                state of each shard so a shard always generates the same
+                records regardless of which worker processes it.
+            unique_key_cols(list): Primary key fields to generate as keyed
+                permutations of the row index so they are unique without
+                deduplicating the output.
+        """
+        super(BatchFakeRowGen, self).__init__(data_gen)
+        self.batch_size = int(batch_size)
+        self.physical_types = physical_types
+        self.seed = None if seed is None else int(seed)
+        self.unique_key_cols = tuple(unique_key_cols)
+
+    def get_random_state(self, shard_index):
+        """
+        Returns the random state for a shard. Without a seed the global
+        numpy random state is used.
+        """
+        if self.seed is None:
+            return np.random
+        return np.random.RandomState([self.seed, shard_index])
+
+    def get_batch_sizes(self, shard):
+        """
+        Splits the records of a shard into batches of at most batch_size.
+        """
+        _, start, stop = shard
+        return [min(self.batch_size, stop - batch_start)
+                for batch_start in range(start, stop, self.batch_size)]
+
+    def process(self, element, *args, **kwargs):
+        """This function generates the records of a shard.
+
+        Args:
+            element: A (shard_index, start, stop) tuple.
+        """
+        random_state = self.get_random_state(element[0])
+        seek_unique_keys(self.get_plan(), element[1])
+        for n in self.get_batch_sizes(element):
+            for row in self.generate_fake_batch(n,
+                                                random_state=random_state):
+                yield row
+
+
+class BatchParquetWriter(BatchFakeRowGen):
+    """
+    This DoFn generates records as pyarrow RecordBatches and writes each
+    batch as a row group of a parquet file, skipping the per-row dictionary
+    stage entirely. Each bundle writes one file under temp_dir so memory
+    is bounded by a single batch, and outputs the path of the file once it is
+    complete. The files of bundles which are retried are never output, so
+    only the output paths should be moved to their final location, see
+    WriteRecordBatchesToParquet.
+    """
+    def __init__(self, data_gen, pa_schema, temp_dir, batch_size=10000,
+                 seed=None, unique_key_cols=()):
+        """
+        Attributes:
+            data_gen(DataGenerator): defines the shape of the data should be
+                generated by this DoFn.
+            pa_schema(pyarrow.Schema): The schema of the parquet files as
+                returned by get_pyarrow_translated_schema.
+            temp_dir(str): The GCS or local directory to write the files of
+                each bundle to.
+            batch_size(int): The number of records in each row group.
+            seed(int): Combined with the shard index to seed the random
+                state of each shard.
+            unique_key_cols(list): Primary key fields to generate unique by
+                construction.
+        """
+        super(BatchParquetWriter, self).__init__(
+            data_gen, batch_size, physical_types=True, seed=seed,
+            unique_key_cols=unique_key_cols)
+        self.pa_schema = pa_schema
+        self.temp_dir = temp_dir
+
+    def start_bundle(self):
+        self._local_file = None
+        self._writer = None
+
+    def process(self, element, *args, **kwargs):
+        """This function generates the records of a shard and appends them
+        to this bundle's parquet file.
+
+        Args:
+            element: A (shard_index, start, stop) tuple.
+        """
+        random_state = self.get_random_state(element[0])
+        seek_unique_keys(self.get_plan(), element[1])
+        for n in self.get_batch_sizes(element):
+            batch = generate_record_batch(self.get_plan(), n, self.pa_schema,
+                                          random_state)
+            if self._writer is None:
+                # Row groups are staged on local disk and copied to
+                # temp_dir once the bundle is complete.
+                self._local_file = tempfile.NamedTemporaryFile(
+                    suffix='.parquet', delete=False)
+                self._writer = pq.ParquetWriter(self._local_file.name,
+                                                batch.schema)
+            self._writer.write_table(pa.Table.from_batches([batch]))
+
+    def finish_bundle(self):
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._local_file.close()
+        temp_path = FileSystems.join(self.temp_dir,
+                                     '{}.parquet'.format(uuid4()))
+        with open(self._local_file.name, 'rb') as local_file:
+            with FileSystems.create(temp_path) as output_file:
+                shutil.copyfileobj(local_file, output_file)
+        os.remove(self._local_file.name)
+        logging.info('Wrote %s', temp_path)
+        self._writer = None
+        yield GlobalWindows.windowed_value(temp_path)
+
+
+def finalize_parquet_files(temp_paths, output_prefix, temp_dir):
+    """
+    Moves the parquet files of the completed bundles to
+    <output_prefix>-<index>-of-<count>.parquet and deletes temp_dir with the
+    files of any failed bundle. Files which were already moved by a previous
+    attempt are skipped, so this can be retried.
+
+    Args:
+        temp_paths(list): The paths output by BatchParquetWriter.
+        output_prefix(str): The GCS or local path prefix of the final files.
+        temp_dir(str): The directory BatchParquetWriter wrote to.
+
+    Returns:
+        The list of final file paths.
+    """
+    temp_paths = sorted(temp_paths)
+    output_paths = ['{}-{:05d}-of-{:05d}.parquet'.format(
+        output_prefix, i, len(temp_paths)) for i in range(len(temp_paths))]
+    to_rename = [(temp_path, output_path)
+                 for temp_path, output_path in zip(temp_paths, output_paths)
+                 if FileSystems.exists(temp_path)]
+    if to_rename:
+        FileSystems.rename([src for src, _ in to_rename],
+                           [dst for _, dst in to_rename])
+    leftover = [metadata.path for match in FileSystems.match(
+        [FileSystems.join(temp_dir, '*')]) for metadata in match.metadata_list]
+    if leftover:
+        FileSystems.delete(leftover)
+    if FileSystems.exists(temp_dir):
+        FileSystems.delete([temp_dir])
+    logging.info('Wrote %d parquet files to %s', len(output_paths),
+                 output_prefix)
+    return output_paths
+
+
+class WriteRecordBatchesToParquet(beam.PTransform):
+    """
+    This is a PTransform to generate the records of (shard_index, start, stop)
+    shards as pyarrow RecordBatches and write them to parquet files. The
+    files are written to a temporary directory and moved to output_prefix
+    once every bundle is complete, so retried bundles leave no duplicate or
+    partial files.
+    """
+    def __init__(self, data_gen, pa_schema, output_prefix, batch_size=10000,
+                 seed=None, unique_key_cols=()):
+        """
+        Args:
+            See BatchParquetWriter, output_prefix(str) is the GCS or local
+            path prefix to write files to.
+        """
+        self.output_prefix = output_prefix
+        self.temp_dir = '{}-temp-{}'.format(output_prefix, uuid4())
+        self.writer = BatchParquetWriter(data_gen, pa_schema, self.temp_dir,
+                                         batch_size, seed=seed,
+                                         unique_key_cols=unique_key_cols)
+
+    def expand(self, shards):
+        return (shards
+            | 'Write Parquet Files to Temp Dir' >> beam.ParDo(self.writer)
+            | 'Collect Parquet Files' >> beam.combiners.ToList()
+            | 'Finalize Parquet Files' >> beam.Map(
+                    finalize_parquet_files, self.output_prefix,
+                    self.temp_dir))
 
 
 def parse_data_generator_args(argv):
@@ -603,8 +887,44 @@ def parse_data_generator_args(argv):
                              'BigQuery table.',
                         default=10)
 
+    parser.add_argument('--batch_size', dest='batch_size', required=False,
+                        help='If set, records are generated in vectorized '
+                             'batches of up to this many records instead of '
+                             'one at a time.',
+                        default=None)
+
+    parser.add_argument('--rows_per_shard', dest='rows_per_shard',
+                        required=False,
+                        help='The number of records each initial element of '
+                             'the pipeline fans out into.',
+                        default=100000)
+
+    parser.add_argument('--seed', dest='seed', required=False,
+                        help='Seed for the random state of each shard. Runs '
+                             'with the same seed and --batch_size generate '
+                             'the same records. A random seed is chosen and '
+                             'logged if this is not set.',
+                        default=None)
+
+    parser.add_argument('--native_types', dest='native_types',
+                        help='This is a flag for generating TIMESTAMP, '
+                             'DATETIME, DATE and TIME values directly as the '
+                             'integers stored in avro and parquet files. '
+                             'Requires --batch_size and cannot be combined '
+                             'with csv or BigQuery output.',
+                        action="store_true")
+
     parser.add_argument('--primary_key_cols', dest='primary_key_cols', required=False,
-                        help='Field name of primary key. ', default=None)
+                        help='Comma separated field names of the (composite) '
+                             'primary key.', default=None)
+
+    parser.add_argument('--unique_primary_keys', dest='unique_primary_keys',
+                        help='This is a flag for generating the '
+                             '--primary_key_cols as keyed permutations of '
+                             'the row number so they are unique without '
+                             'deduplicating the output. Requires '
+                             '--batch_size.',
+                        action="store_true")
 
     parser.add_argument('--p_null', dest='p_null', required=False,
                         help='Probability a nullable column is null.',
@@ -622,7 +942,10 @@ def parse_data_generator_args(argv):
                              'This also supports "binomial" giving a maximum '
                              'variance bell curve of keys over the range of the'
                              ' keyset or "zipf" giving a distribution across '
-                             'the keyset according to zipf\'s law',
+                             'the keyset according to zipf\'s law. When '
+                             'generating joinable tables "empirical" draws '
+                             'the joining key in proportion to its frequency '
+                             'in the fact table.',
                         default=None)
 
     parser.add_argument('--min_date', dest='min_date', required=False,
@@ -15,13 +15,13 @@
 from __future__ import absolute_import
 import argparse
 import datetime
+import itertools
 import json
 import logging
 import math
 import numpy as np
 import random
 import re
-from uuid import uuid4
 
 import apache_beam as beam
 import apache_beam.io.gcp.bigquery as beam_bigquery
@@ -33,6 +33,9 @@ from scipy.stats import truncnorm
 from google.cloud.exceptions import NotFound
 import sys
 
+from data_generator.ColumnGenerators import draw_skewed_keys, \
+    get_histogram_alias_table, KeySampler
+
 class DataGenerator(object):
     """
     A class which contains the logic for data generation.
@@ -258,12 +261,21 @@ class DataGenerator(object):
             record: (dict) A single generated record.
             key_col: (str) The foreign key column in record.
             key_set: (apache_beam.pvalue.AsList) side input from the BigQuery
-                query against the fact table.
+                query against the fact table. Either the distinct keys, which
+                are drawn uniformly, or (key, frequency) pairs which are
+                drawn in proportion to their frequency.
         Returns:
             record (dict) The record mutated to have keys in key_col that join 
                 to the fact table.
         """
-        record[self.dest_joining_key_col] = np.random.choice(key_set)
+        # The side input is the same list for every record so the alias
+        # table is only rebuilt if a new key_set is passed.
+        if getattr(self, '_joinable_key_set', None) is not key_set:
+            self._joinable_key_set = key_set
+            self._joinable_key_sampler = KeySampler(
+                get_histogram_alias_table(key_set))
+        record[self.dest_joining_key_col] = \
+            self._joinable_key_sampler.next_key()
         return [record]
 
 
@@ -482,17 +494,11 @@ class FakeRowGen(beam.DoFn):
         return truncnorm.rvs(a, b, mu, sigma)
 
     def get_skewed_key(self, distribution=None):
-        if distribution is None or distribution == 'None':
-            distribution = 'uniform'
-        if distribution.lower() == 'binomial':
-            return np.random.binomial(int(self.data_gen.n_keys), p=.5)
-        elif distribution.lower() == 'zipf':
-            key = np.random.zipf(1.25)
-            while key > self.data_gen.n_keys:
-                key = np.random.zipf(1.25, 1)
-            return int(key)
-        elif distribution.lower() == 'uniform':
-            return int(np.random.randint(1, self.data_gen.n_keys))
+        """
+        Draws a single key according to distribution. Bounded 'binomial' and
+        'zipf' keys come from an alias table built once per worker.
+        """
+        return int(draw_skewed_keys(1, self.data_gen.n_keys, distribution)[0])
 
     def convert_key_types(self, keys):
         """
@@ -602,8 +608,44 @@ def parse_data_generator_args(argv):
                              'BigQuery table.',
                         default=10)
 
+    parser.add_argument('--batch_size', dest='batch_size', required=False,
+                        help='If set, records are generated in vectorized '
+                             'batches of up to this many records instead of '
+                             'one at a time.',
+                        default=None)
+
+    parser.add_argument('--rows_per_shard', dest='rows_per_shard',
+                        required=False,
+                        help='The number of records each initial element of '
+                             'the pipeline fans out into.',
+                        default=100000)
+
+    parser.add_argument('--seed', dest='seed', required=False,
+                        help='Seed for the random state of each shard. Runs '
+                             'with the same seed and --batch_size generate '
+                             'the same records. A random seed is chosen and '
+                             'logged if this is not set.',
+                        default=None)
+
+    parser.add_argument('--native_types', dest='native_types',
+                        help='This is a flag for generating TIMESTAMP, '
+                             'DATETIME, DATE and TIME values directly as the '
+                             'integers stored in avro and parquet files. '
+                             'Requires --batch_size and cannot be combined '
+                             'with csv or BigQuery output.',
+                        action="store_true")
+
     parser.add_argument('--primary_key_cols', dest='primary_key_cols', required=False,
-                        help='Field name of primary key. ', default=None)
+                        help='Comma separated field names of the (composite) '
+                             'primary key.', default=None)
+
+    parser.add_argument('--unique_primary_keys', dest='unique_primary_keys',
+                        help='This is a flag for generating the '
+                             '--primary_key_cols as keyed permutations of '
+                             'the row number so they are unique without '
+                             'deduplicating the output. Requires '
+                             '--batch_size.',
+                        action="store_true")
 
     parser.add_argument('--p_null', dest='p_null', required=False,
                         help='Probability a nullable column is null.',
@@ -621,7 +663,10 @@ def parse_data_generator_args(argv):
                              'This also supports "binomial" giving a maximum '
                              'variance bell curve of keys over the range of the'
                              ' keyset or "zipf" giving a distribution across '
-                             'the keyset according to zipf\'s law',
+                             'the keyset according to zipf\'s law. When '
+                             'generating joinable tables "empirical" draws '
+                             'the joining key in proportion to its frequency '
+                             'in the fact table.',
                         default=None)
 
     parser.add_argument('--min_date', dest='min_date', required=False,
@@ -810,28 +855,28 @@ def fetch_schema(data_args, schema_inferred):
     return data_args, schema_inferred
 
 
-def write_n_line_file_to_gcs(project, temp_location, n):
+def get_shard_ranges(n, rows_per_shard):
     """
-    Write an n-line file to the temp_location in Google Cloud Storage.
+    Split n records into shards of at most rows_per_shard records. The shards
+    are the initial PCollection elements so each worker fans its shards out
+    into records rather than reading a seed file with a line per record.
     Args:
-        project: A string containing the GCP project-id.
-        temp_location: A string specifying a GCS location to write to.
-        n: An integer specifying the number of lines to write to a file.
+        n: An integer specifying the total number of records.
+        rows_per_shard: An integer specifying the maximum records per shard.
+    Returns:
+        A list of (shard_index, start, stop) tuples covering [0, n).
+    """
+    n = int(n)
+    rows_per_shard = int(rows_per_shard)
+    return [(shard_index, start, min(start + rows_per_shard, n))
+            for shard_index, start in enumerate(range(0, n, rows_per_shard))]
+
+
+def expand_shard(shard):
+    """
+    Fan a (shard_index, start, stop) shard out into an empty string element
+    per record for DoFns which generate one record per element.
     """
-    # Prepare to write gcs file 'temp_num_records.txt' in the temp_location.
-    bucket_name, path = temp_location.replace('gs://', '').split('/', 1)
-
-    gcs_client = gcs.Client(project=project)
-    temp_bucket = gcs_client.get_bucket(bucket_name)
-    temp_blob = gcs.Blob(path + '/temp_num_records%s.txt' % uuid4(),
-                          temp_bucket)
-
-    # Write num_records newlines to a file_string. These will be our initial
-    # PCollection elements.
-    # This method was chosen because it proved more performant than beam.Create
-    # for a large initial
-    # PColleciton and to take advantage of distributed read from GCS.
-    file_string = '\n' * int(n)
-    temp_blob.upload_from_string(file_string)
-    return temp_blob
+    _, start, stop = shard
+    return itertools.repeat(u'', stop - start)
 
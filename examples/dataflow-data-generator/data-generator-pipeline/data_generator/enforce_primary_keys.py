@@ -19,21 +19,28 @@ from apache_beam.transforms.combiners import SampleCombineFn
 class EnforcePrimaryKeys(beam.PTransform):
     """
     This is a PTransform to ensure elements of posterior
-    PCollection are unique by key.
+    PCollection are unique by key. The columns of a composite key are
+    deduplicated together with a single shuffle.
     """
 
     def __init__(self, primary_key):
         """
         Args:
-            primary_keys: (str) The column by which to ensure 
-                uniqueness in the posterior PCollection.
+            primary_key: (str or list) The column, or the columns of a
+                composite key, by which to ensure uniqueness in the
+                posterior PCollection.
         """
-        self.primary_key = primary_key
+        if isinstance(primary_key, (list, tuple)):
+            self.primary_key = tuple(primary_key)
+        else:
+            self.primary_key = (primary_key,)
 
     def expand(self, pcoll):
+        primary_key = self.primary_key
         return (pcoll
             | 'Extract Primary Key' >> beam.FlatMap(
-                    lambda row: [(row[self.primary_key], row)]
+                    lambda row: [(tuple(row[col] for col in primary_key),
+                                  row)]
                 )
             | 'Sample n=1 by Primary Key' >> CombinePerKey(
                     SampleCombineFn(1)
@@ -30,9 +30,8 @@ from apache_beam.pvalue import AsList
 
 from data_generator.PrettyDataGenerator import DataGenerator, FakeRowGen, \
     parse_data_generator_args, validate_data_args, fetch_schema,\
-    write_n_line_file_to_gcs
+    get_shard_ranges, expand_shard
 import avro.schema
-import os
 
 from data_generator.CsvUtil import dict_to_csv
 from data_generator.AvroUtil import fix_record_for_avro
@@ -55,12 +54,6 @@ def run(argv=None):
 
     pipeline_options = PipelineOptions(pipeline_args)
 
-    temp_location = pipeline_options.display_data()['temp_location']
-    temp_blob = write_n_line_file_to_gcs(
-        pipeline_options.display_data()['project'],
-        temp_location,
-        data_args.num_records)
-
     data_gen = DataGenerator(bq_schema_filename=data_args.schema_file,
                              input_bq_table=data_args.input_bq_table,
                              p_null=data_args.p_null,
@@ -71,7 +64,10 @@ def run(argv=None):
                              max_float=data_args.max_float,
                              float_precision=data_args.float_precision,
                              write_disp=data_args.write_disp,
-                             key_skew=data_args.key_skew,
+                             # The empirical distribution only applies to
+                             # the joining key.
+                             key_skew=(None if data_args.key_skew == 'empirical'
+                                       else data_args.key_skew),
                              primary_key_cols=data_args.primary_key_cols,
                              dest_joining_key_col=data_args.dest_joining_key_col
                 )
@@ -85,27 +81,45 @@ def run(argv=None):
     # When generating a dimension table we get the distinct keys as a side
     # input from the main table so we generate dimension records that join to
     # the main data table.
-    key_set = \
-        (p
-         | 'Query Keys from main table' >> beam.io.Read(
-            beam.io.BigQuerySource(
-                query="SELECT DISTINCT({}) FROM `{}`".format(
-                    data_args.source_joining_key_col,
-                    data_args.fact_table),
-                use_standard_sql=True)
+    if data_args.key_skew == 'empirical':
+        # Draw keys in proportion to their frequency in the main table. The
+        # bq_histogram_tool tables only hold fingerprints of the keys, which
+        # wouldn't join to the main table.
+        key_source = beam.io.BigQuerySource(
+            query="SELECT {0}, COUNT(*) AS frequency FROM `{1}` "
+                  "GROUP BY {0}".format(data_args.source_joining_key_col,
+                                        data_args.fact_table),
+            use_standard_sql=True)
+        key_set = \
+            (p
+             | 'Query Key frequencies' >> beam.io.Read(key_source)
+             | 'Extract key frequencies' >> beam.Map(
+                    lambda x: (x[data_args.source_joining_key_col],
+                               x[u'frequency']))
+            )
+    else:
+        key_set = \
+            (p
+             | 'Query Keys from main table' >> beam.io.Read(
+                beam.io.BigQuerySource(
+                    query="SELECT DISTINCT({}) FROM `{}`".format(
+                        data_args.source_joining_key_col,
+                        data_args.fact_table),
+                    use_standard_sql=True)
+                )
+             | 'Extract key values' >> beam.Map(
+                    lambda x: (x[data_args.source_joining_key_col]))
             )
-         | 'Extract key values' >> beam.Map(
-                lambda x: (x[data_args.source_joining_key_col]))
-        )
 
     rows = (p
 
-     # Read the file we created with num_records newlines.
-     #
-     | 'Read file with num_records lines' >> beam.io.ReadFromText(
-                os.path.join('gs://', temp_blob.bucket.name, temp_blob.name)
-            )
-    
+     # Create (shard_index, start, stop) ranges of records and spread them
+     # across workers before fanning each out into an element per record.
+     | 'Create shard ranges' >> beam.Create(
+                get_shard_ranges(data_args.num_records,
+                                 data_args.rows_per_shard))
+     | 'Distribute shards' >> beam.Reshuffle()
+     | 'Expand shards' >> beam.FlatMap(expand_shard)
 
      # Use our instance of our custom DataGenerator Class to generate 1 fake
      # datum with the appropriate schema for each element in the PColleciton
@@ -118,9 +132,11 @@ def run(argv=None):
     )
 
     if data_args.primary_key_cols:
-        for key in data_args.primary_key_cols.split(','):
-            rows |= 'Enforcing primary key: {}'.format(key) >> EnforcePrimaryKeys(
-                        key)
+        # The columns of a composite primary key are deduplicated together
+        # with a single shuffle.
+        rows |= 'Enforcing primary key: {}'.format(
+            data_args.primary_key_cols) >> EnforcePrimaryKeys(
+                data_args.primary_key_cols.split(','))
 
     if data_args.csv_schema_order:
         (rows
@@ -165,10 +181,6 @@ def run(argv=None):
 
     p.run().wait_until_finish()
 
-    # Manually clean up of temp_num_records.txt because it will be outside this
-    # job's directory and Dataflow will not remove it for us.
-    temp_blob.delete()
-
 
 if __name__ == '__main__':
     logging.getLogger().setLevel(logging.INFO)
@@ -24,16 +24,18 @@ for stress testing in the event of large data growth.
 from __future__ import absolute_import
 import json
 import logging
+import random
 
 import apache_beam as beam
 from apache_beam.options.pipeline_options import PipelineOptions
 
 from data_generator.PrettyDataGenerator import DataGenerator, FakeRowGen, \
 parse_data_generator_args, validate_data_args, fetch_schema,\
-write_n_line_file_to_gcs
+get_shard_ranges, expand_shard
+from data_generator.PerformantDataGenerator import BatchFakeRowGen, \
+WriteRecordBatchesToParquet
 
 import avro.schema
-import os
 
 from data_generator.CsvUtil import dict_to_csv
 from data_generator.AvroUtil import fix_record_for_avro
@@ -57,11 +59,17 @@ def run(argv=None):
     data_args, schema_inferred = fetch_schema(data_args, schema_inferred)
     pipeline_options = PipelineOptions(pipeline_args)
 
-    temp_location = pipeline_options.display_data()['temp_location']
-    temp_blob = write_n_line_file_to_gcs(
-        pipeline_options.display_data()['project'],
-        temp_location,
-        data_args.num_records)
+    validate_key_skew_args(data_args)
+    if data_args.native_types:
+        validate_native_types_args(data_args)
+    if data_args.unique_primary_keys:
+        validate_unique_primary_keys_args(data_args)
+    unique_key_cols = data_args.primary_key_cols.split(',') \
+        if data_args.unique_primary_keys else ()
+
+    if data_args.seed is None:
+        data_args.seed = random.randint(0, 2 ** 31 - 1)
+    logging.info('Generating data with --seed=%s', data_args.seed)
 
     data_gen = DataGenerator(bq_schema_filename=data_args.schema_file,
                              input_bq_table=data_args.input_bq_table,
@@ -82,24 +90,53 @@ def run(argv=None):
     # store temp files, and what the project id is and what runner to use.
     p = beam.Pipeline(options=pipeline_options)
 
-    rows = (p
-        # Read the file we created with num_records newlines.
-        | 'Read file with num_records lines' >> beam.io.ReadFromText(
-                os.path.join('gs://', temp_blob.bucket.name, temp_blob.name)
-            )
-
-        # Use our instance of our custom DataGenerator Class to generate 1 fake
-        # datum with the appropriate schema for each element in the PColleciton
-        # created above.
-        | 'Generate Data' >> beam.ParDo(FakeRowGen(data_gen))
-        | 'Parse Json Strings' >> beam.FlatMap(lambda row: [json.loads(row)])
+    # With native types parquet files are written straight from generated
+    # pyarrow RecordBatches rather than from the PCollection of rows.
+    write_parquet_batches = data_args.native_types and \
+        data_args.write_to_parquet
 
+    # Each element is a (shard_index, start, stop) range of records. The
+    # reshuffle spreads the shards across workers before they fan out into
+    # records.
+    shards = (p
+        | 'Create shard ranges' >> beam.Create(
+                get_shard_ranges(data_args.num_records,
+                                 data_args.rows_per_shard))
+        | 'Distribute shards' >> beam.Reshuffle()
     )
 
-    if data_args.primary_key_cols:
-        for key in data_args.primary_key_cols.split(','):
-            rows |= 'Enforcing primary key: {}'.format(key) >> EnforcePrimaryKeys(
-                        key)
+    if data_args.batch_size:
+        batches = shards
+
+        rows = None
+        if data_args.avro_schema_file or not write_parquet_batches:
+            # Generate each batch of records as numpy columns and emit them as
+            # dictionaries.
+            rows = (batches
+                | 'Generate Data in Batches' >> beam.ParDo(
+                        BatchFakeRowGen(data_gen, data_args.batch_size,
+                                        physical_types=data_args.native_types,
+                                        seed=data_args.seed,
+                                        unique_key_cols=unique_key_cols))
+            )
+    else:
+        rows = (shards
+            # Fan each shard out into an element per record.
+            | 'Expand shards' >> beam.FlatMap(expand_shard)
+
+            # Use our instance of our custom DataGenerator Class to generate 1
+            # fake datum with the appropriate schema for each element in the
+            # PColleciton created above.
+            | 'Generate Data' >> beam.ParDo(FakeRowGen(data_gen))
+            | 'Parse Json Strings' >> beam.FlatMap(lambda row: [json.loads(row)])
+        )
+
+    if data_args.primary_key_cols and not data_args.unique_primary_keys:
+        # The columns of a composite primary key are deduplicated together
+        # with a single shuffle.
+        rows |= 'Enforcing primary key: {}'.format(
+            data_args.primary_key_cols) >> EnforcePrimaryKeys(
+                data_args.primary_key_cols.split(','))
 
     if data_args.csv_schema_order:
         (rows
@@ -114,10 +151,12 @@ def run(argv=None):
     if data_args.avro_schema_file:
         avsc = avro.schema.parse(open(data_args.avro_schema_file, 'rb').read())
 
-        (rows
+        avro_rows = rows
+        if not data_args.native_types:
             # Need to convert time stamps from strings to timestamp-micros
-            | 'Fix date and time Types for Avro.' >> beam.FlatMap(lambda row:
-                fix_record_for_avro(row, avsc))
+            avro_rows |= 'Fix date and time Types for Avro.' >> beam.FlatMap(
+                lambda row: fix_record_for_avro(row, avsc))
+        (avro_rows
             | 'Write to Avro.' >> beam.io.avroio.WriteToAvro(
                     file_path_prefix=data_args.output_prefix,
                     codec='null',
@@ -127,13 +166,25 @@ def run(argv=None):
                 )
         )
 
-    if data_args.write_to_parquet:
+    if write_parquet_batches:
         with open(data_args.schema_file, 'r') as infile:
             str_schema = json.load(infile)
         pa_schema = get_pyarrow_translated_schema(str_schema)
-        (rows
-            | 'Fix data and time Types for Parquet.' >>
-            beam.FlatMap(lambda row: fix_record_for_parquet(row, str_schema))
+        (batches
+            | 'Write RecordBatches to Parquet.' >> WriteRecordBatchesToParquet(
+                    data_gen, pa_schema, data_args.output_prefix,
+                    data_args.batch_size, seed=data_args.seed,
+                    unique_key_cols=unique_key_cols)
+        )
+    elif data_args.write_to_parquet:
+        with open(data_args.schema_file, 'r') as infile:
+            str_schema = json.load(infile)
+        pa_schema = get_pyarrow_translated_schema(str_schema)
+        parquet_rows = rows
+        if not data_args.native_types:
+            parquet_rows |= 'Fix data and time Types for Parquet.' >> \
+                beam.FlatMap(lambda row: fix_record_for_parquet(row, str_schema))
+        (parquet_rows
             | 'Write to Parquet.' >> beam.io.WriteToParquet(
                     file_path_prefix=data_args.output_prefix,
                     codec='null',
@@ -160,9 +211,74 @@ def run(argv=None):
 
     p.run().wait_until_finish()
 
-    # Manually clean up of temp_num_records.txt because it will be outside this
-    # job's directory and Dataflow will not remove it for us.
-    temp_blob.delete()
+
+def validate_key_skew_args(data_args):
+    """
+    Checks --key_skew_distribution is one this pipeline can draw keys from.
+    "empirical" is only supported by data_generator_joinable_table.py as it
+    needs a fact table to count the keys of.
+
+    Args:
+        data_args: A namespace containing the known command line arguments
+        parsed by parse_data_generator_args.
+    """
+    if data_args.key_skew is None or data_args.key_skew == 'None':
+        return
+    if data_args.key_skew.lower() not in ('uniform', 'binomial', 'zipf'):
+        raise ValueError('--key_skew_distribution must be one of "binomial", '
+                         '"zipf" or "uniform" but got "{}". "empirical" is '
+                         'only supported by '
+                         'data_generator_joinable_table.py.'.format(
+                             data_args.key_skew))
+
+
+def validate_native_types_args(data_args):
+    """
+    Checks the output options are compatible with --native_types. Native
+    types are epoch micros, epoch days and micros since midnight which only
+    the avro and parquet sinks understand.
+
+    Args:
+        data_args: A namespace containing the known command line arguments
+        parsed by parse_data_generator_args.
+    """
+    if not data_args.batch_size:
+        raise ValueError('--native_types requires --batch_size.')
+    if data_args.csv_schema_order or data_args.output_bq_table:
+        raise ValueError('--native_types can only be used when writing avro '
+                         'or parquet files.')
+    if data_args.write_to_parquet and data_args.primary_key_cols and \
+            not data_args.unique_primary_keys:
+        raise ValueError('--native_types writes parquet files directly from '
+                         'generated batches so --primary_key_cols requires '
+                         '--unique_primary_keys.')
+    if data_args.avro_schema_file:
+        with open(data_args.avro_schema_file, 'r') as avsc_file:
+            avsc_string = avsc_file.read()
+        if 'timestamp-millis' in avsc_string or 'time-millis' in avsc_string:
+            raise ValueError('--native_types generates microsecond precision '
+                             'values but {} uses millisecond logical '
+                             'types.'.format(data_args.avro_schema_file))
+
+
+
+def validate_unique_primary_keys_args(data_args):
+    """
+    Checks the options are compatible with --unique_primary_keys. Keys are
+    a permutation of the row number into [0, n_keys) so there must be at
+    least as many keys as records.
+
+    Args:
+        data_args: A namespace containing the known command line arguments
+        parsed by parse_data_generator_args.
+    """
+    if not data_args.batch_size:
+        raise ValueError('--unique_primary_keys requires --batch_size.')
+    if not data_args.primary_key_cols:
+        raise ValueError('--unique_primary_keys requires --primary_key_cols.')
+    if int(data_args.n_keys) < int(data_args.num_records):
+        raise ValueError('--unique_primary_keys requires --n_keys to be at '
+                         'least --num_records.')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,141 @@
+# Copyright 2019 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+A local benchmark comparing the two ways the data generator can write
+parquet files on the DirectRunner:
+ - rows: FakeRowGen json strings -> json.loads -> fix_record_for_parquet ->
+   beam.io.WriteToParquet (the default path).
+ - batches: BatchParquetWriter writing pyarrow RecordBatches as row groups
+   (the --batch_size --native_types path).
+
+Each mode runs in its own subprocess so the reported peak RSS is not shared.
+
+Example usage:
+    python parquet_writer_benchmark.py \
+        --schema_file=resources/lineorder-schema.json \
+        --num_records=200000 --batch_size=10000
+"""
+
+from __future__ import absolute_import
+from __future__ import print_function
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import apache_beam as beam
+from apache_beam.options.pipeline_options import PipelineOptions
+
+from data_generator.PerformantDataGenerator import DataGenerator, \
+    FakeRowGen, WriteRecordBatchesToParquet
+from data_generator.PrettyDataGenerator import get_shard_ranges, \
+    expand_shard
+from data_generator.ParquetUtil import get_pyarrow_translated_schema, \
+    fix_record_for_parquet
+
+
+def run_mode(mode, schema_file, num_records, batch_size, rows_per_shard,
+             output_dir):
+    """
+    Runs a single benchmark mode in this process and prints a json line with
+    the rows per second and peak RSS.
+    """
+    with open(schema_file, 'r') as infile:
+        str_schema = json.load(infile)
+    pa_schema = get_pyarrow_translated_schema(str_schema)
+    data_gen = DataGenerator(bq_schema_filename=schema_file, p_null=0.1,
+                             n_keys=1000)
+
+    output_prefix = os.path.join(output_dir, mode)
+    start = time.time()
+    p = beam.Pipeline(options=PipelineOptions(['--runner=DirectRunner']))
+    shards = p | 'Create shard ranges' >> beam.Create(
+        get_shard_ranges(num_records, rows_per_shard))
+    if mode == 'rows':
+        (shards
+            | 'Expand shards' >> beam.FlatMap(expand_shard)
+            | 'Generate Data' >> beam.ParDo(FakeRowGen(data_gen))
+            | 'Parse Json Strings' >> beam.FlatMap(
+                    lambda row: [json.loads(row)])
+            | 'Fix data and time Types for Parquet.' >> beam.FlatMap(
+                    lambda row: fix_record_for_parquet(row, str_schema))
+            | 'Write to Parquet.' >> beam.io.WriteToParquet(
+                    file_path_prefix=output_prefix,
+                    codec='null',
+                    file_name_suffix='.parquet',
+                    schema=pa_schema)
+        )
+    else:
+        (shards
+            | 'Write RecordBatches to Parquet.' >> WriteRecordBatchesToParquet(
+                    data_gen, pa_schema, output_prefix, batch_size, seed=0)
+        )
+    p.run().wait_until_finish()
+    elapsed = time.time() - start
+
+    # ru_maxrss is in kilobytes on linux.
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    print(json.dumps({'mode': mode,
+                      'rows_per_sec': num_records / elapsed,
+                      'peak_rss_mb': peak_rss_mb}))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--schema_file', dest='schema_file',
+                        default=os.path.join('resources',
+                                             'lineorder-schema.json'))
+    parser.add_argument('--num_records', dest='num_records', type=int,
+                        default=100000)
+    parser.add_argument('--batch_size', dest='batch_size', type=int,
+                        default=10000)
+    parser.add_argument('--rows_per_shard', dest='rows_per_shard', type=int,
+                        default=100000)
+    parser.add_argument('--mode', dest='mode', choices=['rows', 'batches'],
+                        default=None,
+                        help='Run a single mode in this process. By default '
+                             'both modes are run in subprocesses.')
+    args = parser.parse_args(argv)
+
+    output_dir = tempfile.mkdtemp()
+    try:
+        if args.mode:
+            run_mode(args.mode, args.schema_file, args.num_records,
+                     args.batch_size, args.rows_per_shard, output_dir)
+            return
+
+        print('{:<10}{:>15}{:>15}'.format('mode', 'rows/sec', 'peak RSS MB'))
+        for mode in ['rows', 'batches']:
+            output = subprocess.check_output([
+                sys.executable, __file__,
+                '--mode=' + mode,
+                '--schema_file=' + args.schema_file,
+                '--num_records=%d' % args.num_records,
+                '--batch_size=%d' % args.batch_size,
+                '--rows_per_shard=%d' % args.rows_per_shard])
+            result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+            print('{:<10}{:>15.0f}{:>15.1f}'.format(
+                result['mode'], result['rows_per_sec'], result['peak_rss_mb']))
+    finally:
+        shutil.rmtree(output_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+# Copyright 2019 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#            http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import unittest
+
+import numpy as np
+
+from data_generator.ColumnGenerators import compile_column_plan, \
+    generate_rows, KeyColumnGenerator, StringColumnGenerator, \
+    IntegerColumnGenerator, RecordColumnGenerator, AliasTable, \
+    draw_skewed_keys, get_histogram_alias_table, KeySampler, \
+    FeistelPermutation, UniqueKeyColumnGenerator, seek_unique_keys
+
+
+class FakeDataGenerator(object):
+    """
+    Holds the DataGenerator attributes used when compiling a plan.
+    """
+    def __init__(self, schema):
+        self.schema = schema
+        self.null_prob = 0.0
+        self.n_keys = 100
+        self.key_skew = None
+        self.min_date = datetime.date(2000, 1, 1)
+        self.max_date = datetime.date(2001, 1, 1)
+        self.only_pos = True
+        self.max_int = 10
+        self.max_float = 10.0
+        self.float_precision = 2
+
+
+class TestColumnGenerators(unittest.TestCase):
+    def setUp(self):
+        self.data_gen = FakeDataGenerator({u'fields': [
+            {u'name': u'order_key', u'type': u'STRING', u'mode': u'REQUIRED'},
+            {u'name': u'receipt', u'type': u'STRING', u'mode': u'NULLABLE',
+             u'description': u'VARCHAR(10)'},
+            {u'name': u'quantity_max_5', u'type': u'INTEGER',
+             u'mode': u'NULLABLE'},
+            {u'name': u'order_date', u'type': u'DATE', u'mode': u'NULLABLE'},
+            {u'name': u'items', u'type': u'RECORD', u'mode': u'REPEATED',
+             u'fields': [
+                 {u'name': u'ts', u'type': u'TIMESTAMP', u'mode': u'NULLABLE'}
+             ]}
+        ]})
+
+    def test_compile_column_plan(self):
+        plan = compile_column_plan(self.data_gen)
+        self.assertEqual([column.name for column in plan],
+                         [u'order_key', u'receipt', u'quantity_max_5',
+                          u'order_date', u'items'])
+        self.assertIsInstance(plan[0], KeyColumnGenerator)
+        self.assertTrue(plan[0].as_string)
+        self.assertIsInstance(plan[1], StringColumnGenerator)
+        self.assertEqual(plan[1].length, 10)
+        self.assertIsInstance(plan[2], IntegerColumnGenerator)
+        self.assertEqual(plan[2].max_int, 5)
+        self.assertIsInstance(plan[4], RecordColumnGenerator)
+
+    def test_generate_rows(self):
+        rows = generate_rows(compile_column_plan(self.data_gen), 50)
+        self.assertEqual(len(rows), 50)
+        for row in rows:
+            self.assertLessEqual(int(row[u'order_key']), self.data_gen.n_keys)
+            self.assertEqual(len(row[u'receipt']), 10)
+            self.assertLessEqual(row[u'quantity_max_5'], 5)
+            self.assertGreaterEqual(row[u'quantity_max_5'], 0)
+            order_date = datetime.datetime.strptime(row[u'order_date'],
+                                                    '%Y-%m-%d').date()
+            self.assertGreaterEqual(order_date, self.data_gen.min_date)
+            self.assertLessEqual(order_date, self.data_gen.max_date)
+            self.assertLessEqual(len(row[u'items']), 3)
+            for item in row[u'items']:
+                _ = datetime.datetime.strptime(item[u'ts'],
+                                               '%Y-%m-%dT%H:%M:%S')
+
+    def test_generate_rows_physical_types(self):
+        plan = compile_column_plan(self.data_gen, physical_types=True)
+        rows = generate_rows(plan, 50)
+        # Epoch days and micros for the bounds of the data_gen dates.
+        min_days, max_days = 10957, 11323
+        for row in rows:
+            self.assertGreaterEqual(row[u'order_date'], min_days)
+            self.assertLessEqual(row[u'order_date'], max_days)
+            for item in row[u'items']:
+                self.assertGreaterEqual(item[u'ts'],
+                                        min_days * 24 * 60 * 60 * 10 ** 6)
+                self.assertLessEqual(item[u'ts'],
+                                     max_days * 24 * 60 * 60 * 10 ** 6)
+
+    def test_generate_rows_random_state(self):
+        plan = compile_column_plan(self.data_gen)
+        rows = generate_rows(plan, 50, np.random.RandomState([7, 3]))
+        self.assertEqual(rows,
+                         generate_rows(plan, 50, np.random.RandomState([7, 3])))
+        self.assertNotEqual(
+            rows, generate_rows(plan, 50, np.random.RandomState([7, 4])))
+
+    def test_alias_table(self):
+        table = AliasTable([1.0, 0.0, 3.0], values=[u'a', u'b', u'c'])
+        values = table.sample(40000, np.random.RandomState(0))
+        self.assertNotIn(u'b', values)
+        self.assertAlmostEqual(np.mean(values == u'c'), .75, places=2)
+        with self.assertRaises(ValueError):
+            AliasTable([0.0, 0.0])
+
+    def test_draw_skewed_keys(self):
+        random_state = np.random.RandomState(0)
+        for distribution in [None, 'binomial', 'zipf']:
+            keys = draw_skewed_keys(1000, 5, distribution, random_state)
+            self.assertEqual(len(keys), 1000)
+            self.assertGreaterEqual(keys.min(), 0)
+            self.assertLessEqual(keys.max(), 5)
+        zipf_keys = draw_skewed_keys(40000, 5, 'zipf', random_state)
+        self.assertGreaterEqual(zipf_keys.min(), 1)
+        # P(1) / P(2) is 2 ** 1.25 for zipf's law.
+        self.assertAlmostEqual(
+            np.mean(zipf_keys == 1) / np.mean(zipf_keys == 2), 2 ** 1.25,
+            delta=.2)
+        with self.assertRaises(ValueError):
+            draw_skewed_keys(10, 5, 'poisson')
+
+    def test_key_sampler(self):
+        sampler = KeySampler(get_histogram_alias_table([(u'x', 9), (u'y', 1)]),
+                             batch_size=7)
+        keys = [sampler.next_key() for _ in range(20000)]
+        self.assertAlmostEqual(keys.count(u'x') / 20000.0, .9, places=2)
+        uniform_sampler = KeySampler(get_histogram_alias_table([3, 4]))
+        self.assertIn(uniform_sampler.next_key(), [3, 4])
+
+    def test_feistel_permutation(self):
+        for n in [1, 2, 7, 1000, 4097]:
+            values = FeistelPermutation(n, seed=[1, 2]).permute(np.arange(n))
+            self.assertEqual(sorted(values.tolist()), list(range(n)))
+
+    def test_unique_primary_keys(self):
+        plan = compile_column_plan(self.data_gen, unique_keys=[u'order_key'],
+                                   seed=3)
+        self.assertIsInstance(plan[0], UniqueKeyColumnGenerator)
+        keys = []
+        # Shards are generated out of order on different workers.
+        for start, stop in [(60, 100), (0, 30), (30, 60)]:
+            seek_unique_keys(plan, start)
+            keys.extend(row[u'order_key']
+                        for row in generate_rows(plan, stop - start))
+        self.assertEqual(len(set(keys)), 100)
+        self.assertTrue(all(0 <= int(key) < 100 for key in keys))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,8 +15,9 @@
 import pyarrow as pa
 import unittest
 import datetime
+from data_generator.ColumnGenerators import compile_column_plan
 from data_generator.ParquetUtil import get_pyarrow_translated_schema, \
-fix_record_for_parquet
+fix_record_for_parquet, generate_record_batch
 
 
 class TestParquetUtil(unittest.TestCase):
@@ -211,6 +212,40 @@ class TestParquetUtil(unittest.TestCase):
         output_record = fix_record_for_parquet(record, input_schema)
         self.assertEquals(output_record, expected_output)
 
+    def test_generate_record_batch(self):
+        string_input_schema = {"fields": [
+            {"type": "STRING", "name": "order_key", "mode": "REQUIRED"},
+            {"type": "NUMERIC", "name": "numeric1", "mode": "NULLABLE"},
+            {"type": "DATE", "name": "date1", "mode": "NULLABLE"},
+            {"type": "RECORD", "name": "record1", "mode": "REPEATED",
+             "fields": [
+                 {"type": "TIMESTAMP", "name": "timestamp1",
+                  "mode": "NULLABLE"}]}
+        ]}
+
+        class FakeDataGenerator(object):
+            schema = string_input_schema
+            null_prob = 0.5
+            n_keys = 100
+            key_skew = None
+            min_date = datetime.date(2019, 1, 1)
+            max_date = datetime.date(2019, 12, 31)
+            only_pos = True
+            max_int = 10
+            max_float = 10.0
+            float_precision = 2
+
+        pa_schema = get_pyarrow_translated_schema(string_input_schema)
+        plan = compile_column_plan(FakeDataGenerator(), physical_types=True)
+        batch = generate_record_batch(plan, 100, pa_schema)
+
+        self.assertEqual(batch.num_rows, 100)
+        self.assertEqual(batch.schema.types, pa_schema.types)
+        for row in pa.Table.from_batches([batch]).to_pydict()['date1']:
+            if row is not None:
+                self.assertGreaterEqual(row, FakeDataGenerator.min_date)
+                self.assertLessEqual(row, FakeDataGenerator.max_date)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -20,10 +20,14 @@ import json
 import numpy as np
 import os
 import re
+import shutil
 import sys
+import tempfile
+import time
 from faker_schema.faker_schema import FakerSchema
 
-from data_generator.PerformantDataGenerator import DataGenerator, FakeRowGen
+from data_generator.PerformantDataGenerator import DataGenerator, FakeRowGen, \
+    BatchFakeRowGen, finalize_parquet_files
 
 class TestPrettyDataGenerator(unittest.TestCase):
     """The test cases are focused on the business logic.  In this case this is how we parse the
@@ -186,10 +190,113 @@ class TestPrettyDataGenerator(unittest.TestCase):
         self.assertTrue(uniform_key)
         self.assertLessEqual(uniform_key, self.data_gen.n_keys)
 
-        zipf_key = self.fakerowgen.get_skewed_key(distribution='zipf')        
+        zipf_key = self.fakerowgen.get_skewed_key(distribution='zipf')
         self.assertTrue(uniform_key)
         self.assertLessEqual(uniform_key, self.data_gen.n_keys)
 
+    def test_generate_fake_batch(self):
+        """
+        This tests the generate_fake_batch method of the FakeRowGen class
+        obeys the same constraints as generate_fake.
+        """
+        rows = self.fakerowgen.generate_fake_batch(100)
+        self.assertEqual(len(rows), 100)
+
+        for row in rows:
+            self.assertIsInstance(row, dict)
+            self.assertGreaterEqual(
+                datetime.datetime.strptime(row[u'lo_orderdate'],
+                                           '%Y-%m-%d').date(),
+                self.data_gen.min_date)
+            self.assertLessEqual(
+                datetime.datetime.strptime(row[u'lo_orderdate'],
+                                           '%Y-%m-%d').date(),
+                self.data_gen.max_date)
+            self.assertLessEqual(row[u'lo_linenumber'], self.data_gen.max_int)
+            self.assertGreaterEqual(row[u'lo_linenumber'], 0)
+            self.assertLessEqual(row[u'lo_tax'], self.data_gen.max_float)
+            self.assertGreaterEqual(row[u'lo_tax'], 0.0)
+            self.assertEqual(len(row[u'lo_recieptfile']), 10)
+            self.assertLessEqual(int(row[u'lo_cust_key']),
+                                 self.data_gen.n_keys)
+            self.assertIsInstance(row[u'lo_record_field'], list)
+            self.assertLessEqual(len(row[u'lo_record_field']), 3)
+            for nested_row in row[u'lo_record_field']:
+                _ = datetime.datetime.strptime(nested_row[u'date'],
+                                               '%Y-%m-%dT%H:%M:%S')
+
+    def test_generate_fake_throughput(self):
+        """
+        This benchmarks generate_fake, which executes the compiled plan of
+        column generators, against checking every cell of the row with
+        sanity_check as generate_fake used to. Both rates are logged and the
+        plan should generate more rows per second.
+        """
+        faker_schema = self.data_gen.get_faker_schema()
+        n_per_cell, n_plan = 500, 5000
+
+        start = time.time()
+        for _ in range(n_per_cell):
+            random_numbers = np.random.randint(0, sys.maxint,
+                                               size=len(faker_schema))
+            data = {}
+            for col_idx, col_name in enumerate(faker_schema.keys()):
+                data = self.fakerowgen.sanity_check(data, col_name,
+                                                    random_numbers[col_idx])
+            json.dumps(data)
+        per_cell_rate = n_per_cell / (time.time() - start)
+
+        self.fakerowgen.setup()
+        start = time.time()
+        for _ in range(n_plan):
+            self.fakerowgen.generate_fake(faker_schema)
+        plan_rate = n_plan / (time.time() - start)
+
+        logging.info('generate_fake: %.0f rows/sec with sanity_check per '
+                     'cell, %.0f rows/sec with the compiled plan.',
+                     per_cell_rate, plan_rate)
+        self.assertGreater(plan_rate, per_cell_rate)
+
+    def test_batch_fake_row_gen_seed(self):
+        """
+        This tests BatchFakeRowGen generates every record of a shard and that
+        a shard generates the same records for the same seed.
+        """
+        batch_row_gen = BatchFakeRowGen(self.data_gen, batch_size=30, seed=42)
+        rows = list(batch_row_gen.process((3, 300, 400)))
+        self.assertEqual(len(rows), 100)
+        self.assertEqual(rows, list(batch_row_gen.process((3, 300, 400))))
+        self.assertNotEqual(rows, list(batch_row_gen.process((4, 400, 500))))
+
+    def test_finalize_parquet_files(self):
+        """
+        This tests only the files of completed bundles are moved to the
+        output prefix, and that finalizing again is harmless.
+        """
+        output_dir = tempfile.mkdtemp()
+        try:
+            output_prefix = os.path.join(output_dir, 'output')
+            temp_dir = os.path.join(output_dir, 'output-temp')
+            os.makedirs(temp_dir)
+            temp_paths = []
+            for name in ['b', 'a', 'retried']:
+                temp_paths.append(os.path.join(temp_dir, name + '.parquet'))
+                with open(temp_paths[-1], 'w') as temp_file:
+                    temp_file.write(name)
+            for _ in range(2):
+                output_paths = finalize_parquet_files(
+                    temp_paths[:2], output_prefix, temp_dir)
+            self.assertEqual(output_paths,
+                             [output_prefix + '-00000-of-00002.parquet',
+                              output_prefix + '-00001-of-00002.parquet'])
+            self.assertEqual(sorted(os.listdir(output_dir)),
+                             ['output-00000-of-00002.parquet',
+                              'output-00001-of-00002.parquet'])
+            with open(output_paths[0]) as output_file:
+                self.assertEqual(output_file.read(), 'a')
+        finally:
+            shutil.rmtree(output_dir)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -21,7 +21,8 @@ import os
 import re
 from faker_schema.faker_schema import FakerSchema
 
-from data_generator.PrettyDataGenerator import DataGenerator, FakeRowGen
+from data_generator.PrettyDataGenerator import DataGenerator, FakeRowGen, \
+    get_shard_ranges, expand_shard
 
 class TestPrettyDataGenerator(unittest.TestCase):
     """The test cases are focused on the business logic.  In this case this is how we parse the
@@ -188,6 +189,16 @@ class TestPrettyDataGenerator(unittest.TestCase):
         self.assertTrue(uniform_key)
         self.assertLessEqual(uniform_key, self.data_gen.n_keys)
 
+    def test_get_shard_ranges(self):
+        """
+        This tests get_shard_ranges covers every record exactly once.
+        """
+        self.assertEqual(get_shard_ranges(250, 100),
+                         [(0, 0, 100), (1, 100, 200), (2, 200, 250)])
+        self.assertEqual(get_shard_ranges('10', '100'), [(0, 0, 10)])
+        self.assertEqual(get_shard_ranges(0, 100), [])
+        self.assertEqual(len(list(expand_shard((2, 200, 250)))), 50)
+
 
 if __name__ == '__main__':
     unittest.main()
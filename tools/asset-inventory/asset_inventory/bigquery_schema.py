@@ -28,6 +28,9 @@ The entry points are:
     `merge_schemas` - Combines multiple BigQuery schmas and returns a new schema
     that is a union of both.
 
+    `SchemaAccumulator` - Merges schemas and json objects incrementally, each
+    distinct document shape is merged only once.
+
     `get_field_by_name` - Returns a field with the supplied name from a list of
     BigQuery field.
 
@@ -35,7 +38,6 @@ This module helps import json documents into BigQuery.
 
 """
 
-import copy
 from numbers import Number
 import re
 
@@ -126,69 +128,168 @@ def get_field_by_name(fields, field_name):
     return None, None
 
 
-def _merge_fields(destination_field, source_field):
-    """Combines two SchemaField like dicts.
+class _FieldTree(object):
+    """Schema fields indexed by their lower cased name.
 
-    The same field can exist in both the destination and source schemas when
-    trying to combine schemas. To handle this we try to choose a more specific
-    type if there is a conflict and merge any encosed fields.
+    Nested fields are held by a _FieldTree of their own, so a field is found
+    in constant time at every level of the schema. The field dicts are owned by
+    the tree and modified in place when merged.
 
-    Args:
-        destination_field:  `google.cloud.bigquery.SchemaField` dict.
-        source_field: `google.cloud.bigquery.SchemaField` dict.
-    Returns:
-        A `google.cloud.bigquery.SchemaField` dict.
+    Attributes:
+        fields: List of `google.cloud.bigquery.SchemaField` like dicts in the
+            order they were first seen.
     """
-    field = copy.deepcopy(destination_field)
-
-    dd = destination_field.get('description', None)
-    sd = source_field.get('description', None)
-    dft = destination_field.get('field_type', None)
-    sft = source_field.get('field_type', None)
-    # use the  field with more information.
-    if ((not dd and sd) or (sd and dd and len(dd) < len(sd))):
-        field['description'] = sd
-        field['field_type'] = sft
-    # use the less specific type.
-    elif ((dft != 'RECORD' and dft != 'STRING') and sft == 'STRING'):
-        field['field_type'] = sft
-    df = destination_field.get('fields', [])
-    sf = source_field.get('fields', [])
-    merged_fields = _merge_schema(df, sf)
-    # recursivly merge nested fields.
-    if merged_fields != df:
-        field['fields'] = merged_fields
-    return field
-
-
-def _merge_schema(destination_schema, source_schema):
-    """Add source_schema fields to the the destination_schema.
-
-    Modifies the destination_schema list argument with fields from
-    source_schema. Calls _merge_fields when a field exists in both with the same
-    name.
+
+    def __init__(self):
+        self.fields = []
+        self._index = {}
+
+    def merge(self, source_schema):
+        """Add source_schema fields to the tree.
+
+        The same field can exist in both the tree and source schema. To handle
+        this we try to choose a more specific type if there is a conflict and
+        merge any enclosed fields.
+
+        Args:
+            source_schema: List of `google.cloud.bigquery.SchemaField` dicts.
+                It's not modified.
+        """
+        for source_field in source_schema:
+            # BigQuery column names are case insensitive.
+            name = source_field['name'].lower()
+            entry = self._index.get(name)
+            # otherwise append at the end.
+            if entry is None:
+                field = dict(source_field)
+                nested = _FieldTree()
+                if 'fields' in source_field:
+                    nested.merge(source_field['fields'])
+                    field['fields'] = nested.fields
+                self._index[name] = (field, nested)
+                self.fields.append(field)
+                continue
+            # field with same name exists, merge them.
+            field, nested = entry
+            dd = field.get('description', None)
+            sd = source_field.get('description', None)
+            dft = field.get('field_type', None)
+            sft = source_field.get('field_type', None)
+            # use the  field with more information.
+            if ((not dd and sd) or (sd and dd and len(dd) < len(sd))):
+                field['description'] = sd
+                field['field_type'] = sft
+            # use the less specific type.
+            elif ((dft != 'RECORD' and dft != 'STRING') and sft == 'STRING'):
+                field['field_type'] = sft
+            # recursivly merge nested fields.
+            source_fields = source_field.get('fields', None)
+            if source_fields:
+                nested.merge(source_fields)
+                if 'fields' not in field:
+                    field['fields'] = nested.fields
+
+
+def _document_fingerprint(document):
+    """Hashable value equal for json objects with the same BigQuery schema.
+
     Args:
-        destination_schema: List of `google.cloud.bigquery.SchemaField`.
-        source_schema: List of `google.cloud.bigquery.SchemaField`.
+        document: A json object. It's not modified.
     Returns:
-        The modified destination_schema list.
+        Tuple of the property names and their BigQuery type, mode and nested
+        fingerprint.
+    """
+    if isinstance(document, list):
+        fingerprints = []
+        seen = set()
+        for element in document:
+            fingerprint = _document_fingerprint(element)
+            if fingerprint not in seen:
+                seen.add(fingerprint)
+                fingerprints.append(fingerprint)
+        return tuple(fingerprints)
+    fingerprint = []
+    for property_name, property_value in document.items():
+        bigquery_type = _get_bigquery_type_for_property_value(property_value)
+        nested = None
+        if bigquery_type == 'RECORD':
+            nested = _document_fingerprint(property_value)
+        fingerprint.append((property_name, bigquery_type,
+                            isinstance(property_value, list), nested))
+    return tuple(fingerprint)
+
 
+class SchemaAccumulator(object):
+    """Incrementally merges BigQuery schemas into one.
+
+    Schemas are merged in place into a _FieldTree. Each document or schema
+    added with a fingerprint is merged only once, documents of the same shape
+    produce the same schema and merging it again wouldn't change the result.
     """
-    # short circuit if schemas are the same.
-    if destination_schema == source_schema:
-        return destination_schema
-    destination_schema_list = list(destination_schema)
-    for source_field in source_schema:
-        i, destination_field = get_field_by_name(destination_schema_list,
-                                                 source_field['name'])
-        # field with same name exists, merge them.
-        if destination_field:
-            destination_schema_list[i] = _merge_fields(destination_field,
-                                                       source_field)
-        # otherwise append at the end.
-        else:
-            destination_schema_list.append(source_field)
-    return destination_schema_list
+
+    # Maximum number of fingerprints remembered.
+    MAX_FINGERPRINTS = 10000
+
+    def __init__(self):
+        self._tree = _FieldTree()
+        self._fingerprints = set()
+
+    @property
+    def schema(self):
+        """List of `google.cloud.bigquery.SchemaField` like dicts."""
+        return self._tree.fields
+
+    def _remember(self, fingerprint):
+        """Returns True if the fingerprint was already seen."""
+        if fingerprint in self._fingerprints:
+            return True
+        if len(self._fingerprints) >= SchemaAccumulator.MAX_FINGERPRINTS:
+            self._fingerprints.clear()
+        self._fingerprints.add(fingerprint)
+        return False
+
+    def has_schema(self, fingerprint):
+        """Returns True if a schema with the fingerprint was added."""
+        return ('schema', fingerprint) in self._fingerprints
+
+    def add_schema(self, schema, fingerprint=None):
+        """Merge a schema.
+
+        Args:
+            schema: List of `google.cloud.bigquery.SchemaField` dicts.
+            fingerprint: Optional hashable identifying the schema, the schema
+                isn't merged if the fingerprint was already added.
+        Returns:
+            The SchemaAccumulator.
+        """
+        if fingerprint is None or not self._remember(('schema', fingerprint)):
+            self._tree.merge(schema)
+        return self
+
+    def add_document(self, document):
+        """Merge the schema of a json object.
+
+        Args:
+            document: A json object. It's not modified.
+        Returns:
+            The SchemaAccumulator.
+        """
+        if not self._remember(('document', _document_fingerprint(document))):
+            self._tree.merge(translate_json_to_schema(document))
+        return self
+
+    def merge(self, other):
+        """Merge the schema of another SchemaAccumulator.
+
+        Args:
+            other: SchemaAccumulator.
+        Returns:
+            The SchemaAccumulator.
+        """
+        self._tree.merge(other.schema)
+        for fingerprint in other._fingerprints:
+            self._remember(fingerprint)
+        return self
 
 
 def merge_schemas(schemas):
@@ -203,10 +304,10 @@ def merge_schemas(schemas):
         List of `google.cloud.bigquery.SchemaField` objects.
 
     """
-    destination_schema = []
+    accumulator = SchemaAccumulator()
     for source_schema in schemas:
-        destination_schema = _merge_schema(destination_schema, source_schema)
-    return destination_schema
+        accumulator.add_schema(source_schema)
+    return accumulator.schema
 
 
 def _convert_labels_dict_to_list(parent):
@@ -127,31 +127,41 @@ class AssignGroupByKey(beam.DoFn):
 
 
 class BigQuerySchemaCombineFn(core.CombineFn):
-    """Reduce a list of schemas into a single schema."""
+    """Reduce a list of schemas into a single schema.
+
+    The accumulator is a `bigquery_schema.SchemaAccumulator` which merges the
+    API schema of each asset type and the schema of each distinct document
+    shape only once.
+    """
 
     def create_accumulator(self):
-        return []
+        return bigquery_schema.SchemaAccumulator()
 
     def merge_accumulators(self, accumulators):
-        return bigquery_schema.merge_schemas(accumulators)
+        accumulators = iter(accumulators)
+        merged = next(accumulators)
+        for accumulator in accumulators:
+            merged.merge(accumulator)
+        return merged
 
-    def extract_output(self, schema):
-        return schema
+    def extract_output(self, accumulator):
+        return accumulator.schema
 
-    def element_to_schema(self, element):
+    def element_to_schema_args(self, element):
         element_resource = element.get('resource', {})
-        return APISchema.bigquery_schema_for_resource(
-            element['asset_type'],
-            element_resource.get('discovery_name', None),
-            element_resource.get('discovery_document_uri', None),
-            'data' in element_resource,
-            'iam_policy' in element)
-
-    def add_input(self, schema, element):
-        resource_schema = self.element_to_schema(element)
-        json_schema = bigquery_schema.translate_json_to_schema(element)
-        return bigquery_schema.merge_schemas([schema, resource_schema,
-                                              json_schema])
+        return (element['asset_type'],
+                element_resource.get('discovery_name', None),
+                element_resource.get('discovery_document_uri', None),
+                'data' in element_resource,
+                'iam_policy' in element)
+
+    def add_input(self, accumulator, element):
+        schema_args = self.element_to_schema_args(element)
+        if not accumulator.has_schema(schema_args):
+            accumulator.add_schema(
+                APISchema.bigquery_schema_for_resource(*schema_args),
+                schema_args)
+        return accumulator.add_document(element)
 
 
 class BigQuerySanitize(beam.DoFn):
@@ -16,6 +16,7 @@
 
 """Test BigQuery schema translation from JSON objects."""
 
+import pickle
 import unittest
 from asset_inventory import bigquery_schema
 
@@ -142,6 +143,39 @@ class TestBigQuerySchema(unittest.TestCase):
                                 'field_type': 'NUMERIC',
                                 'mode': 'REPEATED'}]}])
 
+    def test_schema_accumulator(self):
+        documents = [
+            {'recordField': {'field1': 'string'}, 'count': 1},
+            {'recordField': {'field1': 'string'}, 'count': 2},
+            {'recordfield': {'field2': [{'a': 1}, {'b': 'b'}, {'a': 2}]},
+             'count': 'many'},
+        ]
+        accumulator = bigquery_schema.SchemaAccumulator()
+        for document in documents:
+            accumulator.add_document(document)
+        expected = bigquery_schema.merge_schemas(
+            [bigquery_schema.translate_json_to_schema(document)
+             for document in documents])
+        self.assertEqual(accumulator.schema, expected)
+        self.assertEqual(
+            bigquery_schema.get_field_by_name(
+                accumulator.schema, 'count')[1]['field_type'], 'STRING')
+        # documents of the same shape are merged once.
+        self.assertEqual(len(accumulator._fingerprints), 2)
+
+        other = bigquery_schema.SchemaAccumulator().add_schema(
+            [{'name': 'count', 'field_type': 'NUMERIC', 'mode': 'NULLABLE',
+              'description': 'number of things'}], 'api')
+        self.assertTrue(other.has_schema('api'))
+        other = pickle.loads(pickle.dumps(other.merge(accumulator)))
+        self.assertEqual(
+            bigquery_schema.get_field_by_name(other.schema, 'count')[1],
+            {'name': 'count', 'field_type': 'STRING', 'mode': 'NULLABLE',
+             'description': 'number of things'})
+        self.assertEqual(len(other.schema), 2)
+        # the merged accumulator is not modified.
+        self.assertEqual(accumulator.schema, expected)
+
     def test_sanitize_property_value(self):
         doc = {
             'empyty_dict': {},
@@ -14,6 +14,7 @@
 
 
 import logging
+import sys
 import threading
 
 from google.cloud import datastore
@@ -64,6 +65,54 @@ def resource_iterator(next_page_function):
             more_results = False
 
 
+def map_in_threads(function, items, max_threads):
+    """Call a function on every item from a bounded set of threads.
+
+    Google API clients must be accessed through ThreadsafeClientLocal
+    descriptors, like the ones of CLIENTS, so each thread uses its own client.
+
+    Args:
+        function: Function to call with each item.
+        items: Iterable of the items.
+        max_threads: Maximum number of threads to call the function from.
+
+    Returns:
+        List of the function return values in the order of the items.
+
+    Raises:
+        Exception: The first exception raised by the function, once all of the
+            threads are done.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    failures = []
+    work = iter(enumerate(items))
+    work_lock = threading.Lock()
+
+    def worker():
+        while True:
+            with work_lock:
+                index, item = next(work, (None, None))
+            if index is None:
+                return
+            try:
+                results[index] = function(item)
+            except Exception:  # pylint: disable=broad-except
+                logging.error('failed processing %s', item,
+                              exc_info=sys.exc_info())
+                failures.append(sys.exc_info()[1])
+
+    threads = [threading.Thread(target=worker)
+               for _ in range(min(max_threads, len(items)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if failures:
+        raise failures[0]
+    return results
+
+
 class ThreadsafeClientLocal(object):
     """A thread local Google API client descriptor.
 
@@ -80,8 +129,9 @@ class ThreadsafeClientLocal(object):
     def __init__(self, service, version):
         """Create a thread local API client.
 
-        Will create the underlying httplib2.Http object on construction, but
-        the underlying API client is lazy constructed.
+        The underlying API client and httplib2.Http object are lazy
+        constructed for each thread, unless an http object is assigned to the
+        http attribute which is then shared by all threads.
 
         Args:
             service: Name of API.
@@ -89,7 +139,7 @@ class ThreadsafeClientLocal(object):
         """
         self.service = service
         self.version = version
-        self.http = httplib2.Http(timeout=60)
+        self.http = None
         self.cache_discovery = True
 
     def __get__(self, instance, instance_type):
@@ -116,10 +166,13 @@ class ThreadsafeClientLocal(object):
             if credentials.create_scoped_required():
                 credentials = credentials.create_scoped(
                     'https://www.googleapis.com/auth/cloud-platform')
+            http = self.http
+            if http is None:
+                http = httplib2.Http(timeout=60)
             cached_client = discovery.build(
                 self.service,
                 self.version,
-                http=credentials.authorize(self.http),
+                http=credentials.authorize(http),
                 cache_discovery=self.cache_discovery)
             thread_local.api = cached_client
         return cached_client
@@ -0,0 +1,347 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#            http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Submit Cloud DNS changes in batches and track their completion.
+
+Compute engine activity events arrive as separate push requests, which during
+autoscaling can be hundreds per second. The changes of the requests handled at
+the same time by an instance are merged into one change per zone. The push
+requests only wait for the change to be accepted, its completion is checked
+later by the CheckDnsChanges cron handler.
+"""
+
+import json
+import logging
+import threading
+import time
+
+from google.cloud import datastore
+from googleapiclient import errors
+import webapp2
+
+from dns_sync import api
+from dns_sync import reconcile
+from dns_sync import zones
+
+
+def get_a_records(dns_names, zone_name):
+    """Lookup the 'A' records with the supplied names in one batch request.
+
+    Args:
+        dns_names: List of DNS names.
+        zone_name: Cloud DNS managed zone name.
+
+    Returns:
+        Dictionary mapping the DNS names with an A record to the record.
+
+    Raises:
+        errors.HttpError: If a lookup failed.
+    """
+    a_records = {}
+    failures = []
+
+    def callback(_, response, exception):
+        if exception is not None:
+            failures.append(exception)
+            return
+        # There should only be one with this name.
+        for rr_set in response.get('rrsets', [])[:1]:
+            a_records[rr_set['name']] = rr_set
+
+    batch = api.CLIENTS.dns.new_batch_http_request(callback=callback)
+    for dns_name in dns_names:
+        batch.add(api.CLIENTS.dns.resourceRecordSets().list(
+            managedZone=zone_name,
+            project=zones.CONFIG.managed_zone_project,
+            name=dns_name,
+            type='A'))
+    if dns_names:
+        batch.execute()
+    if failures:
+        raise failures[0]
+    return a_records
+
+
+class PendingDnsChange(datastore.Entity):
+    """A submitted Cloud DNS change which wasn't done yet.
+
+    Keyed by the string 'zone_name:change_id'.
+    """
+    KIND = 'PendingDnsChange'
+
+    def __init__(self, zone_name, change):
+        """Save the change.
+
+        Args:
+            zone_name: Cloud DNS managed zone name.
+            change: The change returned by the Cloud DNS API.
+        """
+        super(PendingDnsChange, self).__init__(
+            api.CLIENTS.datastore.key(PendingDnsChange.KIND, '{}:{}'.format(
+                zone_name, change['id'])), ['change'])
+        self.update({
+            'zone_name': zone_name,
+            'change_id': change['id'],
+            'change': json.dumps(change),
+            'submit_time': time.time()
+        })
+
+    def put(self):
+        """Saves entity in datastore."""
+        return api.CLIENTS.datastore.put(self)
+
+
+def submit_change(change, zone_name):
+    """Submit a change to a zone, tracking it until it's done.
+
+    Args:
+        change: The change object to apply.
+        zone_name: Name of the DNS zone.
+
+    Returns:
+        The change returned by the Cloud DNS API.
+    """
+    operation = api.CLIENTS.dns.changes().create(
+        managedZone=zone_name,
+        project=zones.CONFIG.managed_zone_project,
+        body=change).execute()
+    if operation['status'] == 'pending':
+        PendingDnsChange(zone_name, operation).put()
+    return operation
+
+
+def change_keys(change):
+    """The set of (name, type) of the records a change adds or deletes."""
+    return set(
+        reconcile.record_key(record)
+        for record in change.get('additions', []) + change.get(
+            'deletions', []))
+
+
+class _Contribution(object):
+    """The change of one request, and the result of submitting it."""
+
+    def __init__(self, change):
+        self.change = change
+        self.keys = change_keys(change)
+        self.operation = None
+        self.error = None
+
+
+class _ZoneBatch(object):
+    """Changes to a zone which will be submitted as one change."""
+
+    def __init__(self):
+        self.contributions = []
+        self.keys = set()
+        self.num_additions = 0
+        self.num_deletions = 0
+        self.closed = False
+        self.submitted = threading.Event()
+
+    def can_add(self, contribution):
+        """True if the change doesn't touch the records of the batch.
+
+        The changes of a batch can then be applied in any order, and the
+        merged change stays within the Cloud DNS limits.
+        """
+        change = contribution.change
+        return (not (self.keys & contribution.keys) and
+                self.num_additions + len(change.get('additions', [])) <=
+                reconcile.MAX_RECORDS_PER_CHANGE and
+                self.num_deletions + len(change.get('deletions', [])) <=
+                reconcile.MAX_RECORDS_PER_CHANGE)
+
+    def add(self, contribution):
+        self.contributions.append(contribution)
+        self.keys |= contribution.keys
+        self.num_additions += len(contribution.change.get('additions', []))
+        self.num_deletions += len(contribution.change.get('deletions', []))
+
+    def merged_change(self):
+        """Returns the change with all the additions and deletions."""
+        merged = {'additions': [], 'deletions': []}
+        for contribution in self.contributions:
+            merged['additions'].extend(
+                contribution.change.get('additions', []))
+            merged['deletions'].extend(
+                contribution.change.get('deletions', []))
+        return merged
+
+
+class ChangeCoalescer(object):
+    """Merge the changes submitted to a zone at about the same time.
+
+    The first request to submit a change to a zone opens a batch and waits
+    WINDOW_SECONDS for other requests to add their change to it, then closes
+    the batch and submits the merged change. A change touching the records of
+    a batch which isn't submitted yet waits for it, so changes to the same
+    records are submitted in order. Every request waits for the batch to be
+    submitted, so that a failure is returned to the request (and the pub/sub
+    message is redelivered). If the merged change is rejected, the changes are
+    submitted one by one so that one bad change doesn't fail the others.
+    """
+
+    WINDOW_SECONDS = 0.25
+
+    def __init__(self, submit_change_function):
+        """Create the coalescer.
+
+        Args:
+            submit_change_function: Function taking a change and zone name
+                which submits the change and returns the Cloud DNS change.
+        """
+        self.submit_change_function = submit_change_function
+        self._lock = threading.Lock()
+        # Zone name to its open batch, if any, and the closed batches being
+        # submitted, in the order they were opened.
+        self._batches = {}
+
+    def submit(self, change, zone_name):
+        """Submit a change to a zone along with the other requests' changes.
+
+        Args:
+            change: The change object to apply.
+            zone_name: Name of the DNS zone.
+
+        Returns:
+            The Cloud DNS change the change was submitted in.
+
+        Raises:
+            errors.HttpError: If the change was rejected.
+        """
+        contribution = _Contribution(change)
+        while True:
+            with self._lock:
+                batches = self._batches.setdefault(zone_name, [])
+                open_batch = None
+                if batches and not batches[-1].closed:
+                    open_batch = batches[-1]
+                # Changes to the same records are submitted in order.
+                wait_for = next((batch for batch in batches
+                                 if batch.closed and
+                                 batch.keys & contribution.keys), None)
+                if wait_for is None:
+                    if open_batch is None:
+                        batch = _ZoneBatch()
+                        batch.add(contribution)
+                        batches.append(batch)
+                        is_leader = True
+                        break
+                    if open_batch.can_add(contribution):
+                        batch = open_batch
+                        batch.add(contribution)
+                        is_leader = False
+                        break
+                    wait_for = open_batch
+            wait_for.submitted.wait()
+
+        if is_leader:
+            time.sleep(ChangeCoalescer.WINDOW_SECONDS)
+            with self._lock:
+                batch.closed = True
+            try:
+                self.submit_batch(batch, zone_name)
+            finally:
+                with self._lock:
+                    batches = self._batches[zone_name]
+                    batches.remove(batch)
+                    if not batches:
+                        del self._batches[zone_name]
+                batch.submitted.set()
+        else:
+            batch.submitted.wait()
+
+        if contribution.error is not None:
+            raise contribution.error
+        return contribution.operation
+
+    def submit_batch(self, batch, zone_name):
+        """Submit the changes of a batch, setting the result of each change.
+
+        Args:
+            batch: The _ZoneBatch to submit.
+            zone_name: Name of the DNS zone.
+        """
+        contributions = batch.contributions
+        logging.debug('submitting %s changes to zone %s', len(contributions),
+                      zone_name)
+        try:
+            operation = self.submit_change_function(batch.merged_change(),
+                                                    zone_name)
+            for contribution in contributions:
+                contribution.operation = operation
+            return
+        except errors.HttpError as e:
+            if len(contributions) == 1:
+                contributions[0].error = e
+                return
+            logging.warning('merged change to zone %s failed, submitting %s '
+                            'changes one by one', zone_name,
+                            len(contributions), exc_info=True)
+        except Exception as e:  # pylint: disable=broad-except
+            for contribution in contributions:
+                contribution.error = e
+            return
+
+        for contribution in contributions:
+            try:
+                contribution.operation = self.submit_change_function(
+                    contribution.change, zone_name)
+            except Exception as e:  # pylint: disable=broad-except
+                contribution.error = e
+
+
+COALESCER = ChangeCoalescer(submit_change)
+
+
+class CheckDnsChanges(webapp2.RequestHandler):
+    """Check the completion of the submitted Cloud DNS changes.
+
+    Requested by App Engine cron, see cron.yaml.
+    """
+
+    def get(self):
+        """Forget the done changes, and log the failed ones."""
+        # App Engine removes this header from requests not made by cron.
+        if self.request.headers.get('X-Appengine-Cron') != 'true':
+            self.response.status = 403
+            return
+
+        query = api.CLIENTS.datastore.query(kind=PendingDnsChange.KIND)
+        done_keys = []
+        for pending_change in query.fetch():
+            zone_name = pending_change['zone_name']
+            try:
+                change = api.CLIENTS.dns.changes().get(
+                    changeId=pending_change['change_id'],
+                    managedZone=zone_name,
+                    project=zones.CONFIG.managed_zone_project).execute()
+            except errors.HttpError as e:
+                if e.resp.status != 404:
+                    raise
+                logging.error('dns change %s in zone %s not found.',
+                              pending_change['change_id'], zone_name)
+                done_keys.append(pending_change.key)
+                continue
+            if change['status'] == 'pending':
+                continue
+            elif change['status'] == 'done':
+                logging.info('dns change %s completed successfully.',
+                             json.dumps(change))
+            else:
+                logging.error('dns change %s failed.', json.dumps(change))
+            done_keys.append(pending_change.key)
+        if done_keys:
+            api.CLIENTS.datastore.delete_multi(done_keys)
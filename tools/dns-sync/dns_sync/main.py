@@ -20,7 +20,6 @@ import logging
 import mimetypes
 import os
 import re
-import time
 import urllib
 
 from google.cloud import datastore
@@ -30,6 +29,8 @@ import webapp2
 from dns_sync import api
 from dns_sync import audit_log
 from dns_sync import auth
+from dns_sync import dns_changes
+from dns_sync import reconcile
 from dns_sync import zones
 
 
@@ -42,6 +43,8 @@ class CreatedDnsResource(datastore.Entity):
     keyed by the string 'project_id:resource_type:resource_id'.
     """
     KIND = 'CreatedDnsResource'
+    # Datastore accepts at most 500 entities in a single put.
+    BATCH_SIZE = 500
 
     def __init__(self, entity_id, project_id, resource_name, resource_string,
                  event):
@@ -83,6 +86,28 @@ class CreatedDnsResource(datastore.Entity):
         else:
             return None
 
+    @classmethod
+    def put_missing(cls, created_dns_resources):
+        """Saves the entities which aren't in datastore yet.
+
+        Existence is checked, and entities saved, in batches.
+
+        Args:
+            created_dns_resources: List of CreatedDnsResource.
+        """
+        for start in xrange(0, len(created_dns_resources),
+                            CreatedDnsResource.BATCH_SIZE):
+            batch = created_dns_resources[
+                start:start + CreatedDnsResource.BATCH_SIZE]
+            existing_keys = set(
+                entity.key for entity in api.CLIENTS.datastore.get_multi(
+                    [created_dns_resource.key
+                     for created_dns_resource in batch]))
+            missing = [created_dns_resource for created_dns_resource in batch
+                       if created_dns_resource.key not in existing_keys]
+            if missing:
+                api.CLIENTS.datastore.put_multi(missing)
+
     def put(self):
         """Saves entity in datastore."""
         return api.CLIENTS.datastore.put(self)
@@ -92,93 +117,25 @@ class CreatedDnsResource(datastore.Entity):
         return api.CLIENTS.datastore.delete(self.key)
 
 
-def wait_for_dns_operation_completion(operation, zone_name, retry_count=0):
-    """Wait for the dns operation to complete.
-
-    Args:
-        operation: the operation object to wait on.
-        zone_name: dns zone operation is for.
-        retry_count: times this operation was waited on.
-
-    Raises:
-        Exception: If the operation failed due to an error.
-    """
-    change = api.CLIENTS.dns.changes().get(
-        changeId=operation['id'],
-        managedZone=zone_name,
-        project=zones.CONFIG.managed_zone_project).execute()
-    if change['status'] == 'pending':
-        # Retry with backoff and max of 10 seconds.
-        time.sleep(min(1.5**retry_count, 10))
-        wait_for_dns_operation_completion(
-            change, zone_name, retry_count=retry_count + 1)
-    elif change['status'] == 'done':
-        logging.info('dns change %s completed successfully.',
-                     json.dumps(change))
-    else:
-        raise Exception('dns change {} failed.'.format(json.dumps(change)))
-
-
-def change_dns_record(change, zone_name, wait_for_operation=True):
-    """Apply the input DNS change.
-
-    Calls the dns.change.create API.
-
-    Args:
-        change: The change object to apply.
-        zone_name: Name of the DNS zone
-        wait_for_operation: True if the operation needs to complete before
-            returning. If the operation fails, an exception is raised.
-    """
-    operation = api.CLIENTS.dns.changes().create(
-        managedZone=zone_name,
-        project=zones.CONFIG.managed_zone_project,
-        body=change).execute()
-    if wait_for_operation:
-        wait_for_dns_operation_completion(operation, zone_name)
-
-
-def get_a_record(dns_name, zone_name):
-    """Lookup an 'A' record with the supplied name.
-
-    Args:
-        dns_name: DNS nname of the resource.
-        zone_name: Cloud DNS managed zone name.
-
-    Returns:
-        The first A record for the DNS resource. None if not found
-    """
-    rr_set_response = api.CLIENTS.dns.resourceRecordSets().list(
-        managedZone=zone_name,
-        project=zones.CONFIG.managed_zone_project,
-        name=dns_name,
-        type='A').execute()
-    # There should only be one with this name.
-    rr_set = rr_set_response.get('rrsets', [])
-    if len(rr_set) >= 1:
-        return rr_set[0]
-    else:
-        return None
-
-
 def delete_dns_a_records(dns_names, zone_name):
     """Removed the DNS A records from the zone.
 
+    The change is submitted along with the changes of other requests to the
+    zone, without waiting for it to complete.
+
     Args:
         dns_names: List of strings. The name of the A records to remove.
         zone_name: Cloud DNS managed zone name.
     """
     # We must get the a_record first to obtain the ip address as we can't
     # delete the dns record with just the name, it requires all data.
-    rr_sets = []
-    for dns_name in dns_names:
-        rr_set = get_a_record(dns_name, zone_name)
-        if rr_set:
-            rr_sets.append(rr_set)
+    a_records = dns_changes.get_a_records(dns_names, zone_name)
+    rr_sets = [a_records[dns_name] for dns_name in dns_names
+               if dns_name in a_records]
     # Are there existing records?
     if rr_sets:
         body = {'deletions': rr_sets}
-        change_dns_record(body, zone_name)
+        dns_changes.COALESCER.submit(body, zone_name)
 
 
 def get_dns_names(resource, project):
@@ -206,7 +163,7 @@ def get_dns_zone(resource):
 
     Uses the regular_expression_zone_mapping to map the resource to a zone.
     Will use the resource subnet first, otherwise the resource name to match
-    against the zone regular expressions. if
+    against the zone regular expressions, see zone_router.ZoneRouter. if
     CONFIG.regular_expression_zone_mapping is None or no matches are found.
     then configured default_zone is used.
 
@@ -216,33 +173,8 @@ def get_dns_zone(resource):
     Returns:
         Two item tuple of the Cloud DNS zone name and Cloud DNS zone DNS name.
     """
-    def find_matching_zone_name(resource_name):
-        if resource_name and zones.CONFIG.regular_expression_zone_mapping:
-            for reg_expression, zone in iter(
-                    zones.CONFIG.regular_expression_zone_mapping):
-                if re.search(reg_expression, resource_name):
-                    return zone
-        return None
-
-    # ForwardingRules have subnet at top level.
-    matching_zone_name = find_matching_zone_name(
-        resource.get('subnetwork', None))
-
-    # Instance have network in networkInterfaces.
-    if not matching_zone_name:
-        for network_interface in resource.get('networkInterfaces', []):
-            matching_zone_name = find_matching_zone_name(
-                network_interface.get('subnetwork', None))
-            if matching_zone_name:
-                break
-    # Otherwise use name.
-    if not matching_zone_name:
-        matching_zone_name = find_matching_zone_name(
-            resource.get('name', None))
-    # Rr full link.
-    if not matching_zone_name:
-        matching_zone_name = find_matching_zone_name(
-            resource.get('selfLink', None))
+    matching_zone_name = zones.CONFIG.zone_router.find_resource_zone(
+        resource)
     # Give up and use default.
     if not matching_zone_name:
         matching_zone_name = zones.CONFIG.default_zone
@@ -250,34 +182,6 @@ def get_dns_zone(resource):
             zones.CONFIG.get_zone_dns_name(matching_zone_name))
 
 
-def create_dns_a_record(dns_name, ip_addresses, zone_name):
-    """Adds a single dns A record with the name and IP addresses.
-
-    Will take care to delete the record of the same name if it exists with
-    incorrect IPs.
-
-    Args:
-        dns_name: DNS name of the A record
-        ip_addresses: List of IP addresses to define the record rrdatas.
-        zone_name: Cloud DNS zone name to create the records in.
-    """
-    rr_set = get_a_record(dns_name, zone_name)
-    body = {}
-    # Record present and is wrong.
-    if rr_set and ip_addresses != rr_set.get('rrdatas', []):
-        body['deletions'] = [rr_set]
-    if not rr_set or ('deletions' in body):
-        body['additions'] = [{
-            'name': dns_name,
-            'type': 'A',
-            'ttl': 300,
-            'rrdatas': ip_addresses
-        }]
-    # Is there any work to do? body is empty if the record already exists.
-    if body:
-        change_dns_record(body, zone_name)
-
-
 def append_records(a_records, prefix, network_interface, dns_name,
                   dns_internal_name):
     """Append a tuple of dns_name and ip address to the input a_records list.
@@ -354,6 +258,9 @@ def get_zone_name_and_ips_for_resource(resource, project):
 def create_dns_a_records_for_resource(resource, project):
     """Create the dns records for a GCE resource.
 
+    The change is submitted along with the changes of other requests to the
+    zone, without waiting for it to complete.
+
     Args:
        resource: The resource object, like a instance or forwardingRule.
        project: Project ID that owns the resource.
@@ -362,10 +269,12 @@ def create_dns_a_records_for_resource(resource, project):
         resource, project)
     logging.debug('creating records %s for resource %s in zone %s', a_records,
                   resource, zone_name)
+    existing_a_records = dns_changes.get_a_records(
+        [dns_name for dns_name, _ in a_records], zone_name)
     deletions = []
     additions = []
     for (dns_name, ip_addresses) in a_records:
-        rr_set = get_a_record(dns_name, zone_name)
+        rr_set = existing_a_records.get(dns_name)
         # Record present and wrong.
         if rr_set and ip_addresses != rr_set.get('rrdatas', []):
             deletions.append(rr_set)
@@ -384,7 +293,7 @@ def create_dns_a_records_for_resource(resource, project):
         body['additions'] = additions
     # When body is empty, there is no work to do.
     if body:
-        change_dns_record(body, zone_name)
+        dns_changes.COALESCER.submit(body, zone_name)
 
 
 def get_project_from_dns_name(dns_name, zone_name):
@@ -414,6 +323,9 @@ class SyncProjectsWithDns(auth.AdminRequestHandler):
     with those resources creating and deleting DNS 'A' records in the zone.
     """
 
+    # Number of projects whose resources are listed at the same time.
+    MAX_CONCURRENT_PROJECTS = 16
+
     def get_project_instances(self, project):
         """List all GCE instances in the project.
 
@@ -456,18 +368,38 @@ class SyncProjectsWithDns(auth.AdminRequestHandler):
                 forwarding_rules.append(rule)
         return forwarding_rules
 
-    def translate_to_a_records(self, project, instances, forwarding_rules):
+    def get_project_resources(self, project):
+        """List all GCE instances and forwarding rules in the project.
+
+        Args:
+            project: Project id.
+
+        Returns:
+            Tuple of the list of GCE instances and the list of forwarding
+            rules.
+        """
+        return (self.get_project_instances(project),
+                self.get_project_forwarding_rules(project))
+
+    def translate_to_a_records(self, project, instances, forwarding_rules,
+                               created_dns_resources=None):
         """Convert project resources into A records.
 
         Args:
             project: Project id.
             instances: List of GCE instances.
             forwarding_rules: List of forwarding rules.
+            created_dns_resources: List to append a CreatedDnsResource to for
+                every resource, for the caller to save. When None they are
+                saved before returning.
 
         Returns:
             A dictionary mapping a Cloud DNS zone name to list of A records
             that should exist in that zone.
         """
+        save_created_dns_resources = created_dns_resources is None
+        if save_created_dns_resources:
+            created_dns_resources = []
         a_records_to_add = collections.defaultdict(list)
         # Translate all project resources into a list of A records to
         # create.
@@ -477,13 +409,12 @@ class SyncProjectsWithDns(auth.AdminRequestHandler):
             # Add CreatedDnsResource.
             create_dns_rsource_id = '{}:{}:{}'.format(
                 project, resource['kind'][8:], resource['id'])
-            if not CreatedDnsResource.get_by_id(create_dns_rsource_id):
-                CreatedDnsResource(
-                    entity_id=create_dns_rsource_id,
-                    project_id=project,
-                    resource_string=json.dumps(resource),
-                    resource_name=resource['name'],
-                    event='synced').put()
+            created_dns_resources.append(CreatedDnsResource(
+                entity_id=create_dns_rsource_id,
+                project_id=project,
+                resource_string=json.dumps(resource),
+                resource_name=resource['name'],
+                event='synced'))
 
             for dns_name, ip_addresses in a_records:
                 a_records_to_add[zone_name].append({
@@ -492,6 +423,8 @@ class SyncProjectsWithDns(auth.AdminRequestHandler):
                     'ttl': 300,
                     'rrdatas': ip_addresses
                 })
+        if save_created_dns_resources:
+            CreatedDnsResource.put_missing(created_dns_resources)
         return a_records_to_add
 
     def get_a_records_to_add(self, project):
@@ -504,16 +437,16 @@ class SyncProjectsWithDns(auth.AdminRequestHandler):
             A dictionary mapping a Cloud DNS zone name to list of A records
             that should exist in that zone.
         """
-        return self.translate_to_a_records(
-            project,
-            self.get_project_instances(project),
-            self.get_project_forwarding_rules(project))
+        instances, forwarding_rules = self.get_project_resources(project)
+        return self.translate_to_a_records(project, instances,
+                                           forwarding_rules)
 
     def merge_with_existing_records(self, records_to_add, records_to_delete,
                                     projects, zone_name):
         """Determine the change to be made to a Cloud DNS zone.
 
-        Loop through all Cloud DNS records in the zone modifying the input
+        Loop once through all Cloud DNS records in the zone, comparing them by
+        name and type with the records to add, and modify the input
         records_to_add and records_to_delete lists to contain the changes that
         need to be made. For example, not creating a record that already
         exists, deleting records that need to be changed or aren't in the list
@@ -532,39 +465,19 @@ class SyncProjectsWithDns(auth.AdminRequestHandler):
                 type='A',
                 pageToken=page_token)
 
-        # Loop through all existing dns a records, if it's for a
-        # project we are syncing determine if we should delete the
-        # record or keep it by removing it from list to add.
-        for existing_a_record in api.resource_iterator(rr_set_pager):
-            logging.debug('existing a record %s', existing_a_record)
+        synced_projects = set(projects)
+
+        # Only records for a project we are syncing are deleted or kept.
+        def is_synced(existing_a_record):
             record_project = get_project_from_dns_name(
                 existing_a_record['name'], zone_name)
-            logging.debug('record project %s', record_project)
-            # If the record isn't for a project we are syncing
-            # ignore it.
-            if record_project not in projects:
-                continue
-
-            matching_record = None
-            logging.debug('zone records to add %s', records_to_add)
-            for a_record_to_add in records_to_add:
-                if (a_record_to_add['name'] == existing_a_record['name'] and
-                        a_record_to_add['rrdatas'] ==
-                        existing_a_record['rrdatas']):
-                    matching_record = a_record_to_add
-                    break
-
-            if matching_record:
-                logging.debug('record exists for resource %s',
-                              matching_record['name'])
-                records_to_add.remove(matching_record)
-                break
-
-            # existing record has no matching resource
-            if not matching_record:
-                logging.debug('no resource forrecord %s. deleting it',
-                              existing_a_record['name'])
-                records_to_delete.append(existing_a_record)
+            return record_project in synced_projects
+
+        additions, deletions = reconcile.ZoneReconciler(
+            records_to_add).reconcile(
+                api.resource_iterator(rr_set_pager), is_synced)
+        records_to_add[:] = additions
+        records_to_delete.extend(deletions)
 
     def post(self):
         """Sync projects webhook.
@@ -582,12 +495,22 @@ class SyncProjectsWithDns(auth.AdminRequestHandler):
             ]
 
         logging.info('syncing projects: ' + str(projects))
+        # List the resources of the projects concurrently. Each thread uses
+        # its own compute client.
+        project_resources = api.map_in_threads(
+            self.get_project_resources, projects,
+            SyncProjectsWithDns.MAX_CONCURRENT_PROJECTS)
+
         # From zone_name->a_records for all projects we are syncing.
         a_records_to_add = collections.defaultdict(list)
-        for project in projects:
-            a_records = self.get_a_records_to_add(project)
+        created_dns_resources = []
+        for project, (instances, forwarding_rules) in zip(projects,
+                                                           project_resources):
+            a_records = self.translate_to_a_records(
+                project, instances, forwarding_rules, created_dns_resources)
             for zone, records in a_records.iteritems():
                 a_records_to_add[zone].extend(records)
+        CreatedDnsResource.put_missing(created_dns_resources)
 
         # Determine what records need to be deleted,
         a_records_to_delete = collections.defaultdict(list)
@@ -606,15 +529,13 @@ class SyncProjectsWithDns(auth.AdminRequestHandler):
             self.merge_with_existing_records(records_to_add, records_to_delete,
                                              projects, zone_name)
 
-            # Are there records to add or delete in the zone?
-            if records_to_add or records_to_delete:
-                changes = {
-                    'additions': records_to_add,
-                    'deletions': records_to_delete
-                }
-                # But don't wait for operation to complete.
-                # as there are many of them to send.
-                change_dns_record(changes, zone_name, False)
+            # Send the records to add or delete in the zone, if any, in as
+            # many changes as the Cloud DNS limits require. But don't wait for
+            # the operations to complete as there are many of them to send,
+            # they are checked by the CheckDnsChanges cron handler.
+            for changes in reconcile.chunk_changes(records_to_add,
+                                                   records_to_delete):
+                dns_changes.submit_change(changes, zone_name)
 
 
 class ComputeEngineActivityPush(webapp2.RequestHandler):
@@ -912,6 +833,7 @@ class DnsSyncApplication(webapp2.WSGIApplication):
             ('/get_audit_log_state', audit_log.GetAuditLogState),
             ('/static/(.+)', AdminStaticFileHandler),
             ('/sync_projects', SyncProjectsWithDns),
+            ('/check_dns_changes', dns_changes.CheckDnsChanges),
             webapp2.Route(
                 '/',
                 webapp2.RedirectHandler,
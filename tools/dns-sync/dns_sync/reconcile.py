@@ -0,0 +1,134 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#            http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Reconcile the records of a Cloud DNS zone with the records that should exist.
+
+Records are indexed by name and type so the existing records of a zone are
+compared with the desired records in a single pass, and the resulting change is
+split into change sets that fit within the Cloud DNS per change limits.
+"""
+
+import collections
+import logging
+
+# Cloud DNS accepts at most this many additions, and this many deletions, in a
+# single change.
+MAX_RECORDS_PER_CHANGE = 1000
+
+
+def record_key(record):
+    """The key identifying a record set in a zone.
+
+    Args:
+        record: Dictionary of the resource record set.
+
+    Returns:
+        Tuple of the record name and type.
+    """
+    return record['name'], record['type']
+
+
+class ZoneReconciler(object):
+    """Compute the change that brings a zone in line with the desired records.
+
+    Attributes:
+        desired_records: OrderedDict of the records that should exist in the
+            zone, keyed by record_key.
+    """
+
+    def __init__(self, records_to_add):
+        """Index the records that should exist in the zone.
+
+        Args:
+            records_to_add: List of records that should exist in the zone. Only
+                the first of several records with the same name and type is
+                kept, as a zone can't hold them all.
+        """
+        self.desired_records = collections.OrderedDict()
+        for record in records_to_add:
+            key = record_key(record)
+            if key in self.desired_records:
+                logging.warning('ignoring duplicate record %s', record)
+                continue
+            self.desired_records[key] = record
+
+    def reconcile(self, existing_records, is_synced):
+        """Compare the existing records of the zone with the desired records.
+
+        Existing records that match a desired record are kept. Those that
+        differ from the desired record or have no desired record are deleted,
+        provided they are for a project being synced.
+
+        Args:
+            existing_records: Iterable of the records in the zone.
+            is_synced: Function returning True if an existing record is for a
+                project being synced.
+
+        Returns:
+            Tuple of (additions, deletions) lists of records.
+        """
+        additions = collections.OrderedDict(self.desired_records)
+        deletions = []
+        for existing_record in existing_records:
+            if not is_synced(existing_record):
+                continue
+            key = record_key(existing_record)
+            desired_record = additions.get(key)
+            if (desired_record is not None and
+                    desired_record['rrdatas'] == existing_record['rrdatas']):
+                logging.debug('record exists for resource %s', key[0])
+                del additions[key]
+            else:
+                logging.debug('no resource for record %s. deleting it', key[0])
+                deletions.append(existing_record)
+        return list(additions.values()), deletions
+
+
+def chunk_changes(additions, deletions,
+                  max_records_per_change=MAX_RECORDS_PER_CHANGE):
+    """Split a zone change into change sets within the Cloud DNS limits.
+
+    A record that replaces an existing record is deleted in the same change
+    set it is added in, as Cloud DNS rejects adding a record that exists.
+
+    Args:
+        additions: List of records to add.
+        deletions: List of records to delete.
+        max_records_per_change: Maximum number of additions, and of deletions,
+            in a change set.
+
+    Yields:
+        Change bodies with 'additions' and 'deletions' lists.
+    """
+    additions_by_key = collections.OrderedDict(
+        (record_key(record), record) for record in additions)
+    pairs = []
+    for deletion in deletions:
+        pairs.append((deletion, additions_by_key.pop(record_key(deletion),
+                                                     None)))
+    for addition in additions_by_key.values():
+        pairs.append((None, addition))
+
+    change = {'additions': [], 'deletions': []}
+    for deletion, addition in pairs:
+        if deletion is not None:
+            change['deletions'].append(deletion)
+        if addition is not None:
+            change['additions'].append(addition)
+        if (len(change['additions']) >= max_records_per_change or
+                len(change['deletions']) >= max_records_per_change):
+            yield change
+            change = {'additions': [], 'deletions': []}
+    if change['additions'] or change['deletions']:
+        yield change
@@ -0,0 +1,150 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#            http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Route GCE resources to Cloud DNS zones with the zone mapping expressions.
+
+The regular expressions of the zone mapping are compiled once, and the zone of
+every subnetwork is remembered across requests as there are few subnetworks and
+many resources. A router is built for each distinct mapping, so a router for a
+stale mapping is never used after the configuration changes.
+"""
+
+import re
+import threading
+
+
+class ZoneRouter(object):
+    """Find the zone of a resource from a list of expression, zone pairs.
+
+    The first expression, in mapping order, found by re.search in a string
+    gives the zone. The expressions are searched one at a time rather than
+    combined into a single alternation, which is slower as the regular
+    expression engine can't then skip ahead to the literal prefix of each
+    expression.
+
+    Attributes:
+        mapping: Tuple of (regular expression, zone name) pairs.
+    """
+
+    # Maximum number of subnetworks whose zone is remembered.
+    MAX_CACHED_SUBNETWORKS = 10000
+
+    _routers = {}
+    _routers_lock = threading.Lock()
+
+    @classmethod
+    def for_mapping(cls, mapping):
+        """Return the router for a zone mapping, building it if needed.
+
+        Args:
+            mapping: List of [regular expression, zone name] pairs, or None.
+
+        Returns:
+            The ZoneRouter of the mapping.
+        """
+        key = tuple(tuple(pair) for pair in mapping or ())
+        with cls._routers_lock:
+            router = cls._routers.get(key)
+            if router is None:
+                # Only the router of the current mapping is kept.
+                cls._routers.clear()
+                router = ZoneRouter(key)
+                cls._routers[key] = router
+            return router
+
+    @classmethod
+    def clear_routers(cls):
+        """Forget the routers and their subnetwork zones."""
+        with cls._routers_lock:
+            cls._routers.clear()
+
+    def __init__(self, mapping):
+        """Compile the mapping expressions.
+
+        Args:
+            mapping: Tuple of (regular expression, zone name) pairs.
+        """
+        self.mapping = mapping
+        self._patterns = [(re.compile(expression), zone)
+                          for expression, zone in mapping]
+        self._subnetwork_zones = {}
+        self._subnetwork_zones_lock = threading.Lock()
+
+    def find_zone(self, value):
+        """Return the zone of the first expression found in the value.
+
+        Args:
+            value: String like a resource name, subnetwork or selfLink.
+
+        Returns:
+            The zone name, None if no expression is found in the value.
+        """
+        if not value:
+            return None
+        for pattern, zone in self._patterns:
+            if pattern.search(value):
+                return zone
+        return None
+
+    def find_subnetwork_zone(self, subnetwork):
+        """Return the zone of a subnetwork, remembering it.
+
+        Args:
+            subnetwork: Subnetwork URL.
+
+        Returns:
+            The zone name, None if no expression is found in the subnetwork.
+        """
+        if not subnetwork:
+            return None
+        try:
+            return self._subnetwork_zones[subnetwork]
+        except KeyError:
+            pass
+        zone = self.find_zone(subnetwork)
+        with self._subnetwork_zones_lock:
+            if len(self._subnetwork_zones) >= ZoneRouter.MAX_CACHED_SUBNETWORKS:
+                self._subnetwork_zones.clear()
+            self._subnetwork_zones[subnetwork] = zone
+        return zone
+
+    def find_resource_zone(self, resource):
+        """Find the zone of a GCE resource.
+
+        The resource subnetwork is used first, then the subnetworks of its
+        network interfaces, its name and finally its selfLink.
+
+        Args:
+            resource: The GCE resource object, like an instance or forwarding
+                rule.
+
+        Returns:
+            The zone name, None if no expression matches the resource.
+        """
+        # ForwardingRules have subnet at top level.
+        zone = self.find_subnetwork_zone(resource.get('subnetwork', None))
+        # Instance have network in networkInterfaces.
+        if not zone:
+            for network_interface in resource.get('networkInterfaces', []):
+                zone = self.find_subnetwork_zone(
+                    network_interface.get('subnetwork', None))
+                if zone:
+                    break
+        # Otherwise use name.
+        if not zone:
+            zone = self.find_zone(resource.get('name', None))
+        # Or full link.
+        if not zone:
+            zone = self.find_zone(resource.get('selfLink', None))
+        return zone
@@ -22,6 +22,7 @@ import webapp2
 from dns_sync import api
 from dns_sync.auth import AdminRequestHandler
 from dns_sync.config import get_project_id
+from dns_sync.zone_router import ZoneRouter
 
 
 class RegistryCachedPropertyBaseClass(object):
@@ -160,6 +161,14 @@ class ZoneConfig(object):
         else:
             return []
 
+    @RequestCachedProperty
+    def zone_router(self):
+        """Router of resources to zones for the current zone mapping.
+
+        Shared by all requests with the same mapping.
+        """
+        return ZoneRouter.for_mapping(self.regular_expression_zone_mapping)
+
     @RequestCachedProperty
     def default_zone(self):
         """Return the Cloud DNS default zone."""
@@ -240,6 +249,9 @@ class SetZoneConfig(AdminRequestHandler):
         old_config = ZoneConfigEntity.get_entity()
         old_config.update(new_config)
         old_config.put()
+        # Zones and their DNS names may have changed.
+        ZoneRouter.clear_routers()
+        CONFIG.managed_zone_dns_name_cache.clear()
         self.response.content_type = 'application/json'
         self.response.write(json.dumps(new_config))
 
@@ -0,0 +1,119 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#            http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark zone routing of a synthetic set of resources.
+
+Compares the ZoneRouter with searching the zone mapping expressions one at a
+time for every resource. Run from the dns-sync directory with:
+
+    PYTHONPATH=. python tests/benchmark_zone_router.py
+"""
+
+import random
+import re
+import time
+
+from dns_sync import zone_router
+
+NUM_RESOURCES = 100000
+NUM_SUBNETWORKS = 200
+NUM_ZONES = 20
+
+SELF_LINK = ('https://www.googleapis.com/compute/v1/projects/project-{}/'
+             'zones/us-central1-a/instances/{}')
+SUBNETWORK = ('https://www.googleapis.com/compute/v1/projects/project-{}/'
+              'regions/us-central1/subnetworks/{}')
+
+
+def make_mapping():
+    """Zones selected by subnetwork and by resource name prefix."""
+    mapping = []
+    for zone in range(NUM_ZONES):
+        mapping.append([r'subnetworks/team-{}-'.format(zone),
+                        'subnet-zone-{}'.format(zone)])
+        mapping.append([r'^app-{}-\d+$'.format(zone),
+                        'name-zone-{}'.format(zone)])
+    return mapping
+
+
+def make_resources():
+    """Instances spread over projects and subnetworks, a few without a zone."""
+    rand = random.Random(42)
+    subnetworks = [
+        SUBNETWORK.format(index % 50, 'team-{}-{}'.format(
+            rand.randrange(NUM_ZONES * 2), index))
+        for index in range(NUM_SUBNETWORKS)
+    ]
+    resources = []
+    for index in range(NUM_RESOURCES):
+        name = 'app-{}-{}'.format(rand.randrange(NUM_ZONES * 2), index)
+        resources.append({
+            'name': name,
+            'selfLink': SELF_LINK.format(index % 50, name),
+            'networkInterfaces': [{
+                'subnetwork': rand.choice(subnetworks)
+            }]
+        })
+    return resources
+
+
+def search_resource_zone(mapping, resource):
+    """Zone routing as done before the ZoneRouter."""
+
+    def find_matching_zone_name(resource_name):
+        if resource_name and mapping:
+            for reg_expression, zone in iter(mapping):
+                if re.search(reg_expression, resource_name):
+                    return zone
+        return None
+
+    matching_zone_name = find_matching_zone_name(
+        resource.get('subnetwork', None))
+    if not matching_zone_name:
+        for network_interface in resource.get('networkInterfaces', []):
+            matching_zone_name = find_matching_zone_name(
+                network_interface.get('subnetwork', None))
+            if matching_zone_name:
+                break
+    if not matching_zone_name:
+        matching_zone_name = find_matching_zone_name(
+            resource.get('name', None))
+    if not matching_zone_name:
+        matching_zone_name = find_matching_zone_name(
+            resource.get('selfLink', None))
+    return matching_zone_name
+
+
+def main():
+    mapping = make_mapping()
+    resources = make_resources()
+
+    start = time.time()
+    expected = [search_resource_zone(mapping, resource)
+                for resource in resources]
+    search_seconds = time.time() - start
+
+    start = time.time()
+    router = zone_router.ZoneRouter.for_mapping(mapping)
+    routed = [router.find_resource_zone(resource) for resource in resources]
+    router_seconds = time.time() - start
+
+    assert routed == expected
+    print('{} resources, {} expressions'.format(len(resources), len(mapping)))
+    print('re.search per expression: {:.2f}s'.format(search_seconds))
+    print('ZoneRouter:               {:.2f}s'.format(router_seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#            http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+import unittest
+
+from mock import patch
+
+from dns_sync import dns_changes
+
+
+def a_record(name, ip_address):
+    return {'name': name, 'type': 'A', 'ttl': 300, 'rrdatas': [ip_address]}
+
+
+class TestChangeCoalescer(unittest.TestCase):
+    """Test merging the changes submitted to a zone."""
+
+    @patch.object(dns_changes.ChangeCoalescer, 'WINDOW_SECONDS', 0)
+    def test_conflicting_changes_are_submitted_in_order(self):
+        """A change waits for the batch changing the same records."""
+        submitted = []
+        first_submitting = threading.Event()
+        release_first = threading.Event()
+
+        def submit_change(change, zone_name):
+            submitted.append(change)
+            if len(submitted) == 1:
+                first_submitting.set()
+                release_first.wait()
+            return {'id': str(len(submitted)), 'status': 'pending'}
+
+        coalescer = dns_changes.ChangeCoalescer(submit_change)
+        create = {'additions': [a_record('web.example.com.', '10.0.0.1')]}
+        delete = {'deletions': [a_record('web.example.com.', '10.0.0.1')]}
+        results = {}
+
+        def submit(name, change):
+            results[name] = coalescer.submit(change, 'zone-1')
+
+        create_thread = threading.Thread(target=submit,
+                                         args=('create', create))
+        delete_thread = threading.Thread(target=submit,
+                                         args=('delete', delete))
+        create_thread.daemon = delete_thread.daemon = True
+        create_thread.start()
+        try:
+            self.assertTrue(first_submitting.wait(5))
+            # The create batch is closed and being submitted.
+            delete_thread.start()
+            time.sleep(0.1)
+            self.assertEqual(1, len(submitted))
+        finally:
+            release_first.set()
+        create_thread.join(5)
+        delete_thread.join(5)
+        self.assertEqual([
+            {'additions': create['additions'], 'deletions': []},
+            {'additions': [], 'deletions': delete['deletions']}
+        ], submitted)
+        self.assertEqual('1', results['create']['id'])
+        self.assertEqual('2', results['delete']['id'])
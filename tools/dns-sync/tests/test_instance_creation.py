@@ -46,8 +46,7 @@ class TestHandlers(unittest.TestCase):
             'tests/data/instance-creation-instance-get.json',
             'tests/data/dns.v1.json', 'tests/data/dns-zone-response.json',
             'tests/data/instance-creation-dns-pending-operation.json',
-            'tests/data/instance-creation-dns-done-operation.json',
-            'tests/data/instance-creation-dns-record-set-response.json'
+            'tests/data/instance-creation-dns-record-set-batch-response.txt'
         ])
 
         data = base64.encodestring(data_files[
@@ -80,26 +79,24 @@ class TestHandlers(unittest.TestCase):
         api.Clients.compute.http = compute_mock_http
         api.Clients.compute.cache_discovery = False
 
+        batch_success = {
+            'status': '200',
+            'content-type': 'multipart/mixed; boundary="batch_dns_sync"'
+        }
+
         dns_mock_http = common.LoggingHttpMockSequence([
             (success, '{"access_token":"token","expires_in":3600}'),
             (success, data_files['dns.v1.json']),
             (success, data_files['dns-zone-response.json']),
-            # instance-1.internal.project-1.mydnsdomain.com
-            (success,
-             data_files['instance-creation-dns-record-set-response.json']),
-            # instance-1.project-1.mydnsdomain.com
-            (success,
-             data_files['instance-creation-dns-record-set-response.json']),
-            # nic0.instance-1.internal.project-1.mydnsdomain.com
-            (success,
-             data_files['instance-creation-dns-record-set-response.json']),
+            # Lookup of instance-1.internal.project-1.mydnsdomain.com,
+            # instance-1.project-1.mydnsdomain.com,
+            # nic0.instance-1.internal.project-1.mydnsdomain.com and
             # nic0.instance-1.project-1.mydnsdomain.com
-            (success,
-             data_files['instance-creation-dns-record-set-response.json']),
-            # make change
+            (batch_success, data_files[
+                'instance-creation-dns-record-set-batch-response.txt']),
+            # make change, which is not waited for.
             (success,
              data_files['instance-creation-dns-pending-operation.json']),
-            (success, data_files['instance-creation-dns-done-operation.json']),
         ])
 
         mock_datastore = mock.Mock(spec=client.Client)
@@ -115,3 +112,5 @@ class TestHandlers(unittest.TestCase):
 
         response = request.get_response(dns_sync_app)
         self.assertEquals(response.status_int, 200)
+        # The change is saved to check its completion later.
+        self.assertEquals(2, mock_datastore.put.call_count)
@@ -33,6 +33,8 @@ class TestHandlers(unittest.TestCase):
     def setUp(self):
         logging.basicConfig(level=logging.DEBUG)
 
+    # The mock http responses are in order, so list one project at a time.
+    @mock.patch.object(main.SyncProjectsWithDns, 'MAX_CONCURRENT_PROJECTS', 1)
     def test_project_sync(self):
         """Sync two projects."""
 
@@ -81,6 +83,7 @@ class TestHandlers(unittest.TestCase):
         mock_datastore.project = 'project-1'
         entity = mock.MagicMock(spec=datastore.Entity)
         mock_datastore.get.return_value = entity
+        mock_datastore.get_multi.return_value = []
 
         api.Clients.dns.http = dns_mock_http
         api.Clients.dns.cache_discovery = False
@@ -92,3 +95,4 @@ class TestHandlers(unittest.TestCase):
         # Get a response for that request.
         response = request.get_response(dns_sync_app)
         self.assertEquals(response.status_int, 200)
+        mock_datastore.put_multi.assert_called_once()
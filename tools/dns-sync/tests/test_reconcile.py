@@ -0,0 +1,74 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#            http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+from dns_sync import reconcile
+
+
+def a_record(name, ip_address):
+    return {'name': name, 'type': 'A', 'ttl': 300, 'rrdatas': [ip_address]}
+
+
+class TestReconcile(unittest.TestCase):
+    """Test reconciling zone records."""
+
+    def test_reconcile(self):
+        """Keep matching records, replace changed ones, delete stale ones."""
+        reconciler = reconcile.ZoneReconciler([
+            a_record('kept.project-1.example.com.', '10.0.0.1'),
+            a_record('changed.project-1.example.com.', '10.0.0.2'),
+            a_record('new.project-1.example.com.', '10.0.0.3')
+        ])
+        existing_records = [
+            a_record('kept.project-1.example.com.', '10.0.0.1'),
+            a_record('changed.project-1.example.com.', '10.0.0.9'),
+            a_record('stale.project-1.example.com.', '10.0.0.4'),
+            a_record('other.project-2.example.com.', '10.0.0.5')
+        ]
+
+        additions, deletions = reconciler.reconcile(
+            existing_records, lambda record: 'project-1' in record['name'])
+
+        self.assertEqual([
+            a_record('changed.project-1.example.com.', '10.0.0.2'),
+            a_record('new.project-1.example.com.', '10.0.0.3')
+        ], additions)
+        self.assertEqual([
+            a_record('changed.project-1.example.com.', '10.0.0.9'),
+            a_record('stale.project-1.example.com.', '10.0.0.4')
+        ], deletions)
+
+    def test_chunk_changes(self):
+        """Replacements are kept in the same change set."""
+        additions = [a_record('new-{}.'.format(i), '10.0.0.1')
+                     for i in range(3)]
+        additions.append(a_record('changed.', '10.0.0.2'))
+        deletions = [a_record('changed.', '10.0.0.9'),
+                     a_record('stale.', '10.0.0.4')]
+
+        changes = list(reconcile.chunk_changes(additions, deletions, 2))
+
+        self.assertEqual([{
+            'additions': [a_record('changed.', '10.0.0.2')],
+            'deletions': [a_record('changed.', '10.0.0.9'),
+                          a_record('stale.', '10.0.0.4')]
+        }, {
+            'additions': [a_record('new-0.', '10.0.0.1'),
+                          a_record('new-1.', '10.0.0.1')],
+            'deletions': []
+        }, {
+            'additions': [a_record('new-2.', '10.0.0.1')],
+            'deletions': []
+        }], changes)
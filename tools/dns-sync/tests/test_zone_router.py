@@ -0,0 +1,80 @@
+# Copyright 2017 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#            http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+import unittest
+
+from dns_sync import zone_router
+
+MAPPING = [
+    [r'subnetworks/prod-', 'prod-zone'],
+    [r'^web-\d+$', 'web-zone'],
+    [r'db', 'db-zone'],
+    [r'^a', 'a-zone'],
+]
+
+SUBNETWORK = ('https://www.googleapis.com/compute/v1/projects/project-1/'
+              'regions/us-central1/subnetworks/{}')
+
+
+def search_zone(mapping, value):
+    """Find the zone by searching with each expression in turn."""
+    for expression, zone in mapping:
+        if re.search(expression, value):
+            return zone
+    return None
+
+
+class TestZoneRouter(unittest.TestCase):
+    """Test routing resources to zones."""
+
+    def tearDown(self):
+        zone_router.ZoneRouter.clear_routers()
+
+    def test_find_zone_in_mapping_order(self):
+        """The first expression in the mapping wins, not the first match."""
+        router = zone_router.ZoneRouter.for_mapping(MAPPING)
+        for value in ['web-12', 'web-12x', 'adb', 'ad', 'da', 'db-web-1',
+                      SUBNETWORK.format('prod-a'), SUBNETWORK.format('dev')]:
+            self.assertEqual(search_zone(MAPPING, value),
+                             router.find_zone(value), value)
+
+    def test_find_resource_zone(self):
+        """Subnetworks are used before the name, and remembered."""
+        router = zone_router.ZoneRouter.for_mapping(MAPPING)
+        instance = {
+            'name': 'db-1',
+            'networkInterfaces': [
+                {'subnetwork': SUBNETWORK.format('dev')},
+                {'subnetwork': SUBNETWORK.format('prod-b')},
+            ]
+        }
+        self.assertEqual('prod-zone', router.find_resource_zone(instance))
+        self.assertEqual('db-zone', router.find_resource_zone(
+            {'name': 'db-1', 'subnetwork': SUBNETWORK.format('dev')}))
+        self.assertEqual({
+            SUBNETWORK.format('dev'): None,
+            SUBNETWORK.format('prod-b'): 'prod-zone'
+        }, router._subnetwork_zones)
+
+    def test_for_mapping(self):
+        """A router is shared by a mapping and rebuilt when it changes."""
+        router = zone_router.ZoneRouter.for_mapping(MAPPING)
+        self.assertIs(router, zone_router.ZoneRouter.for_mapping(
+            [list(pair) for pair in MAPPING]))
+        new_router = zone_router.ZoneRouter.for_mapping(MAPPING[1:])
+        self.assertIsNot(router, new_router)
+        self.assertEqual('a-zone', new_router.find_zone('ab'))
+        self.assertIsNone(
+            zone_router.ZoneRouter.for_mapping(None).find_zone('db'))
@@ -16,8 +16,10 @@
 from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
+from concurrent import futures
 import datetime
 import json
+import threading
 from time import sleep
 from retrying import retry
 from yaspin import yaspin
@@ -30,10 +32,23 @@ from google.cloud.storage import iam
 from googleapiclient import discovery
 
 from gcs_bucket_mover import bucket_details
+from gcs_bucket_mover import object_mover
 from gcs_bucket_mover import sts_job_status
 
 _CHECKMARK = u'\u2713'.encode('utf8')
 
+# Project numbers, STS account emails and KMS key/topic IAM grants are looked up or applied once
+# per run and shared by all of the buckets of a batch move. The lock also keeps the IAM policy
+# read-modify-writes of different buckets from overwriting each other.
+_shared_lookups = {}
+_shared_lookups_lock = threading.RLock()
+
+# The googleapiclient STS client is not thread-safe, so only one bucket uses it at a time
+_sts_client_lock = threading.Lock()
+
+# Name of the bucket moved by the current thread during a batch move
+_batch_context = threading.local()
+
 
 def main(config, parsed_args, cloud_logger):
     """Main entry point for the bucket mover tool
@@ -45,6 +60,98 @@ def main(config, parsed_args, cloud_logger):
     """
 
     cloud_logger.log_text("Starting GCS Bucket Mover")
+
+    sts_client = discovery.build(
+        'storagetransfer', 'v1', credentials=config.target_project_credentials)
+
+    _run_bucket_move(config, parsed_args, cloud_logger, sts_client)
+
+    cloud_logger.log_text('Completed GCS Bucket Mover')
+
+
+def move_buckets(config, parsed_args, cloud_logger, bucket_names,
+                 max_parallel_moves):
+    """Entry point for moving several buckets between the same projects in one run
+
+    Up to max_parallel_moves buckets are moved at the same time, each by the same steps as a single
+    bucket move. The credentials, storage clients and STS client are shared by all of the buckets.
+
+    Args:
+        config: A Configuration object with all of the config values needed for the script to run
+        parsed_args: the configargparser parsing of command line options
+        cloud_logger: A GCP logging client instance
+        bucket_names: The names of the buckets to move
+        max_parallel_moves: The maximum number of buckets moved at the same time
+
+    Raises:
+        SystemExit: If any of the buckets failed to move
+    """
+
+    cloud_logger.log_text('Starting GCS Bucket Mover for {} buckets'.format(
+        len(bucket_names)))
+
+    sts_client = discovery.build(
+        'storagetransfer', 'v1', credentials=config.target_project_credentials)
+
+    failed_buckets = []
+    executor = futures.ThreadPoolExecutor(max_workers=max_parallel_moves)
+    try:
+        pending = dict(
+            (executor.submit(_run_batch_bucket_move, config.for_bucket(name),
+                             parsed_args, cloud_logger, sts_client), name)
+            for name in bucket_names)
+        for future in futures.as_completed(pending):
+            bucket_name = pending[future]
+            if future.exception() is not None:
+                _print_and_log(
+                    cloud_logger, 'Failed to move bucket {}: {}'.format(
+                        bucket_name, future.exception()))
+                failed_buckets.append(bucket_name)
+            else:
+                _print_and_log(cloud_logger,
+                               'Moved bucket {}'.format(bucket_name))
+    finally:
+        executor.shutdown()
+
+    _print_and_log(
+        cloud_logger, 'Moved {} of {} buckets'.format(
+            len(bucket_names) - len(failed_buckets), len(bucket_names)))
+    if failed_buckets:
+        msg = 'Failed to move buckets: {}'.format(', '.join(
+            sorted(failed_buckets)))
+        cloud_logger.log_text(msg)
+        raise SystemExit(msg)
+
+    cloud_logger.log_text('Completed GCS Bucket Mover')
+
+
+def _run_batch_bucket_move(config, parsed_args, cloud_logger, sts_client):
+    """Move one bucket of a batch, with its console output prefixed by the bucket name
+
+    Args:
+        config: A Configuration object for the bucket to move
+        parsed_args: the configargparser parsing of command line options
+        cloud_logger: A GCP logging client instance
+        sts_client: The STS client object to be used
+    """
+
+    _batch_context.bucket_name = config.bucket_name
+    try:
+        _run_bucket_move(config, parsed_args, cloud_logger, sts_client)
+    finally:
+        _batch_context.bucket_name = None
+
+
+def _run_bucket_move(config, parsed_args, cloud_logger, sts_client):
+    """Move or rename a single bucket
+
+    Args:
+        config: A Configuration object with all of the config values needed for the script to run
+        parsed_args: the configargparser parsing of command line options
+        cloud_logger: A GCP logging client instance
+        sts_client: The STS client object to be used
+    """
+
     _print_config_details(cloud_logger, config)
 
     source_bucket = config.source_storage_client.lookup_bucket(  # pylint: disable=no-member
@@ -58,9 +165,6 @@ def main(config, parsed_args, cloud_logger):
     _check_bucket_lock(cloud_logger, config, source_bucket,
                        source_bucket_details)
 
-    sts_client = discovery.build(
-        'storagetransfer', 'v1', credentials=config.target_project_credentials)
-
     if config.is_rename:
         _rename_bucket(cloud_logger, config, source_bucket,
                        source_bucket_details, sts_client)
@@ -68,8 +172,6 @@ def main(config, parsed_args, cloud_logger):
         _move_bucket(cloud_logger, config, source_bucket, source_bucket_details,
                      sts_client)
 
-    cloud_logger.log_text('Completed GCS Bucket Mover')
-
 
 def _rename_bucket(cloud_logger, config, source_bucket, source_bucket_details,
                    sts_client):
@@ -88,9 +190,8 @@ def _rename_bucket(cloud_logger, config, source_bucket, source_bucket_details,
         cloud_logger, config, source_bucket_details, config.target_bucket_name)
     sts_account_email = _assign_sts_permissions(cloud_logger, sts_client,
                                                 config, target_bucket)
-    _run_and_wait_for_sts_job(sts_client, config.target_project,
-                              config.bucket_name, config.target_bucket_name,
-                              cloud_logger)
+    _run_transfer(sts_client, config, config.bucket_name,
+                  config.target_bucket_name, cloud_logger)
 
     _delete_empty_source_bucket(cloud_logger, source_bucket)
     _remove_sts_permissions(cloud_logger, sts_account_email, config,
@@ -115,17 +216,15 @@ def _move_bucket(cloud_logger, config, source_bucket, source_bucket_details,
         cloud_logger, config, source_bucket_details, config.temp_bucket_name)
     sts_account_email = _assign_sts_permissions(cloud_logger, sts_client,
                                                 config, target_temp_bucket)
-    _run_and_wait_for_sts_job(sts_client, config.target_project,
-                              config.bucket_name, config.temp_bucket_name,
-                              cloud_logger)
+    _run_transfer(sts_client, config, config.bucket_name,
+                  config.temp_bucket_name, cloud_logger)
 
     _delete_empty_source_bucket(cloud_logger, source_bucket)
     _recreate_source_bucket(cloud_logger, config, source_bucket_details)
     _assign_sts_permissions_to_new_bucket(cloud_logger, sts_account_email,
                                           config)
-    _run_and_wait_for_sts_job(sts_client, config.target_project,
-                              config.temp_bucket_name, config.bucket_name,
-                              cloud_logger)
+    _run_transfer(sts_client, config, config.temp_bucket_name,
+                  config.bucket_name, cloud_logger)
 
     _delete_empty_temp_bucket(cloud_logger, target_temp_bucket)
     _remove_sts_permissions(cloud_logger, sts_account_email, config,
@@ -167,7 +266,7 @@ def _check_bucket_lock(cloud_logger, config, bucket, source_bucket_details):
             config.lock_file_name)
         cloud_logger.log_text(spinner_text)
 
-        with yaspin(text=spinner_text) as spinner:
+        with _spinner(text=spinner_text) as spinner:
             _write_spinner_and_log(
                 spinner, cloud_logger,
                 'Logging source bucket IAM and ACLs to Stackdriver')
@@ -234,7 +333,7 @@ def _create_target_bucket(cloud_logger, config, source_bucket_details,
         spinner_text = 'Creating temp target bucket'
 
     cloud_logger.log_text(spinner_text)
-    with yaspin(text=spinner_text) as spinner:
+    with _spinner(text=spinner_text) as spinner:
         target_bucket = _create_bucket(spinner, cloud_logger, config,
                                        bucket_name, source_bucket_details)
         _write_spinner_and_log(
@@ -260,9 +359,13 @@ def _assign_sts_permissions(cloud_logger, sts_client, config,
 
     spinner_text = 'Assigning STS permissions to source/temp buckets'
     cloud_logger.log_text(spinner_text)
-    with yaspin(text=spinner_text) as spinner:
-        sts_account_email = _get_sts_iam_account_email(sts_client,
-                                                       config.target_project)
+    with _spinner(text=spinner_text) as spinner:
+        if config.transfer_engine == 'parallel':
+            # The objects are moved by the target project service account instead of STS
+            sts_account_email = config.target_project_credentials.service_account_email  # pylint: disable=no-member
+        else:
+            sts_account_email = _get_sts_iam_account_email(
+                sts_client, config.target_project)
         _write_spinner_and_log(
             spinner, cloud_logger,
             'STS service account for IAM usage: {}'.format(sts_account_email))
@@ -287,7 +390,7 @@ def _assign_sts_permissions_to_new_bucket(cloud_logger, sts_account_email,
 
     spinner_text = 'Assigning STS permissions to new source bucket'
     cloud_logger.log_text(spinner_text)
-    with yaspin(text=spinner_text) as spinner:
+    with _spinner(text=spinner_text) as spinner:
         _assign_sts_iam_roles(sts_account_email, config.target_storage_client,
                               config.target_project, config.bucket_name, False)
         spinner.ok(_CHECKMARK)
@@ -303,7 +406,7 @@ def _delete_empty_source_bucket(cloud_logger, source_bucket):
 
     spinner_text = 'Deleting empty source bucket'
     cloud_logger.log_text(spinner_text)
-    with yaspin(text=spinner_text) as spinner:
+    with _spinner(text=spinner_text) as spinner:
         source_bucket.delete()
         spinner.ok(_CHECKMARK)
 
@@ -319,7 +422,7 @@ def _recreate_source_bucket(cloud_logger, config, source_bucket_details):
 
     spinner_text = 'Re-creating source bucket in target project'
     cloud_logger.log_text(spinner_text)
-    with yaspin(text=spinner_text) as spinner:
+    with _spinner(text=spinner_text) as spinner:
         _create_bucket(spinner, cloud_logger, config, config.bucket_name,
                        source_bucket_details)
         spinner.ok(_CHECKMARK)
@@ -335,7 +438,7 @@ def _delete_empty_temp_bucket(cloud_logger, target_temp_bucket):
 
     spinner_text = 'Deleting empty temp bucket'
     cloud_logger.log_text(spinner_text)
-    with yaspin(text=spinner_text) as spinner:
+    with _spinner(text=spinner_text) as spinner:
         target_temp_bucket.delete()
         spinner.ok(_CHECKMARK)
 
@@ -353,7 +456,7 @@ def _remove_sts_permissions(cloud_logger, sts_account_email, config,
 
     spinner_text = 'Removing STS permissions from bucket {}'.format(bucket_name)
     cloud_logger.log_text(spinner_text)
-    with yaspin(text=spinner_text) as spinner:
+    with _spinner(text=spinner_text) as spinner:
         _remove_sts_iam_roles(sts_account_email, config.target_storage_client,
                               bucket_name)
         spinner.ok(_CHECKMARK)
@@ -370,9 +473,15 @@ def _get_project_number(project_id, credentials):
         The project number as a string
     """
 
-    crm = discovery.build('cloudresourcemanager', 'v1', credentials=credentials)
-    project = crm.projects().get(projectId=project_id).execute(num_retries=5)  # pylint: disable=no-member
-    return project['projectNumber']
+    key = ('project_number', project_id)
+    with _shared_lookups_lock:
+        if key not in _shared_lookups:
+            crm = discovery.build(
+                'cloudresourcemanager', 'v1', credentials=credentials)
+            project = crm.projects().get(projectId=project_id).execute(
+                num_retries=5)  # pylint: disable=no-member
+            _shared_lookups[key] = project['projectNumber']
+        return _shared_lookups[key]
 
 
 def _create_bucket(spinner, cloud_logger, config, bucket_name,
@@ -599,9 +708,14 @@ def _get_sts_iam_account_email(sts_client, project_id):
         The STS service account email as a string
     """
 
-    result = sts_client.googleServiceAccounts().get(
-        projectId=project_id).execute(num_retries=5)
-    return result['accountEmail']
+    key = ('sts_account_email', project_id)
+    with _shared_lookups_lock:
+        if key not in _shared_lookups:
+            with _sts_client_lock:
+                result = sts_client.googleServiceAccounts().get(
+                    projectId=project_id).execute(num_retries=5)
+            _shared_lookups[key] = result['accountEmail']
+        return _shared_lookups[key]
 
 
 def _assign_sts_iam_roles(sts_email, storage_client, project_name, bucket_name,
@@ -653,6 +767,25 @@ def _add_target_project_to_kms_key(spinner, cloud_logger, config, kms_key_name):
         kms_key_name: The name of the KMS key that the project should be given access to
     """
 
+    key = ('kms_key', config.target_project, kms_key_name)
+    with _shared_lookups_lock:
+        if key not in _shared_lookups:
+            _grant_kms_key_to_target_project(spinner, cloud_logger, config,
+                                             kms_key_name)
+            _shared_lookups[key] = True
+
+
+def _grant_kms_key_to_target_project(spinner, cloud_logger, config,
+                                     kms_key_name):
+    """Adds the target project GCS service account to the IAM policy of the KMS key.
+
+    Args:
+        spinner: The spinner displayed in the console
+        cloud_logger: A GCP logging client instance
+        config: A Configuration object with all of the config values needed for the script to run
+        kms_key_name: The name of the KMS key that the project should be given access to
+    """
+
     kms_client = discovery.build(
         'cloudkms', 'v1', credentials=config.source_project_credentials)
 
@@ -694,6 +827,26 @@ def _assign_target_project_to_topic(spinner, cloud_logger, config, topic_name,
         topic_project: The name of the project that the topic belongs to
     """
 
+    key = ('topic', config.target_project, topic_project, topic_name)
+    with _shared_lookups_lock:
+        if key not in _shared_lookups:
+            _grant_topic_to_target_project(spinner, cloud_logger, config,
+                                           topic_name, topic_project)
+            _shared_lookups[key] = True
+
+
+def _grant_topic_to_target_project(spinner, cloud_logger, config, topic_name,
+                                   topic_project):
+    """Adds the target project GCS service account to the IAM policy of the topic.
+
+    Args:
+        spinner: The spinner displayed in the console
+        cloud_logger: A GCP logging client instance
+        config: A Configuration object with all of the config values needed for the script to run
+        topic_name: The name of the topic that the target project should be assigned to
+        topic_project: The name of the project that the topic belongs to
+    """
+
     client = pubsub.PublisherClient(
         credentials=config.source_project_credentials)
     topic_path = client.topic_path(topic_project, topic_name)  # pylint: disable=no-member
@@ -711,6 +864,99 @@ def _assign_target_project_to_topic(spinner, cloud_logger, config, topic_name,
             _CHECKMARK, service_account_email, topic_name))
 
 
+def _run_transfer(sts_client, config, source_bucket_name, sink_bucket_name,
+                  cloud_logger):
+    """Move all of the objects between the buckets with the configured transfer engine.
+
+    Args:
+        sts_client: The STS client object to be used
+        config: A Configuration object with all of the config values needed for the script to run
+        source_bucket_name: The name of the bucket to move the objects from
+        sink_bucket_name: The name of the bucket to move the objects to
+        cloud_logger: A GCP logging client instance
+    """
+
+    if config.transfer_engine == 'parallel':
+        _run_and_wait_for_object_move(config, source_bucket_name,
+                                      sink_bucket_name, cloud_logger)
+    else:
+        _run_and_wait_for_sts_job(sts_client, config.target_project,
+                                  source_bucket_name, sink_bucket_name,
+                                  cloud_logger)
+
+
+@retry(
+    retry_on_result=_retry_if_false,
+    wait_exponential_multiplier=10000,
+    wait_exponential_max=120000,
+    stop_max_attempt_number=10)
+def _run_and_wait_for_object_move(config, source_bucket_name, sink_bucket_name,
+                                  cloud_logger):
+    """Move the objects in-process with a pool of workers. Retry if any object fails.
+
+    Each retry resumes from the local manifest of the objects that were already copied.
+
+    Args:
+        config: A Configuration object with all of the config values needed for the script to run
+        source_bucket_name: The name of the bucket to move the objects from
+        sink_bucket_name: The name of the bucket to move the objects to
+        cloud_logger: A GCP logging client instance
+
+    Returns:
+        True if all of the objects were moved, False if any of them failed
+    """
+
+    msg = 'Moving from bucket {} to {}'.format(source_bucket_name,
+                                               sink_bucket_name)
+    _print_and_log(cloud_logger, msg)
+
+    spinner_text = 'Moving objects with {} workers'.format(
+        config.transfer_workers)
+    cloud_logger.log_text(spinner_text)
+    with _spinner(text=spinner_text) as spinner:
+        mover = object_mover.ObjectMover(
+            object_mover.GcsObjectStore(config.target_project_credentials,
+                                        config.target_project),
+            workers=config.transfer_workers,
+            manifest_dir=config.transfer_manifest_dir)
+        counters = mover.move(source_bucket_name, sink_bucket_name)
+        if counters['failedObjects']:
+            spinner.fail('X')
+        else:
+            spinner.ok(_CHECKMARK)
+        _print_object_move_counters(spinner, cloud_logger, counters)
+
+    if not counters['failedObjects']:
+        print()
+        return True
+
+    _print_and_log(
+        cloud_logger,
+        'Waiting for a period of time and then trying again. If you choose to'
+        ' cancel this script, the buckets will need to be manually cleaned up.')
+    return False
+
+
+def _print_object_move_counters(spinner, cloud_logger, counters):
+    """Print out the counters of an in-process object move.
+
+    Args:
+        spinner: The spinner displayed in the console
+        cloud_logger: A GCP logging client instance
+        counters: The counters returned by ObjectMover.move
+    """
+
+    if counters['failedObjects']:
+        new_text = 'Error! Failed to move {} of {} objects, including: {}'.format(
+            len(counters['failedObjects']), counters['objectsFoundFromSource'],
+            ', '.join(counters['failedObjects'][:10]))
+    else:
+        new_text = 'Success! Copied {} bytes in {} objects and deleted {} objects'.format(
+            counters['bytesCopiedToSink'], counters['objectsCopiedToSink'],
+            counters['objectsDeletedFromSource'])
+    _write_spinner_and_log(spinner, cloud_logger, new_text)
+
+
 @retry(
     retry_on_result=_retry_if_false,
     wait_exponential_multiplier=10000,
@@ -737,13 +983,13 @@ def _run_and_wait_for_sts_job(sts_client, target_project, source_bucket_name,
 
     spinner_text = 'Creating STS job'
     cloud_logger.log_text(spinner_text)
-    with yaspin(text=spinner_text) as spinner:
+    with _spinner(text=spinner_text) as spinner:
         sts_job_name = _execute_sts_job(sts_client, target_project,
                                         source_bucket_name, sink_bucket_name)
         spinner.ok(_CHECKMARK)
 
     # Check every 10 seconds until STS job is complete
-    with yaspin(text='Checking STS job status') as spinner:
+    with _spinner(text='Checking STS job status') as spinner:
         while True:
             job_status = _check_sts_job(spinner, cloud_logger, sts_client,
                                         target_project, sts_job_name)
@@ -812,8 +1058,9 @@ def _execute_sts_job(sts_client, target_project, source_bucket_name,
             }
         }
     }
-    result = sts_client.transferJobs().create(body=transfer_job).execute(
-        num_retries=5)
+    with _sts_client_lock:
+        result = sts_client.transferJobs().create(body=transfer_job).execute(
+            num_retries=5)
     return result['name']
 
 
@@ -835,8 +1082,10 @@ def _check_sts_job(spinner, cloud_logger, sts_client, target_project, job_name):
         '{{"project_id": "{project_id}", "job_names": ["{job_name}"]}}').format(
             project_id=target_project, job_name=job_name)
 
-    result = sts_client.transferOperations().list(
-        name='transferOperations', filter=filter_string).execute(num_retries=5)
+    with _sts_client_lock:
+        result = sts_client.transferOperations().list(
+            name='transferOperations',
+            filter=filter_string).execute(num_retries=5)
 
     if result:
         operation = result['operations'][0]
@@ -916,6 +1165,50 @@ def _print_sts_counters(spinner, cloud_logger, counters, is_job_done):
                 cloud_logger.log_text(new_text)
 
 
+def _spinner(text):
+    """Create the spinner displayed in the console.
+
+    During a batch move, several buckets are moved at the same time, so every message is printed on
+    a line of its own prefixed with the bucket name instead.
+
+    Args:
+        text: The initial text of the spinner
+
+    Returns:
+        A spinner to be used as a context manager
+    """
+    bucket_name = getattr(_batch_context, 'bucket_name', None)
+    if bucket_name:
+        return _BucketSpinner(bucket_name, text)
+    return yaspin(text=text)
+
+
+class _BucketSpinner(object):
+    """Line based stand-in for the yaspin spinner of a bucket in a batch move."""
+
+    def __init__(self, bucket_name, text):
+        self.bucket_name = bucket_name
+        self.text = text
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def write(self, text):
+        """Print a line prefixed with the bucket name"""
+        print('[{}] {}'.format(self.bucket_name, text))
+
+    def ok(self, text):
+        """Print the final text of a successful step"""
+        self.write('{} {}'.format(text, self.text))
+
+    def fail(self, text):
+        """Print the final text of a failed step"""
+        self.write('{} {}'.format(text, self.text))
+
+
 def _print_and_log(cloud_logger, message):
     """Print the message and log it to the cloud.
 
@@ -923,6 +1216,9 @@ def _print_and_log(cloud_logger, message):
         cloud_logger: A GCP logging client instance
         message: The message to log
     """
+    bucket_name = getattr(_batch_context, 'bucket_name', None)
+    if bucket_name:
+        message = '[{}] {}'.format(bucket_name, message)
     print(message)
     cloud_logger.log_text(message)
 
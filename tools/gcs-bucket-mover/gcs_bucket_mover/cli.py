@@ -41,14 +41,20 @@ def _get_parsed_args():
         'Moves a GCS bucket from one project to another, along with all objects and optionally'
         ' copying all other bucket settings.',
         config_file_parser_class=configargparse.YAMLConfigFileParser,
-        formatter_class=configargparse.RawTextHelpFormatter)
+        formatter_class=configargparse.RawTextHelpFormatter,
+        fromfile_prefix_chars='@')
     parser.add_argument(
         '--config',
         is_config_file=True,
         help='The path to the local config file')
 
     parser.add_argument(
-        'bucket_name', help='The name of the bucket to be moved.')
+        'bucket_name',
+        nargs='+',
+        help=textwrap.dedent('''\
+        The name of the bucket to be moved. Several bucket names can be given to move them all
+        between the same projects in one run, or @file to read the names from a file with one
+        name per line.'''))
     parser.add_argument(
         'source_project',
         help='The project id that the bucket is currently in.')
@@ -90,6 +96,30 @@ def _get_parsed_args():
     parser.add_argument(
         '--temp_bucket_name',
         help='The temporary bucket name to use in the target project.')
+    parser.add_argument(
+        '--transfer_engine',
+        choices=['sts', 'parallel'],
+        default='sts',
+        help=textwrap.dedent('''\
+        How to move the objects between buckets. 'sts' runs Storage Transfer Service jobs.
+        'parallel' copies the objects with server-side rewrites from a pool of workers in this
+        process, which avoids the STS scheduling overhead for small and medium buckets.'''))
+    parser.add_argument(
+        '--transfer_workers',
+        type=int,
+        default=16,
+        help='The number of workers moving objects with the parallel transfer engine.')
+    parser.add_argument(
+        '--transfer_manifest_dir',
+        default='.',
+        help=textwrap.dedent('''\
+        The local directory where the parallel transfer engine checkpoints the copied objects,
+        so that an interrupted move can be resumed.'''))
+    parser.add_argument(
+        '--max_parallel_moves',
+        type=int,
+        default=4,
+        help='The maximum number of buckets moved at the same time when several are given.')
     parser.add_argument(
         '--location',
         help='Specify a different location for the target bucket.')
@@ -197,9 +227,18 @@ def _parse_yaml_file(path):
 
 
 def main():
-    """Get passed in args and run either a test run or an actual move"""
+    """Get passed in args and run either a test run, a move or a batch move"""
     parsed_args = _get_parsed_args()
 
+    bucket_names = parsed_args.bucket_name
+    if len(bucket_names) > 1:
+        for option in ['rename_bucket_to', 'temp_bucket_name', 'test']:
+            if getattr(parsed_args, option):
+                raise SystemExit(
+                    '--{} can only be used when moving a single bucket'.format(
+                        option))
+    parsed_args.bucket_name = bucket_names[0]
+
     # Load the config values set in the config file and create the storage clients.
     config = configuration.Configuration.from_conf(parsed_args)
 
@@ -212,4 +251,9 @@ def main():
         config.bucket_name = test_bucket_name
         config.target_bucket_name = test_bucket_name
 
-    bucket_mover_service.main(config, parsed_args, cloud_logger)
+    if len(bucket_names) > 1:
+        bucket_mover_service.move_buckets(config, parsed_args, cloud_logger,
+                                          bucket_names,
+                                          parsed_args.max_parallel_moves)
+    else:
+        bucket_mover_service.main(config, parsed_args, cloud_logger)
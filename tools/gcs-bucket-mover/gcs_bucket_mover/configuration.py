@@ -19,7 +19,7 @@ from __future__ import print_function
 
 import os
 
-from attr import attrs, attrib
+from attr import attrs, attrib, evolve
 
 from google.auth import environment_vars
 from google.cloud import logging
@@ -43,6 +43,9 @@ class Configuration(object):
     disable_bucket_lock = attrib()
     lock_file_name = attrib()
     is_rename = attrib()
+    transfer_engine = attrib()
+    transfer_workers = attrib()
+    transfer_manifest_dir = attrib()
 
     @classmethod
     def from_conf(cls, conf):
@@ -99,4 +102,24 @@ class Configuration(object):
             temp_bucket_name=temp_bucket_name,
             is_rename=is_rename,
             disable_bucket_lock=conf.disable_bucket_lock,
-            lock_file_name=conf.lock_file_name)
+            lock_file_name=conf.lock_file_name,
+            transfer_engine=conf.transfer_engine,
+            transfer_workers=conf.transfer_workers,
+            transfer_manifest_dir=conf.transfer_manifest_dir)
+
+    def for_bucket(self, bucket_name):
+        """Copy the configuration for moving another bucket between the same projects.
+
+        The credentials and clients are shared with this configuration. The bucket keeps its name
+        in the target project and uses the default temporary bucket name.
+
+        Args:
+            bucket_name: The name of the bucket to move
+        """
+
+        return evolve(
+            self,
+            bucket_name=bucket_name,
+            target_bucket_name=bucket_name,
+            temp_bucket_name=bucket_name + '-temp',
+            is_rename=False)
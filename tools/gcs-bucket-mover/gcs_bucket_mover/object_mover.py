@@ -0,0 +1,347 @@
+# Copyright 2018 Google LLC. All rights reserved. Licensed under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied. See the License for the specific language governing permissions and limitations under
+# the License.
+#
+# Any software provided by Google hereunder is distributed "AS IS", WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, and is not intended for production use.
+"""In-process alternative to STS that moves the objects of a bucket with a pool of workers."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from collections import namedtuple
+from concurrent import futures
+import errno
+import json
+import os
+import shutil
+import threading
+
+from retrying import retry
+
+from google.cloud import exceptions
+from google.cloud import storage
+
+# A single object in a bucket, as returned by an object store listing.
+ObjectInfo = namedtuple('ObjectInfo', ['name', 'size', 'generation'])
+
+
+class GcsObjectStore(object):
+    """Lists, copies and deletes GCS objects with a storage client per worker thread.
+
+    Copies are server-side rewrites, so the object data never goes through this process. Each
+    client pools only 10 HTTP connections, so sharing one between all of the workers would make
+    them wait on each other.
+    """
+
+    def __init__(self, credentials, project):
+        self.credentials = credentials
+        self.project = project
+        self._thread_local = threading.local()
+
+    @property
+    def storage_client(self):
+        """The storage client of the current thread, created on its first use."""
+        if not hasattr(self._thread_local, 'storage_client'):
+            self._thread_local.storage_client = storage.Client(
+                credentials=self.credentials, project=self.project)
+        return self._thread_local.storage_client
+
+    def list_objects(self, bucket_name, prefix=None, delimiter=None):
+        """List the objects of a bucket.
+
+        Args:
+            bucket_name: The name of the bucket to list
+            prefix: Only list the objects whose names start with this prefix
+            delimiter: If set, objects below a delimiter are returned as prefixes instead
+
+        Returns:
+            A tuple of the list of ObjectInfo and the sorted list of prefixes
+        """
+
+        iterator = self.storage_client.bucket(bucket_name).list_blobs(
+            prefix=prefix, delimiter=delimiter)
+        objects = [
+            ObjectInfo(blob.name, blob.size, blob.generation)
+            for blob in iterator
+        ]
+        return objects, sorted(iterator.prefixes)
+
+    def copy_object(self, source_bucket_name, object_name, sink_bucket_name):
+        """Rewrite an object into the sink bucket, under the same name.
+
+        Args:
+            source_bucket_name: The name of the bucket to copy the object from
+            object_name: The name of the object
+            sink_bucket_name: The name of the bucket to copy the object to
+        """
+
+        source_blob = self.storage_client.bucket(source_bucket_name).blob(
+            object_name)
+        sink_blob = self.storage_client.bucket(sink_bucket_name).blob(
+            object_name)
+        # Large objects and copies across locations or storage classes take several calls
+        token, _, _ = sink_blob.rewrite(source_blob)
+        while token is not None:
+            token, _, _ = sink_blob.rewrite(source_blob, token=token)
+
+    def delete_object(self, bucket_name, object_name):
+        """Delete an object, if it still exists.
+
+        Args:
+            bucket_name: The name of the bucket
+            object_name: The name of the object
+        """
+
+        try:
+            self.storage_client.bucket(bucket_name).delete_blob(object_name)
+        except exceptions.NotFound:
+            pass
+
+
+class LocalObjectStore(object):
+    """Stand-in for GCS where buckets are directories under a root directory.
+
+    Lets the move logic be tested and benchmarked without GCP.
+    """
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+
+    def _path(self, bucket_name, object_name=''):
+        return os.path.join(self.root_dir, bucket_name, object_name)
+
+    def list_objects(self, bucket_name, prefix=None, delimiter=None):
+        """List the objects of a bucket directory.
+
+        Args:
+            bucket_name: The name of the bucket to list
+            prefix: Only list the objects whose names start with this prefix
+            delimiter: If set, objects below a delimiter are returned as prefixes instead
+
+        Returns:
+            A tuple of the list of ObjectInfo and the sorted list of prefixes
+        """
+
+        prefix = prefix or ''
+        bucket_path = self._path(bucket_name)
+        objects = []
+        prefixes = set()
+        for dir_path, _, file_names in os.walk(bucket_path):
+            for file_name in file_names:
+                path = os.path.join(dir_path, file_name)
+                name = os.path.relpath(path, bucket_path).replace(os.sep, '/')
+                if not name.startswith(prefix):
+                    continue
+                if delimiter and delimiter in name[len(prefix):]:
+                    index = name.index(delimiter, len(prefix))
+                    prefixes.add(name[:index + len(delimiter)])
+                    continue
+                stat = os.stat(path)
+                objects.append(
+                    ObjectInfo(name, stat.st_size, int(stat.st_mtime * 1e6)))
+        return sorted(objects), sorted(prefixes)
+
+    def copy_object(self, source_bucket_name, object_name, sink_bucket_name):
+        """Copy an object file into the sink bucket directory.
+
+        Args:
+            source_bucket_name: The name of the bucket to copy the object from
+            object_name: The name of the object
+            sink_bucket_name: The name of the bucket to copy the object to
+        """
+
+        sink_path = self._path(sink_bucket_name, object_name)
+        # Other workers may be creating the same directory at the same time
+        try:
+            os.makedirs(os.path.dirname(sink_path))
+        except OSError as error:
+            if error.errno != errno.EEXIST:
+                raise
+        shutil.copyfile(
+            self._path(source_bucket_name, object_name), sink_path)
+
+    def delete_object(self, bucket_name, object_name):
+        """Delete an object file, if it still exists.
+
+        Args:
+            bucket_name: The name of the bucket
+            object_name: The name of the object
+        """
+
+        try:
+            os.remove(self._path(bucket_name, object_name))
+        except OSError:
+            pass
+
+
+class TransferManifest(object):
+    """Local checkpoint file of the objects that have been copied to the sink bucket.
+
+    Every copied object is appended as a JSON line before it is deleted from the source bucket, so
+    that a resumed transfer only deletes the objects that were copied but not deleted yet.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.copied = {}
+        if os.path.exists(path):
+            with open(path, 'r') as manifest_file:
+                for line in manifest_file:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.copied[entry['name']] = entry['generation']
+
+    def is_copied(self, object_info):
+        """Returns True if this generation of the object has already been copied."""
+        return self.copied.get(object_info.name) == object_info.generation
+
+    def add(self, object_info):
+        """Record that an object has been copied to the sink bucket."""
+        with self._lock:
+            with open(self.path, 'a') as manifest_file:
+                manifest_file.write(
+                    json.dumps({
+                        'name': object_info.name,
+                        'size': object_info.size,
+                        'generation': object_info.generation
+                    }) + '\n')
+            self.copied[object_info.name] = object_info.generation
+
+    def remove(self):
+        """Delete the manifest file once the transfer has finished."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _retry_if_not_found(exception):
+    """Return True if the object operation should be retried"""
+    return not isinstance(exception, exceptions.NotFound)
+
+
+class ObjectMover(object):
+    """Moves all of the objects of a bucket to another bucket with a pool of workers.
+
+    The source bucket is listed in parallel, one listing per top level prefix. Every object is then
+    copied to the sink bucket and deleted from the source bucket by the workers, which is what the
+    STS job does with deleteObjectsFromSourceAfterTransfer set. Progress is checkpointed to a local
+    manifest so that a failed transfer can be resumed.
+    """
+
+    def __init__(self, object_store, workers=16, manifest_dir='.'):
+        self.object_store = object_store
+        self.workers = workers
+        self.manifest_dir = manifest_dir
+
+    def list_source_objects(self, bucket_name, executor):
+        """List all of the objects of the source bucket, in parallel by top level prefix.
+
+        Args:
+            bucket_name: The name of the bucket to list
+            executor: The executor to run the prefix listings in
+
+        Returns:
+            The list of ObjectInfo for all of the objects in the bucket
+        """
+
+        objects, prefixes = self.object_store.list_objects(
+            bucket_name, delimiter='/')
+        listings = executor.map(
+            lambda prefix: self.object_store.list_objects(
+                bucket_name, prefix=prefix)[0], prefixes)
+        for prefix_objects in listings:
+            objects.extend(prefix_objects)
+        return objects
+
+    @retry(
+        retry_on_exception=_retry_if_not_found,
+        wait_exponential_multiplier=1000,
+        wait_exponential_max=30000,
+        stop_max_attempt_number=5)
+    def _move_object(self, manifest, source_bucket_name, sink_bucket_name,
+                     object_info):
+        """Copy a single object to the sink bucket and delete it from the source bucket.
+
+        The copy is skipped if the manifest shows it was done by a previous run.
+
+        Args:
+            manifest: The TransferManifest of the transfer
+            source_bucket_name: The name of the bucket to move the object from
+            sink_bucket_name: The name of the bucket to move the object to
+            object_info: The ObjectInfo of the object to move
+
+        Returns:
+            True if the object was copied, False if only the delete was needed
+        """
+
+        copied = False
+        if not manifest.is_copied(object_info):
+            self.object_store.copy_object(source_bucket_name, object_info.name,
+                                          sink_bucket_name)
+            manifest.add(object_info)
+            copied = True
+        self.object_store.delete_object(source_bucket_name, object_info.name)
+        return copied
+
+    def move(self, source_bucket_name, sink_bucket_name):
+        """Move all of the objects from the source bucket to the sink bucket.
+
+        Args:
+            source_bucket_name: The name of the bucket to move the objects from
+            sink_bucket_name: The name of the bucket to move the objects to
+
+        Returns:
+            A dict of counters in the same format as the STS job counters, along with the list of
+            names of the objects that could not be moved under 'failedObjects'
+        """
+
+        manifest = TransferManifest(
+            os.path.join(
+                self.manifest_dir, '{}_to_{}.manifest'.format(
+                    source_bucket_name, sink_bucket_name)))
+        counters = {
+            'objectsFoundFromSource': 0,
+            'bytesFoundFromSource': 0,
+            'objectsCopiedToSink': 0,
+            'bytesCopiedToSink': 0,
+            'objectsDeletedFromSource': 0,
+            'bytesDeletedFromSource': 0,
+            'failedObjects': []
+        }
+
+        executor = futures.ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            objects = self.list_source_objects(source_bucket_name, executor)
+            counters['objectsFoundFromSource'] = len(objects)
+            counters['bytesFoundFromSource'] = sum(
+                object_info.size for object_info in objects)
+
+            pending = dict(
+                (executor.submit(self._move_object, manifest,
+                                 source_bucket_name, sink_bucket_name,
+                                 object_info), object_info)
+                for object_info in objects)
+            for future in futures.as_completed(pending):
+                object_info = pending[future]
+                if future.exception() is not None:
+                    counters['failedObjects'].append(object_info.name)
+                    continue
+                if future.result():
+                    counters['objectsCopiedToSink'] += 1
+                    counters['bytesCopiedToSink'] += object_info.size
+                counters['objectsDeletedFromSource'] += 1
+                counters['bytesDeletedFromSource'] += object_info.size
+        finally:
+            executor.shutdown()
+
+        if not counters['failedObjects']:
+            manifest.remove()
+        return counters
@@ -32,6 +32,10 @@ def get_mock_args():
     args.lock_file_name = 'my-lock-file'
     args.gcp_source_project_service_account_key = './data/fake_source_keyjson'
     args.gcp_target_project_service_account_key = './data/fake_target_keyjson'
+    args.transfer_engine = 'sts'
+    args.transfer_workers = 16
+    args.transfer_manifest_dir = '.'
+    args.max_parallel_moves = 4
 
     args.location = 'conf_location'
     args.storage_class = 'conf_storage_class'
@@ -390,6 +390,48 @@ class TestBucketMoverService(unittest.TestCase):
         mock_write_spinner_and_log.assert_not_called()
         self.assertTrue(result)
 
+    @mock.patch('gcs_bucket_mover.bucket_mover_service.discovery')
+    def test_get_project_number_cached(self, mock_discovery):
+        """Tests that the project number is only looked up once per project."""
+        mock_discovery.build.return_value.projects.return_value.get.return_value.execute.return_value = {
+            'projectNumber': '1234'
+        }
+        with mock.patch.dict(bucket_mover_service._shared_lookups, clear=True):
+            for _ in range(3):
+                self.assertEqual(
+                    '1234',
+                    bucket_mover_service._get_project_number(
+                        'my-project', mock.MagicMock()))
+
+        mock_discovery.build.assert_called_once()
+
+    @mock.patch('gcs_bucket_mover.bucket_mover_service.discovery',
+                mock.MagicMock())
+    @mock.patch('gcs_bucket_mover.bucket_mover_service._run_bucket_move')
+    def test_move_buckets_reports_failed_buckets(self, mock_run_bucket_move):
+        """Tests that every bucket is moved even when some of them fail."""
+        moved_buckets = []
+
+        def run_bucket_move(config, parsed_args, cloud_logger, sts_client):
+            moved_buckets.append(config.bucket_name)
+            if config.bucket_name == 'bucket2':
+                raise ValueError('move failed')
+
+        mock_run_bucket_move.side_effect = run_bucket_move
+        mock_config = mock.MagicMock()
+        mock_config.for_bucket.side_effect = lambda name: mock.MagicMock(
+            bucket_name=name)
+
+        with self.assertRaises(SystemExit) as context:
+            bucket_mover_service.move_buckets(
+                mock_config, mock.MagicMock(), mock.MagicMock(),
+                ['bucket1', 'bucket2', 'bucket3'], 2)
+
+        self.assertEqual(['bucket1', 'bucket2', 'bucket3'],
+                         sorted(moved_buckets))
+        self.assertIn('bucket2', str(context.exception))
+        self.assertNotIn('bucket1', str(context.exception))
+
     @unittest.skip('Not implemented')
     def test_update_iam_policies_logic(self):
         self.assertTrue(True)
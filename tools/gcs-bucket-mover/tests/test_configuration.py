@@ -190,5 +190,24 @@ class TestConfiguration(unittest.TestCase):
         mock_from_service_account_file.assert_has_calls(calls)
 
 
+    def test_for_bucket(self, mock_from_service_account_file):
+        """Tests that a batch bucket config shares the clients of the original config."""
+        self.parsed_args.temp_bucket_name = 'temp'
+        self.parsed_args.rename_bucket_to = 'new_name'
+        config = configuration.Configuration.from_conf(self.parsed_args)
+
+        bucket_config = config.for_bucket('other_bucket')
+
+        self.assertEqual('other_bucket', bucket_config.bucket_name)
+        self.assertEqual('other_bucket', bucket_config.target_bucket_name)
+        self.assertEqual('other_bucket-temp', bucket_config.temp_bucket_name)
+        self.assertFalse(bucket_config.is_rename)
+        self.assertIs(config.source_storage_client,
+                      bucket_config.source_storage_client)
+        self.assertIs(config.target_project_credentials,
+                      bucket_config.target_project_credentials)
+        self.assertEqual(self.parsed_args.bucket_name, config.bucket_name)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,157 @@
+# Copyright 2018 Google LLC. All rights reserved. Licensed under the Apache License, Version 2.0
+# (the "License"); you may not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software distributed under the License
+# is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied. See the License for the specific language governing permissions and limitations under
+# the License.
+#
+# Any software provided by Google hereunder is distributed "AS IS", WITHOUT WARRANTIES OR
+# CONDITIONS OF ANY KIND, and is not intended for production use.
+"""Tests for the object_mover.py file"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import mock
+
+from gcs_bucket_mover import object_mover
+
+
+class TestObjectMover(unittest.TestCase):
+    """Tests for the logic in the ObjectMover class, run against the local object store."""
+
+    def setUp(self):
+        self.root_dir = tempfile.mkdtemp()
+        self.object_store = object_mover.LocalObjectStore(self.root_dir)
+        self.object_names = ['a.txt', 'dir1/b.txt', 'dir1/sub/c.txt', 'dir2/d.txt']
+        for name in self.object_names:
+            self._write_object('source', name, name)
+        self.mover = object_mover.ObjectMover(
+            self.object_store, workers=4, manifest_dir=self.root_dir)
+        self.manifest_path = os.path.join(self.root_dir,
+                                          'source_to_sink.manifest')
+
+    def tearDown(self):
+        shutil.rmtree(self.root_dir)
+
+    def _write_object(self, bucket_name, object_name, content):
+        path = os.path.join(self.root_dir, bucket_name, object_name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as object_file:
+            object_file.write(content)
+
+    def _list_names(self, bucket_name):
+        objects, _ = self.object_store.list_objects(bucket_name)
+        return [object_info.name for object_info in objects]
+
+    def test_list_objects_with_delimiter(self):
+        """Tests that objects below the delimiter are returned as prefixes."""
+        objects, prefixes = self.object_store.list_objects(
+            'source', delimiter='/')
+
+        self.assertEqual(['a.txt'], [object_info.name for object_info in objects])
+        self.assertEqual(['dir1/', 'dir2/'], prefixes)
+
+    def test_copy_object_into_existing_directory(self):
+        """Tests that a copy does not fail when another worker created the directory first."""
+        with mock.patch('os.path.isdir', return_value=False):
+            self.object_store.copy_object('source', 'dir1/b.txt', 'sink')
+            self.object_store.copy_object('source', 'dir1/sub/c.txt', 'sink')
+            self.object_store.copy_object('source', 'dir1/b.txt', 'sink')
+
+        self.assertEqual(['dir1/b.txt', 'dir1/sub/c.txt'], self._list_names('sink'))
+
+    def test_move_all_objects(self):
+        """Tests that all objects are copied to the sink and deleted from the source."""
+        counters = self.mover.move('source', 'sink')
+
+        self.assertEqual(self.object_names, self._list_names('sink'))
+        self.assertEqual([], self._list_names('source'))
+        self.assertEqual(4, counters['objectsFoundFromSource'])
+        self.assertEqual(4, counters['objectsCopiedToSink'])
+        self.assertEqual(4, counters['objectsDeletedFromSource'])
+        self.assertEqual(counters['bytesFoundFromSource'],
+                         counters['bytesCopiedToSink'])
+        self.assertEqual([], counters['failedObjects'])
+        self.assertFalse(os.path.exists(self.manifest_path))
+
+    def test_move_resumes_from_manifest(self):
+        """Tests that objects already copied by a previous run are only deleted."""
+        objects, _ = self.object_store.list_objects('source')
+        manifest = object_mover.TransferManifest(self.manifest_path)
+        manifest.add(objects[0])
+
+        with mock.patch.object(
+                self.object_store, 'copy_object',
+                wraps=self.object_store.copy_object) as mock_copy_object:
+            counters = self.mover.move('source', 'sink')
+
+        self.assertEqual(3, mock_copy_object.call_count)
+        self.assertEqual(3, counters['objectsCopiedToSink'])
+        self.assertEqual(4, counters['objectsDeletedFromSource'])
+        self.assertEqual([], self._list_names('source'))
+
+    @mock.patch('time.sleep', mock.MagicMock())
+    def test_move_keeps_manifest_on_failure(self):
+        """Tests that failed objects are reported and stay in the source bucket."""
+        copy_object = self.object_store.copy_object
+
+        def failing_copy_object(source_bucket_name, object_name,
+                                sink_bucket_name):
+            if object_name == 'dir2/d.txt':
+                raise IOError('copy failed')
+            copy_object(source_bucket_name, object_name, sink_bucket_name)
+
+        with mock.patch.object(self.object_store, 'copy_object',
+                               side_effect=failing_copy_object):
+            counters = self.mover.move('source', 'sink')
+
+        self.assertEqual(['dir2/d.txt'], counters['failedObjects'])
+        self.assertEqual(['dir2/d.txt'], self._list_names('source'))
+        self.assertTrue(os.path.exists(self.manifest_path))
+        self.assertEqual(
+            3, len(object_mover.TransferManifest(self.manifest_path).copied))
+
+
+
+class TestGcsObjectStore(unittest.TestCase):
+    """Tests for the GcsObjectStore class."""
+
+    @mock.patch('gcs_bucket_mover.object_mover.storage.Client')
+    def test_storage_client_per_thread(self, mock_client):
+        """Tests that every worker thread reuses its own storage client."""
+        mock_client.side_effect = lambda **kwargs: mock.MagicMock()
+        object_store = object_mover.GcsObjectStore('credentials', 'project')
+        clients = []
+
+        def get_clients():
+            clients.append(object_store.storage_client)
+            clients.append(object_store.storage_client)
+
+        threads = [threading.Thread(target=get_clients) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(2, mock_client.call_count)
+        mock_client.assert_called_with(credentials='credentials',
+                                       project='project')
+        self.assertIs(clients[0], clients[1])
+        self.assertIs(clients[2], clients[3])
+        self.assertIsNot(clients[0], clients[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
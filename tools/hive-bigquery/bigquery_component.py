@@ -19,7 +19,6 @@ load job, updating the status of a running load job etc."""
 import csv
 import logging
 import os
-import time
 from uuid import uuid4
 
 from google.api_core import exceptions
@@ -28,10 +27,16 @@ from google.cloud import bigquery
 
 import custom_exceptions
 from gcp_service import GCPService
+from load_job_watcher import LoadJobWatcher
 from properties_reader import PropertiesReader
 
 logger = logging.getLogger('Hive2BigQuery')
 
+# Update these values to change the maximum number of files and bytes which
+# are loaded by a single load job.
+MAX_LOAD_JOB_URIS = 1000
+MAX_LOAD_JOB_BYTES = 100 * 1024 ** 3
+
 
 class BigQueryComponent(GCPService):
     """Creates BigQuery client and provides various utility functions.
@@ -44,6 +49,9 @@ class BigQueryComponent(GCPService):
     Attributes:
         project_id (str): GCP Project ID.
         client (google.cloud.bigquery.client.Client): BigQuery client.
+        load_job_slots (threading.Semaphore): Bounds the number of load jobs
+            which run at the same time across all the migrated tables, or
+            None if unbounded.
 
     """
 
@@ -51,6 +59,8 @@ class BigQueryComponent(GCPService):
 
         logger.debug("Initializing BigQuery Component")
         super(BigQueryComponent, self).__init__(project_id, "BigQuery service")
+        self._dataset_locations = {}
+        self.load_job_slots = None
 
     def get_client(self):
         """Creates BigQuery client.
@@ -105,6 +115,9 @@ class BigQueryComponent(GCPService):
     def get_dataset_location(self, dataset_id):
         """BigQuery dataset location.
 
+        The location of a dataset can't change, so it is fetched only once
+        per dataset.
+
         Args:
             dataset_id (str): BigQuery dataset id.
 
@@ -112,8 +125,11 @@ class BigQueryComponent(GCPService):
             str: Location of the dataset.
         """
 
-        dataset_ref = self.client.dataset(dataset_id)
-        return self.client.get_dataset(dataset_ref).location
+        if dataset_id not in self._dataset_locations:
+            dataset_ref = self.client.dataset(dataset_id)
+            self._dataset_locations[dataset_id] = self.client.get_dataset(
+                dataset_ref).location
+        return self._dataset_locations[dataset_id]
 
     def create_table(self, dataset_id, table_name, schema):
         """Creates BigQuery table.
@@ -209,16 +225,18 @@ class BigQueryComponent(GCPService):
                     "Tracking Table {} doesn't exist".format(
                         hive_table_model.tracking_table_name))
 
-    def start_load_job(self, bq_table_model, source_uri, job_id):
+    def start_load_job(self, bq_table_model, source_uris, job_id):
         """Starts BigQuery load job asynchronously.
 
         Starts a load job with given job ID for loading data into BigQuery
-        table from the given GCS URI.
+        table from the given GCS URIs. If the number of load jobs is bounded,
+        waits for a slot, which is released once the job finishes.
 
         Args:
             bq_table_model (:class:`BigQueryTableModel`): Wrapper to BigQuery
                 table details.
-            source_uri (str): URI of data file to be loaded.
+            source_uris (Union[str, List[str]]): URIs of data files to be
+                loaded.
             job_id (str): BigQuery job ID.
         """
 
@@ -245,9 +263,21 @@ class BigQueryComponent(GCPService):
             job_config.source_format = bigquery.SourceFormat.AVRO
             job_config.use_avro_logical_types = True
 
+        if self.load_job_slots is not None:
+            self.load_job_slots.acquire()
         # Creates load job
-        self.client.load_table_from_uri(source_uri, dataset_ref.table(
-            bq_table_model.table_name), job_config=job_config, job_id=job_id)
+        try:
+            load_job = self.client.load_table_from_uri(
+                source_uris, dataset_ref.table(bq_table_model.table_name),
+                job_config=job_config, job_id=job_id)
+        except Exception:
+            if self.load_job_slots is not None:
+                self.load_job_slots.release()
+            raise
+        if self.load_job_slots is not None:
+            # The job is polled in the background until it finishes.
+            load_job.add_done_callback(
+                lambda _: self.load_job_slots.release())
 
     def get_bq_table_row_count(self, bq_table_model, clause=''):
         """Queries the migrated BigQuery table to get a count of rows.
@@ -269,59 +299,124 @@ class BigQueryComponent(GCPService):
             n_rows = row.n_rows
             return n_rows
 
-    def load_gcs_to_bq(self, mysql_component, hive_table_model, bq_table_model):
+    @staticmethod
+    def group_load_files(results, file_sizes, max_uris=MAX_LOAD_JOB_URIS,
+                         max_bytes=MAX_LOAD_JOB_BYTES):
+        """Groups the files to load into BigQuery load jobs.
+
+        Files of the same staging table are grouped together, in groups of
+        at most max_uris files and max_bytes bytes. A file bigger than
+        max_bytes gets a group of its own.
+
+        Args:
+            results (List[tuple]): Staging table name and GCS URI of every
+                file.
+            file_sizes (dict): Size in bytes of the files, keyed by GCS URI.
+                Files which are missing are counted as empty.
+            max_uris (int): Maximum number of files in a group.
+            max_bytes (int): Maximum number of bytes in a group.
+
+        Returns:
+            List[List[str]]: GCS URIs of the files of every group.
+        """
+
+        files_by_table = {}
+        for table_name, gcs_file_path in results:
+            files_by_table.setdefault(table_name, []).append(gcs_file_path)
+        groups = []
+        for gcs_file_paths in files_by_table.values():
+            group = []
+            group_bytes = 0
+            for gcs_file_path in gcs_file_paths:
+                size = file_sizes.get(gcs_file_path, 0)
+                if group and (len(group) == max_uris or
+                              group_bytes + size > max_bytes):
+                    groups.append(group)
+                    group = []
+                    group_bytes = 0
+                group.append(gcs_file_path)
+                group_bytes += size
+            if group:
+                groups.append(group)
+        return groups
+
+    def load_gcs_to_bq(self, mysql_component, gcs_component, hive_table_model,
+                       bq_table_model, table_name=None):
         """Loads data from GCS to BigQuery.
 
         Queries the tracking table and fetches information about the files
         that have been copied to GCS and are ready to be loaded into
-        BigQuery, creates loading jobs and updates the job ID & job status in
-        the tracking table.
+        BigQuery, groups them into load jobs and updates the job ID & job
+        status of every file in the tracking table. All the files of a load
+        job share its job ID.
 
         Args:
             mysql_component (:class:`MySQLComponent`): Instance of
                 MySQLComponent to connect to MySQL.
+            gcs_component (:class:`GCSStorageComponent`): Instance of
+                GCSStorageComponent to do GCS operations.
             hive_table_model (:class:`HiveTableModel`): Wrapper to Hive table
                 details.
             bq_table_model (:class:`BigQueryTableModel`): Wrapper to BigQuery
                 table details.
+            table_name (str): Staging table name. If provided, only the files
+                of this staging table are loaded.
         """
 
         logger.info(
             "Fetching information about files to load to BigQuery from "
             "tracking table...")
-        query = "SELECT gcs_file_path FROM {} WHERE gcs_copy_status='DONE' " \
-                "AND bq_job_status='TODO'".format(
+        query = "SELECT table_name,gcs_file_path FROM {} WHERE " \
+                "gcs_copy_status='DONE' AND bq_job_status='TODO'".format(
                     hive_table_model.tracking_table_name)
-        results = mysql_component.execute_query(query)
+        values = None
+        if table_name is not None:
+            query += " AND table_name=%s"
+            values = (table_name,)
+        results = mysql_component.execute_query(query, values)
         if not results:
             logger.info("No gcs files to load to BigQuery")
+            return
 
-        for row in results:
-            gcs_source_uri = row[0]
-            bq_job_id = "hive2bq-job-{}".format(uuid4())
-            # Starts the load job asynchronously.
-            self.start_load_job(bq_table_model, gcs_source_uri, bq_job_id)
-            # Updates the job status as RUNNING.
-            query = "UPDATE {0} SET bq_job_id='{1}',bq_job_status='RUNNING' " \
-                    "WHERE gcs_file_path='{2}'".format(
-                        hive_table_model.tracking_table_name,
-                        bq_job_id, gcs_source_uri)
-            mysql_component.execute_transaction(query)
-            logger.info(
-                "Updated BigQuery load job ID {} status TODO --> RUNNING for "
-                "file path {}".format(
-                    bq_job_id, gcs_source_uri))
+        file_sizes = gcs_component.get_file_sizes(
+            [gcs_file_path for _, gcs_file_path in results])
+        groups = self.group_load_files(results, file_sizes)
+        started_jobs = []
+        try:
+            for gcs_file_paths in groups:
+                bq_job_id = "hive2bq-job-{}".format(uuid4())
+                # Starts the load job asynchronously.
+                self.start_load_job(bq_table_model, gcs_file_paths, bq_job_id)
+                started_jobs.extend((bq_job_id, gcs_file_path)
+                                    for gcs_file_path in gcs_file_paths)
+                logger.debug("Started BigQuery load job %s for %d files",
+                             bq_job_id, len(gcs_file_paths))
+        finally:
+            # Updates the job status of the files of the started jobs as
+            # RUNNING in one transaction, even if starting one of the jobs
+            # failed.
+            query = "UPDATE {0} SET bq_job_id=%s,bq_job_status='RUNNING' " \
+                    "WHERE gcs_file_path=%s".format(
+                        hive_table_model.tracking_table_name)
+            mysql_component.execute_many(query, started_jobs)
+            if started_jobs:
+                logger.info(
+                    "Updated BigQuery load job status TODO --> RUNNING for {} "
+                    "file paths in {} load jobs".format(
+                        len(started_jobs),
+                        len(set(job_id for job_id, _ in started_jobs))))
 
     def update_bq_job_status(self, mysql_component, gcs_component,
                              hive_table_model, bq_table_model, gcs_bucket_name):
         """Updates the status of running BigQuery load jobs.
 
         Queries the tracking table and fetches information about the load
-        jobs that are 'RUNNING 'and polls the job status. If the job has
-        finished successfully with no errors, updates the status as 'DONE'.
-        In case of job completion with errors, it updates the status to
-        'TODO' and increases the bq_job_retries count by 1. Waits for 1
-        minute and polls the job status again, until all the load jobs finish.
+        jobs that are 'RUNNING' and watches them until they finish, using a
+        :class:`LoadJobWatcher`. If a job has finished successfully with no
+        errors, updates the status as 'DONE' and deletes the data file in
+        GCS. In case of job completion with errors, the job is re-submitted
+        and the bq_job_retries count is increased by 1, until the maximum
+        number of retries is reached and the status is updated as 'FAILED'.
 
         Args:
             mysql_component (:class:`MySQLComponent`): Instance of
@@ -335,87 +430,8 @@ class BigQueryComponent(GCPService):
             gcs_bucket_name (str): GCS bucket name.
         """
 
-        # Uodate this value to increase the maximum number of load job retries.
-        bq_load_job_max_retries = 3
-        logger.info(
-            "Fetching information about BigQuery load jobs from tracking "
-            "table...")
-        query = "SELECT gcs_file_path,bq_job_id,bq_job_retries FROM {} WHERE " \
-                "bq_job_status='RUNNING'".format(
-                    hive_table_model.tracking_table_name)
-        results = mysql_component.execute_query(query)
-        if not results:
-            logger.info(
-                "No BigQuery job is in RUNNING state. No values to update")
-
-        # Waits till all the load jobs finish.
-        while results:
-            count = 0
-            for row in results:
-                gcs_file_path, bq_job_id, bq_job_retries = row
-                # Gets information about the running job.
-                job = self.client.get_job(bq_job_id,
-                                          location=self.get_dataset_location(
-                                              bq_table_model.dataset_id))
-
-                if job.state == 'DONE':
-                    # Job finished successfully.
-                    if job.errors is None:
-                        query = "UPDATE {0} SET bq_job_status='DONE' WHERE " \
-                                "bq_job_id='{1}'".format(
-                                    hive_table_model.tracking_table_name,
-                                    bq_job_id)
-                        mysql_component.execute_transaction(query)
-                        logger.info(
-                            "Updated BigQuery load job {} status RUNNING --> "
-                            "DONE".format(bq_job_id))
-                        # Deletes the data file in GCS.
-                        gcs_component.delete_file(gcs_bucket_name,
-                                                  gcs_file_path)
-                    # Job finished with error.
-                    elif job.errors is not None:
-
-                        if bq_job_retries == bq_load_job_max_retries:
-                            query = "UPDATE {0} SET bq_job_status='FAILED' " \
-                                    "WHERE bq_job_id='{1}'".format(
-                                        hive_table_model.tracking_table_name,
-                                        bq_job_id)
-                            mysql_component.execute_transaction(query)
-                            logger.info(
-                                "BigQuery job {} failed.Tried for a maximum "
-                                "of 3 times.Updated status RUNNING --> "
-                                "FAILED".format(bq_job_id))
-                        else:
-                            query = "UPDATE {0} SET bq_job_status='TODO'," \
-                                    "bq_job_retries={1} WHERE " \
-                                    "bq_job_id='{2}'".format(
-                                        hive_table_model.tracking_table_name,
-                                        bq_job_retries + 1, bq_job_id)
-                            mysql_component.execute_transaction(query)
-                            logger.info(
-                                "BigQuery job {} failed.Updated status "
-                                "RUNNING --> TODO & increased retries count "
-                                "by 1".format(bq_job_id))
-
-                elif job.state == 'RUNNING':
-                    # Count of jobs which are still in running state.
-                    count += 1
-                else:
-                    logger.debug(
-                        "job id %s job state %s", bq_job_id, job.state)
-            if count == 0:
-                logger.info(
-                    "No BigQuery job is in RUNNING state. No values to update")
-                break
-            logger.info("Waiting for 1 min..")
-            time.sleep(60)
-            logger.info(
-                "Fetching information about BigQuery load jobs from tracking "
-                "table...")
-            query = "SELECT gcs_file_path,bq_job_id,bq_job_retries FROM {} " \
-                    "WHERE bq_job_status='RUNNING'".format(
-                        hive_table_model.tracking_table_name)
-            results = mysql_component.execute_query(query)
+        LoadJobWatcher(self, mysql_component, gcs_component, hive_table_model,
+                       bq_table_model, gcs_bucket_name).run()
 
     @staticmethod
     def generate_metrics_table_schema(columns_list):
@@ -578,13 +594,14 @@ class BigQueryComponent(GCPService):
             "BigQuery table {}".format(
                 destination_table.num_rows, table_name))
 
-    def write_metrics_to_bigquery(self, gcs_component,
-                                  hive_table_model, bq_table_model):
+    def write_metrics_to_bigquery(self, gcs_component, hive_table_model,
+                                  bq_table_model, column_aggregates=None):
         """Writes comparison metrics to BigQuery.
 
         Flattens the schema of both the Hive table and BigQuery table,
         reads the data types validation rules list, does health checks of the
-        migration and loads the metrics data into a BigQuery comparison table.
+        migration and loads the metrics data into a BigQuery comparison table,
+        along with the per-column aggregates, if any.
 
         Args:
             gcs_component (:class:`GCSStorageComponent`): Instance of
@@ -593,6 +610,9 @@ class BigQueryComponent(GCPService):
                 details.
             bq_table_model (:class:`BigQueryTableModel`): Wrapper to BigQuery
                 table details.
+            column_aggregates (List[dict]): Rows of per-column aggregates of
+                both tables and their checks, to be added to the comparison
+                table.
         """
 
         metrics_table_name = PropertiesReader.get('hive_bq_comparison_table')
@@ -620,6 +640,10 @@ class BigQueryComponent(GCPService):
                                         flat_list_columns)
         logger.debug("Health checks are done")
 
+        for row in column_aggregates or []:
+            self.append_row_to_metrics_file(metrics_csv_filename, row,
+                                            flat_list_columns)
+
         logger.debug("Getting metrics table schema")
 
         logger.debug("Creating BigQuery metrics table")
@@ -25,8 +25,9 @@ from google.auth import exceptions as auth_exceptions
 from google.cloud import storage
 
 import custom_exceptions
-from utilities import calculate_time, execute_command
+from utilities import acquire_slot, calculate_time, execute_command
 from gcp_service import GCPService
+from hdfs_component import get_hdfs_component
 
 logger = logging.getLogger('Hive2BigQuery')
 
@@ -41,12 +42,16 @@ class GCSStorageComponent(GCPService):
     Attributes:
         project_id (str): GCP Project ID.
         client (google.cloud.storage.client.Client): Google Cloud Storage Client.
+        distcp_slots (threading.Semaphore): Bounds the number of distcp jobs
+            which run at the same time across all the migrated tables, or
+            None if unbounded.
     """
 
     def __init__(self, project_id):
 
         logger.debug("Initializing GCS Component")
         super(GCSStorageComponent, self).__init__(project_id, "Cloud Storage")
+        self.distcp_slots = None
 
     def get_client(self):
         """Creates BigQuery client.
@@ -149,8 +154,55 @@ class GCSStorageComponent(GCPService):
         logger.debug("File %s doesn't exist", gcs_uri)
         return False
 
+    def get_file_sizes(self, gcs_uris):
+        """Gets the sizes of GCS files.
+
+        Lists every folder of the given files once, instead of fetching the
+        files one by one.
+
+        Args:
+            gcs_uris (List[str]): GCS URIs of the files.
+
+        Returns:
+            dict: Size in bytes of every file which exists, keyed by GCS URI.
+        """
+
+        folders = set()
+        for gcs_uri in gcs_uris:
+            bucket_name, blob_name = gcs_uri.split('gs://')[1].split('/', 1)
+            folders.add((bucket_name, blob_name.rsplit('/', 1)[0] + '/'))
+        file_sizes = {}
+        for bucket_name, prefix in folders:
+            for blob in self.client.list_blobs(bucket_name, prefix=prefix):
+                file_sizes['gs://{}/{}'.format(bucket_name,
+                                               blob.name)] = blob.size
+        return file_sizes
+
+    @staticmethod
+    def get_hdfs_file_sizes(hdfs_file_paths):
+        """Gets the sizes of HDFS files.
+
+        Lists every directory of the given files once.
+
+        Args:
+            hdfs_file_paths (List[str]): HDFS paths of the files.
+
+        Returns:
+            dict: Size in bytes of every file which exists, keyed by HDFS
+                path.
+        """
+
+        directories = set(hdfs_file_path.rsplit('/', 1)[0]
+                          for hdfs_file_path in hdfs_file_paths)
+        file_sizes = {}
+        for directory in directories:
+            for hdfs_file in get_hdfs_component().list_files(directory):
+                file_sizes[hdfs_file.path] = hdfs_file.size
+        return file_sizes
+
     def stage_to_gcs(self, mysql_component, bq_component, hive_table_model,
-                     bq_table_model, gcs_bucket_name):
+                     bq_table_model, gcs_bucket_name, table_name=None,
+                     load_to_bq=True):
         """Copies staged files to GCS.
 
         Queries the tracking table, fetches information about the files to
@@ -169,26 +221,37 @@ class GCSStorageComponent(GCPService):
             bq_table_model (:class:`BigQueryTableModel`): Wrapper to BigQuery
                 table details.
             gcs_bucket_name (str): GCS bucket name.
+            table_name (str): Staging table name. If provided, only the files
+                of this staging table are copied.
+            load_to_bq (boolean): Whether to start loading the copied files
+                into BigQuery after every distcp job.
         """
 
         logger.debug(
             "Fetching information about files to copy to GCS from tracking "
             "table...")
-        select_query = "SELECT table_name,file_path FROM {} WHERE " \
-                       "gcs_copy_status='TODO'".format(
+        select_query = "SELECT table_name,file_path,file_size FROM {} " \
+                       "WHERE gcs_copy_status='TODO'".format(
                            hive_table_model.tracking_table_name)
-        results = mysql_component.execute_query(select_query)
+        select_values = None
+        if table_name is not None:
+            select_query += " AND table_name=%s"
+            select_values = (table_name,)
+        results = mysql_component.execute_query(select_query, select_values)
 
         if not results:
             logger.debug("No file paths to copy to GCS")
 
         while results:
             file_info = {}
+            source_sizes = {}
             for row in results:
                 source_location = row[1]
                 file_name = source_location.split('/')[-1]
                 if file_name not in file_info.keys():
                     file_info[file_name] = source_location
+                    if row[2] is not None:
+                        source_sizes[source_location] = row[2]
             source_locations = ' '.join(file_info.values())
             filename = "file_info_{}.json".format(uuid4())
             # Dictionary of file names and their locations
@@ -216,35 +279,57 @@ class GCSStorageComponent(GCPService):
             logger.info("Running {}".format(" ".join(cmd_copy_gcs)))
 
             start = time.time()
-            execute_command(cmd_copy_gcs)
+            with acquire_slot(self.distcp_slots):
+                execute_command(cmd_copy_gcs)
             logger.debug("Time taken - %s", calculate_time(start, time.time()))
 
-            # Iterates though the dict and checks whether the distcp
+            # Lists the target folder once and checks whether the distcp
             # operation is successful or partially completed
+            target_sizes = self.get_file_sizes(
+                [target_folder_location + file_name for file_name in file_info])
+            # Files tracked by previous versions have no size in the tracking
+            # table, so only their source directories are listed
+            unsized_locations = [
+                source_location for source_location in file_info.values()
+                if source_location not in source_sizes]
+            if unsized_locations:
+                source_sizes.update(
+                    self.get_hdfs_file_sizes(unsized_locations))
+            copied_files = []
             for file_name, source_location in file_info.items():
                 target_file_location = target_folder_location + file_name
+                target_size = target_sizes.get(target_file_location)
+                source_size = source_sizes.get(source_location)
                 # Checks whether the copied file is present at the GCS location
-                if self.check_file_exists(gcs_bucket_name,
-                                          target_file_location):
+                # with the size of the source file
+                if source_size is None:
+                    logger.error(
+                        "Failed copying data from location %s to GCS Staging "
+                        "location %s: size of the source file is unknown",
+                        source_location, target_file_location)
+                elif target_size == source_size:
                     logger.error(
                         "Finished copying data from location %s to GCS "
                         "Staging location %s", source_location,
                         target_file_location)
-                    query = "UPDATE {0} SET gcs_copy_status='DONE'," \
-                            "gcs_file_path='{1}' WHERE file_path='{2}'".format(
-                                hive_table_model.tracking_table_name,
-                                target_file_location, source_location)
-                    mysql_component.execute_transaction(query)
-                    logger.debug(
-                        "Updated GCS copy status TODO --> DONE for file path "
-                        "%s",
-                        source_location)
+                    copied_files.append((target_file_location,
+                                         source_location))
                 else:
                     logger.error(
                         "Failed copying data from location %s to GCS Staging "
                         "location %s", source_location, target_file_location)
+            # Updates the status of all the copied files in one transaction.
+            query = "UPDATE {0} SET gcs_copy_status='DONE',gcs_file_path=%s " \
+                    "WHERE file_path=%s".format(
+                        hive_table_model.tracking_table_name)
+            mysql_component.execute_many(query, copied_files)
+            logger.debug(
+                "Updated GCS copy status TODO --> DONE for %d file paths",
+                len(copied_files))
             # Starts loading the copied files
-            bq_component.load_gcs_to_bq(mysql_component, hive_table_model,
-                                        bq_table_model)
+            if load_to_bq:
+                bq_component.load_gcs_to_bq(mysql_component, self,
+                                            hive_table_model, bq_table_model,
+                                            table_name)
 
-            results = mysql_component.execute_query(select_query)
+            results = mysql_component.execute_query(select_query, select_values)
@@ -0,0 +1,251 @@
+# Copyright 2019 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to list the data files of Hive tables, either with the hdfs command
+line, WebHDFS, the pyarrow HDFS client or the local filesystem."""
+
+from abc import ABCMeta, abstractmethod
+from collections import namedtuple
+import json
+import logging
+import os
+import subprocess
+import threading
+from urllib.parse import quote, urlencode, urlsplit
+from urllib.request import urlopen
+
+import custom_exceptions
+from properties_reader import PropertiesReader
+
+logger = logging.getLogger('Hive2BigQuery')
+
+# File of a Hive table with its size in bytes.
+HDFSFile = namedtuple('HDFSFile', ['path', 'size'])
+
+
+class HDFSComponent(object):
+    """Lists the files under an HDFS location.
+
+    Attributes:
+        user (str): User to access HDFS as, if any.
+    """
+    __metaclass__ = ABCMeta
+
+    def __init__(self, user=None):
+        self.user = user
+
+    @abstractmethod
+    def list_files(self, location):
+        """Lists all the files under a location recursively.
+
+        Args:
+            location (str): HDFS location.
+
+        Returns:
+            List[HDFSFile]: Files under the location. Their paths start with
+                the given location.
+        """
+        pass
+
+    def list_data_files(self, location):
+        """Lists the data files of a Hive table.
+
+        Skips empty files and files or directories whose name starts with
+        '_' or '.', which Hive doesn't read either.
+
+        Args:
+            location (str): Hive table location.
+
+        Returns:
+            List[HDFSFile]: Data files of the table.
+        """
+
+        prefix = location.rstrip('/') + '/'
+        data_files = []
+        for hdfs_file in self.list_files(location):
+            relative_path = hdfs_file.path[len(prefix):]
+            if hdfs_file.size and not any(
+                    name.startswith(('_', '.'))
+                    for name in relative_path.split('/')):
+                data_files.append(hdfs_file)
+        return data_files
+
+
+class HDFSCommandLineComponent(HDFSComponent):
+    """Lists files with a single recursive hdfs dfs -ls command."""
+
+    def list_files(self, location):
+        cmd = ['hdfs', 'dfs', '-ls', '-R', location]
+        logger.debug("Running %s", " ".join(cmd))
+        env = None
+        if self.user:
+            env = dict(os.environ, HADOOP_USER_NAME=self.user)
+        process = subprocess.run(cmd, stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE, env=env,
+                                 universal_newlines=True)
+        if process.returncode:
+            logger.error("hdfs command execution failed: %s", process.stderr)
+            raise custom_exceptions.HDFSCommandError
+        hdfs_files = []
+        for line in process.stdout.splitlines():
+            # Lines of files start with their permissions, such as
+            # -rw-r--r--   3 hive hdfs   1024 2019-06-01 10:00 <path>
+            if not line.startswith('-'):
+                continue
+            fields = line.split(None, 7)
+            hdfs_files.append(HDFSFile(fields[7], int(fields[4])))
+        return hdfs_files
+
+
+class WebHDFSComponent(HDFSComponent):
+    """Lists files with the WebHDFS REST API of the NameNode.
+
+    Attributes:
+        url (str): WebHDFS URL of the NameNode, such as
+            http://namenode:9870.
+    """
+
+    def __init__(self, url, user=None):
+        super(WebHDFSComponent, self).__init__(user)
+        self.url = url.rstrip('/')
+
+    def list_status(self, path):
+        """Lists the content of a directory.
+
+        Args:
+            path (str): Path of the directory.
+
+        Returns:
+            List[dict]: FileStatus of every file and directory in it.
+        """
+
+        params = {'op': 'LISTSTATUS'}
+        if self.user:
+            params['user.name'] = self.user
+        url = "{}/webhdfs/v1{}?{}".format(self.url, quote(path),
+                                          urlencode(params))
+        try:
+            with urlopen(url) as response:
+                content = json.loads(response.read().decode('utf-8'))
+        except IOError as error:
+            logger.error("WebHDFS request %s failed", url)
+            raise custom_exceptions.HDFSCommandError from error
+        return content['FileStatuses']['FileStatus']
+
+    def list_files(self, location):
+        prefix = location.rstrip('/')
+        root = urlsplit(location).path.rstrip('/')
+        hdfs_files = []
+        directories = ['']
+        while directories:
+            directory = directories.pop()
+            for status in self.list_status(root + directory):
+                relative_path = directory + '/' + status['pathSuffix']
+                if status['type'] == 'DIRECTORY':
+                    directories.append(relative_path)
+                else:
+                    hdfs_files.append(
+                        HDFSFile(prefix + relative_path, status['length']))
+        return hdfs_files
+
+
+class PyArrowHDFSComponent(HDFSComponent):
+    """Lists files with the libhdfs client of pyarrow, which has to be
+    installed separately."""
+
+    def __init__(self, user=None):
+        super(PyArrowHDFSComponent, self).__init__(user)
+        self._filesystems = {}
+        self._lock = threading.Lock()
+
+    def get_filesystem(self, location):
+        """Gets the client of the NameNode of a location.
+
+        Args:
+            location (str): HDFS location.
+
+        Returns:
+            pyarrow.fs.HadoopFileSystem: HDFS client.
+        """
+
+        from pyarrow import fs
+
+        parts = urlsplit(location)
+        with self._lock:
+            if parts.netloc not in self._filesystems:
+                self._filesystems[parts.netloc] = fs.HadoopFileSystem(
+                    parts.hostname or 'default', parts.port or 0,
+                    user=self.user)
+            return self._filesystems[parts.netloc]
+
+    def list_files(self, location):
+        from pyarrow import fs
+
+        prefix = location.rstrip('/')
+        root = urlsplit(location).path.rstrip('/')
+        try:
+            infos = self.get_filesystem(location).get_file_info(
+                fs.FileSelector(root, recursive=True))
+        except (IOError, OSError) as error:
+            logger.error("Failed to list HDFS location %s", location)
+            raise custom_exceptions.HDFSCommandError from error
+        return [HDFSFile(prefix + info.path[len(root):], info.size)
+                for info in infos if info.type == fs.FileType.File]
+
+
+class LocalFileSystemComponent(HDFSComponent):
+    """Lists files of the local filesystem, as a stand-in for HDFS."""
+
+    def list_files(self, location):
+        prefix = location.rstrip('/')
+        root = urlsplit(location).path.rstrip('/')
+        hdfs_files = []
+        for directory, _, file_names in os.walk(root):
+            for file_name in file_names:
+                path = os.path.join(directory, file_name)
+                hdfs_files.append(HDFSFile(prefix + path[len(root):],
+                                           os.path.getsize(path)))
+        return hdfs_files
+
+
+HDFS_COMPONENTS = {
+    'cli': HDFSCommandLineComponent,
+    'webhdfs': WebHDFSComponent,
+    'pyarrow': PyArrowHDFSComponent,
+    'local': LocalFileSystemComponent
+}
+
+_hdfs_component = None
+_hdfs_component_lock = threading.Lock()
+
+
+def get_hdfs_component():
+    """Gets the HDFS component set in the configuration, which is created on
+    first use and shared by all the threads.
+
+    Returns:
+        :class:`HDFSComponent`: HDFS component.
+    """
+
+    global _hdfs_component
+    with _hdfs_component_lock:
+        if _hdfs_component is None:
+            client = PropertiesReader.get('hdfs_client')
+            user = PropertiesReader.get('hdfs_user')
+            if client == 'webhdfs':
+                _hdfs_component = WebHDFSComponent(
+                    PropertiesReader.get('webhdfs_url'), user)
+            else:
+                _hdfs_component = HDFS_COMPONENTS[client](user)
+        return _hdfs_component
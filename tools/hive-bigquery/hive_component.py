@@ -18,7 +18,6 @@ exists etc."""
 
 import json
 import logging
-import os
 import time
 from dateutil.parser import parse
 from uuid import uuid4
@@ -29,6 +28,9 @@ from thrift.transport import TTransport
 import custom_exceptions
 from utilities import calculate_time
 from database_component import DatabaseComponent
+from hdfs_component import get_hdfs_component
+from migration_pipeline import MigrationPipeline
+from properties_reader import PropertiesReader
 
 logger = logging.getLogger('Hive2BigQuery')
 
@@ -167,29 +169,11 @@ class HiveComponent(DatabaseComponent):
             location (str): Hive table location.
 
         Returns:
-            List: List of the underlying data files.
+            List[HDFSFile]: List of the underlying data files and their
+                sizes.
         """
 
-        file_name = "hdfs_files_{}.txt".format(uuid4())
-        status_code = os.system(
-            "hdfs dfs -ls {0} > {1}".format(location, file_name))
-        if status_code:
-            logger.error("hdfs command execution failed")
-            raise custom_exceptions.HDFSCommandError
-        with open(file_name, "r") as file_content:
-            content = file_content.readlines()
-        os.remove(file_name)
-        hdfs_files_list = []
-        i = 0
-        for i, line in enumerate(content):
-            if line.startswith("Found "):
-                break
-        for j in range(i + 1, len(content)):
-            size = content[j].split()[4]
-            if size != '0':
-                hdfs_files_list.append(content[j].split()[-1])
-
-        return hdfs_files_list
+        return get_hdfs_component().list_data_files(location)
 
     def list_partitions(self, database_name, table_name):
         """Gets information about the different partitions.
@@ -517,6 +501,15 @@ class HiveComponent(DatabaseComponent):
             self.migrate_non_partition_table(
                 mysql_component, bq_component, gcs_component, hive_table_model,
                 bq_table_model, gcs_bucket_name, table_data)
+        elif PropertiesReader.get('use_migration_pipeline'):
+            # Overlaps staging, copying and loading of different partitions.
+            MigrationPipeline(
+                self, mysql_component, bq_component, gcs_component,
+                hive_table_model, bq_table_model, gcs_bucket_name,
+                hive_stage_workers=PropertiesReader.get('hive_stage_workers'),
+                distcp_workers=PropertiesReader.get('distcp_workers'),
+                bq_load_workers=PropertiesReader.get('bq_load_workers')
+            ).run(table_data)
         else:
             self.migrate_partition_table(
                 mysql_component, bq_component, gcs_component, hive_table_model,
@@ -580,25 +573,17 @@ class HiveComponent(DatabaseComponent):
         # Lists underlying HDFS files.
         hdfs_files_list = self.list_hdfs_files(source_location)
         logger.info("Updating file paths in the tracking table..")
-        for file_path in hdfs_files_list:
-            if hive_table_model.is_inc_col_present:
-                query = "INSERT INTO {0} (id,table_name,inc_col_min," \
-                        "inc_col_max,clause,file_path,gcs_copy_status," \
-                        "bq_job_id,bq_job_retries,bq_job_status) VALUES({1}," \
-                        "'{2}','{3}','{4}','{5}','{6}','TODO','TODO',0," \
-                        "'TODO')".format(
-                            hive_table_model.tracking_table_name, identifier,
-                            table_name, inc_col_min, inc_col_max, clause,
-                            file_path)
-            else:
-                query = "INSERT INTO {0} (table_name,clause,file_path," \
-                        "gcs_copy_status,bq_job_id,bq_job_retries," \
-                        "bq_job_status) VALUES('{1}','{2}','{3}','TODO'," \
-                        "'TODO',0,'TODO')".format(
-                            hive_table_model.tracking_table_name, table_name,
-                            clause, file_path)
-            # Commits information about the staging files.
-            mysql_component.execute_transaction(query)
+        if hive_table_model.is_inc_col_present:
+            values_list = [
+                (identifier, table_name, inc_col_min, inc_col_max, clause,
+                 hdfs_file.path, hdfs_file.size)
+                for hdfs_file in hdfs_files_list]
+        else:
+            values_list = [(table_name, clause, hdfs_file.path, hdfs_file.size)
+                           for hdfs_file in hdfs_files_list]
+        # Commits information about the staging files.
+        mysql_component.execute_many(
+            self.get_insert_file_path_query(hive_table_model), values_list)
         # Copies files from HDFS to GCS.
         gcs_component.stage_to_gcs(mysql_component, bq_component,
                                    hive_table_model, bq_table_model,
@@ -630,86 +615,168 @@ class HiveComponent(DatabaseComponent):
         """
 
         for data in table_data:
-            if hive_table_model.is_inc_col_present:
-                insert_query = "INSERT INTO {0} (id,table_name,inc_col_min," \
-                               "inc_col_max,clause,file_path) VALUES('{1}'," \
-                               "'{2}','{3}','{4}','{5}','TODO')".format(
-                                   hive_table_model.tracking_table_name,
-                                   data['id'], data['table_name'],
-                                   data['inc_col_min'], data['inc_col_max'],
-                                   data['clause'])
-                select_query = "SELECT id,table_name,inc_col_min,inc_col_max," \
-                               "clause FROM {} WHERE file_path='TODO'".format(
-                                   hive_table_model.tracking_table_name)
-            else:
-                insert_query = "INSERT INTO {0} (table_name,clause," \
-                               "file_path)VALUES('{1}','{2}','TODO')".format(
-                                   hive_table_model.tracking_table_name,
-                                   data['table_name'], data['clause'])
-                select_query = "SELECT table_name,clause FROM {} WHERE " \
-                               "file_path='TODO'".format(
-                                   hive_table_model.tracking_table_name)
             # Inserts a row in the tracking table for every partition.
-            mysql_component.execute_transaction(insert_query)
-            results = mysql_component.execute_query(select_query)
+            self.insert_pending_partitions(mysql_component, hive_table_model,
+                                           [data])
+            results = self.get_pending_partitions(mysql_component,
+                                                  hive_table_model)
 
             for row in results:
-                if hive_table_model.is_inc_col_present:
-                    identifier, table_name, inc_col_min, inc_col_max, clause \
-                        = row
-                    if identifier == 1:
-                        insert_clause = "{0} and {1}>='{2}' and " \
-                                        "{1}<='{3}'".format(
-                                            clause, hive_table_model.inc_col,
-                                            inc_col_min, inc_col_max)
-                    else:
-                        insert_clause = "{0} and {1}>'{2}' and " \
-                                        "{1}<='{3}'".format(
-                                            clause, hive_table_model.inc_col,
-                                            inc_col_min, inc_col_max)
-                else:
-                    table_name, clause = row
-                    insert_clause = clause
-                # Creates staging table and inserting data.
-                self.create_and_load_stage_table(hive_table_model, table_name,
-                                                 insert_clause)
-                # Gets table location
-                source_location = self.get_table_location("default", table_name)
-                # Lists underlying HDFS files.
-                hdfs_files_list = self.list_hdfs_files(source_location)
-
-                logger.info("Updating file paths in the tracking table..")
-                for file_path in hdfs_files_list:
-                    if hive_table_model.is_inc_col_present:
-                        query = "INSERT INTO {0} (id,table_name,inc_col_min," \
-                                "inc_col_max,clause,file_path," \
-                                "gcs_copy_status,bq_job_id,bq_job_retries," \
-                                "bq_job_status) VALUES('{1}','{2}','{3}'," \
-                                "'{4}','{5}','{6}','TODO','TODO',0," \
-                                "'TODO')".format(
-                                    hive_table_model.tracking_table_name,
-                                    identifier, table_name, inc_col_min,
-                                    inc_col_max, clause, file_path)
-                    else:
-                        query = "INSERT INTO {0} (table_name,clause," \
-                                "file_path,gcs_copy_status,bq_job_id," \
-                                "bq_job_retries,bq_job_status) VALUES('{1}'," \
-                                "'{2}','{3}','TODO','TODO',0,'TODO')".format(
-                                    hive_table_model.tracking_table_name,
-                                    table_name, clause, file_path)
-                    # Commits information about the staging files.
-                    mysql_component.execute_transaction(query)
-
-                query = "DELETE FROM {0} WHERE table_name='{1}' AND clause " \
-                        "='{2}' AND file_path='TODO'".format(
-                            hive_table_model.tracking_table_name,
-                            table_name, clause)
-                mysql_component.execute_transaction(query)
+                self.stage_partition(mysql_component, hive_table_model, row)
                 # Copies files from HDFS to GCS.
                 gcs_component.stage_to_gcs(mysql_component, bq_component,
                                            hive_table_model, bq_table_model,
                                            gcs_bucket_name)
 
+    @staticmethod
+    def get_insert_file_path_query(hive_table_model):
+        """Gets the query to insert a row for a staged file in the tracking
+        table.
+
+        Args:
+            hive_table_model (:class:`HiveTableModel`): Wrapper to Hive table
+                details.
+
+        Returns:
+            str: INSERT query with %s placeholders for id, table_name,
+                inc_col_min, inc_col_max, clause, file_path and file_size if
+                there is an incremental column, else for table_name, clause,
+                file_path and file_size.
+        """
+
+        if hive_table_model.is_inc_col_present:
+            return "INSERT INTO {0} (id,table_name,inc_col_min,inc_col_max," \
+                   "clause,file_path,file_size,gcs_copy_status,bq_job_id," \
+                   "bq_job_retries,bq_job_status) VALUES(%s,%s,%s,%s,%s,%s," \
+                   "%s,'TODO','TODO',0,'TODO')".format(
+                       hive_table_model.tracking_table_name)
+        return "INSERT INTO {0} (table_name,clause,file_path,file_size," \
+               "gcs_copy_status,bq_job_id,bq_job_retries,bq_job_status) " \
+               "VALUES(%s,%s,%s,%s,'TODO','TODO',0,'TODO')".format(
+                   hive_table_model.tracking_table_name)
+
+    @staticmethod
+    def insert_pending_partitions(mysql_component, hive_table_model,
+                                  table_data):
+        """Inserts a row for every partition to migrate in the tracking table.
+
+        The file_path of the row is 'TODO' until the partition has been
+        staged and its files have been listed.
+
+        Args:
+            mysql_component (:class:`MySQLComponent`): Instance of
+                MySQLComponent to connect to MySQL.
+            hive_table_model (:class:`HiveTableModel`): Wrapper to Hive table
+                details.
+            table_data (List): Information of the partitions to migrate.
+        """
+
+        if hive_table_model.is_inc_col_present:
+            insert_query = "INSERT INTO {0} (id,table_name,inc_col_min," \
+                           "inc_col_max,clause,file_path) VALUES(%s,%s,%s," \
+                           "%s,%s,'TODO')".format(
+                               hive_table_model.tracking_table_name)
+            values_list = [
+                (data['id'], data['table_name'], data['inc_col_min'],
+                 data['inc_col_max'], data['clause']) for data in table_data]
+        else:
+            insert_query = "INSERT INTO {0} (table_name,clause," \
+                           "file_path) VALUES(%s,%s,'TODO')".format(
+                               hive_table_model.tracking_table_name)
+            values_list = [(data['table_name'], data['clause'])
+                           for data in table_data]
+        mysql_component.execute_many(insert_query, values_list)
+
+    @staticmethod
+    def get_pending_partitions(mysql_component, hive_table_model):
+        """Gets the partitions which are yet to be staged from the tracking
+        table.
+
+        Args:
+            mysql_component (:class:`MySQLComponent`): Instance of
+                MySQLComponent to connect to MySQL.
+            hive_table_model (:class:`HiveTableModel`): Wrapper to Hive table
+                details.
+
+        Returns:
+            List: Rows of (id, table_name, inc_col_min, inc_col_max, clause)
+                if there is an incremental column, else (table_name, clause).
+        """
+
+        if hive_table_model.is_inc_col_present:
+            select_query = "SELECT id,table_name,inc_col_min,inc_col_max," \
+                           "clause FROM {} WHERE file_path='TODO'".format(
+                               hive_table_model.tracking_table_name)
+        else:
+            select_query = "SELECT table_name,clause FROM {} WHERE " \
+                           "file_path='TODO'".format(
+                               hive_table_model.tracking_table_name)
+        return mysql_component.execute_query(select_query)
+
+    def stage_partition(self, mysql_component, hive_table_model, row):
+        """Stages a partition and updates its file paths in the tracking table.
+
+        Creates and loads the staging table of the partition, lists the
+        underlying HDFS files and replaces the 'TODO' row of the partition in
+        the tracking table with a row for each file.
+
+        Args:
+            mysql_component (:class:`MySQLComponent`): Instance of
+                MySQLComponent to connect to MySQL.
+            hive_table_model (:class:`HiveTableModel`): Wrapper to Hive table
+                details.
+            row (tuple): Row of the partition returned by
+                get_pending_partitions.
+
+        Returns:
+            str: Staging table name of the partition.
+        """
+
+        if hive_table_model.is_inc_col_present:
+            identifier, table_name, inc_col_min, inc_col_max, clause = row
+            if identifier == 1:
+                insert_clause = "{0} and {1}>='{2}' and " \
+                                "{1}<='{3}'".format(
+                                    clause, hive_table_model.inc_col,
+                                    inc_col_min, inc_col_max)
+            else:
+                insert_clause = "{0} and {1}>'{2}' and " \
+                                "{1}<='{3}'".format(
+                                    clause, hive_table_model.inc_col,
+                                    inc_col_min, inc_col_max)
+        else:
+            table_name, clause = row
+            insert_clause = clause
+        # Creates staging table and inserting data.
+        self.create_and_load_stage_table(hive_table_model, table_name,
+                                         insert_clause)
+        # Gets table location
+        source_location = self.get_table_location("default", table_name)
+        # Lists underlying HDFS files.
+        hdfs_files_list = self.list_hdfs_files(source_location)
+
+        logger.info("Updating file paths in the tracking table..")
+        if hive_table_model.is_inc_col_present:
+            values_list = [
+                (identifier, table_name, inc_col_min, inc_col_max, clause,
+                 hdfs_file.path, hdfs_file.size)
+                for hdfs_file in hdfs_files_list]
+        else:
+            values_list = [(table_name, clause, hdfs_file.path, hdfs_file.size)
+                           for hdfs_file in hdfs_files_list]
+        # Replaces the 'TODO' row of the partition with the information about
+        # the staging files in a single transaction.
+        with mysql_component.transaction() as cursor:
+            if values_list:
+                cursor.executemany(
+                    self.get_insert_file_path_query(hive_table_model),
+                    values_list)
+            cursor.execute(
+                "DELETE FROM {0} WHERE table_name=%s AND clause=%s AND "
+                "file_path='TODO'".format(hive_table_model.tracking_table_name),
+                (table_name, clause))
+        return table_name
+
     @staticmethod
     def compare_max_values(hive_table_model, old_max, new_max):
         """Compares the previously obtained maximum value with the newly
@@ -853,24 +920,26 @@ class HiveComponent(DatabaseComponent):
             results = mysql_component.execute_query(
                 "SELECT file_path FROM {}".format(
                     hive_table_model.tracking_table_name))
-            old_file_paths = [row[0] for row in results]
-            new_file_paths = self.list_hdfs_files(
+            old_file_paths = set(row[0] for row in results)
+            new_files = self.list_hdfs_files(
                 self.get_table_location(hive_table_model.db_name,
                                         hive_table_model.table_name))
 
-            new_data_exists = False
-            for file_path in new_file_paths:
-                if file_path not in old_file_paths:
-                    # Updates the tracking table with new file paths.
-                    new_data_exists = True
-                    logger.debug("Found new data at file path %s", file_path)
-                    query = "INSERT INTO {0} (table_name,file_path," \
-                            "gcs_copy_status,bq_job_id,bq_job_retries," \
-                            "bq_job_status) VALUES('{1}','{2}','TODO','TODO'," \
-                            "0,'TODO')".format(
-                                hive_table_model.tracking_table_name,
-                                hive_table_model.table_name, file_path)
-                    mysql_component.execute_transaction(query)
+            values_list = []
+            for hdfs_file in new_files:
+                if hdfs_file.path not in old_file_paths:
+                    logger.debug("Found new data at file path %s",
+                                 hdfs_file.path)
+                    values_list.append((hive_table_model.table_name,
+                                        hdfs_file.path, hdfs_file.size))
+            new_data_exists = bool(values_list)
+            # Updates the tracking table with new file paths.
+            query = "INSERT INTO {0} (table_name,file_path,file_size," \
+                    "gcs_copy_status,bq_job_id,bq_job_retries," \
+                    "bq_job_status) VALUES(%s,%s,%s,'TODO','TODO',0," \
+                    "'TODO')".format(
+                        hive_table_model.tracking_table_name)
+            mysql_component.execute_many(query, values_list)
             # Copies the new files to GCS.
             if new_data_exists:
                 logger.info("New files found in source table")
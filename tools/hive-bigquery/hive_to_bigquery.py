@@ -15,6 +15,7 @@
 """Main Module to migrate Hive tables to BigQuery."""
 
 import logging
+import threading
 
 from google.api_core import exceptions
 
@@ -28,6 +29,8 @@ import kms_component
 from mysql_component import MySQLComponent
 from properties_reader import PropertiesReader
 from resource_validator import ResourceValidator
+from row_count_validator import RowCountValidator
+from table_migration_driver import TableMigrationDriver
 import init_script
 
 logger = logging.getLogger('Hive2BigQuery')
@@ -39,9 +42,11 @@ def compare_row_counts(bq_component, hive_component, gcs_component,
 
      Once all the load jobs are finished, queries on the Hive and BigQuery
      tables and compares the number of rows. If matches, calls the function
-     to write comparison metrics to BigQuery. If there is a mismatch in case
-     of a partition table, compares the number of rows in every partition and
-     gets information about the mismatched partitions.
+     to write comparison metrics to BigQuery, including the per-column
+     aggregates if enabled. If there is a mismatch in case of a partition
+     table, compares the number of rows in every partition with one grouped
+     query on each table and gets information about the mismatched
+     partitions.
 
      Args:
         bq_component (:class:`BigQueryComponent`): Instance of
@@ -61,40 +66,35 @@ def compare_row_counts(bq_component, hive_component, gcs_component,
     bq_table_rows = bq_component.get_bq_table_row_count(bq_table_model)
     logger.debug("BigQuery row count %s Hive table row count %s", bq_table_rows,
                  hive_table_rows)
+    validator = RowCountValidator(bq_component, hive_component,
+                                  hive_table_model, bq_table_model)
 
     if hive_table_rows == bq_table_rows:
         logger.info("Number of rows matching in BigQuery and Hive tables")
         if PropertiesReader.get('create_validation_table'):
-            bq_component.write_metrics_to_bigquery(gcs_component,
-                                                   hive_table_model, bq_table_model)
+            column_aggregates = None
+            if PropertiesReader.get('validate_column_aggregates'):
+                logger.info("Comparing column aggregates...")
+                column_aggregates = validator.get_column_aggregates()
+            bq_component.write_metrics_to_bigquery(
+                gcs_component, hive_table_model, bq_table_model,
+                column_aggregates)
 
     else:
         logger.error("Number of rows not matching in BigQuery and Hive tables")
         # If table is partitioned, compares rows in each partition and
         # provide suggestions whether to redo that partition.
         if hive_table_model.is_partitioned:
-            partition_data = hive_component.list_partitions(
-                hive_table_model.db_name, hive_table_model.table_name)
-            for data in partition_data:
+            for data in validator.find_mismatched_partitions():
                 clause = data['clause']
-                bq_table_rows = bq_component.get_bq_table_row_count(
-                    bq_table_model, clause)
-                hive_table_rows = hive_component.get_hive_table_row_count(
-                    hive_table_model, clause)
                 logger.debug("BigQuery row count %s Hive table row count %s",
-                             bq_table_rows, hive_table_rows)
-
-                if bq_table_rows == hive_table_rows:
-                    logger.debug(
-                        "Number of rows matching in BigQuery and Hive tables %s",
-                        clause)
-                else:
-                    logger.error(
-                        "Number of rows not matching in BigQuery and Hive "
-                        "tables {}".format(clause))
-                    logger.error(
-                        "You may want to delete data {} and reload it".format(
-                            clause))
+                             data['bq_rows'], data['hive_rows'])
+                logger.error(
+                    "Number of rows not matching in BigQuery and Hive "
+                    "tables {}".format(clause))
+                logger.error(
+                    "You may want to delete data {} and reload it".format(
+                        clause))
         else:
             logger.error(
                 "You may want to redo the migration since number of rows are "
@@ -145,6 +145,14 @@ def initialize_components():
         password=None,
         database=None)
 
+    # Bounds the distcp copies and load jobs of all the migrated tables.
+    if PropertiesReader.get('distcp_slots'):
+        gcs_component.distcp_slots = threading.BoundedSemaphore(
+            PropertiesReader.get('distcp_slots'))
+    if PropertiesReader.get('bq_load_job_slots'):
+        bq_component.load_job_slots = threading.BoundedSemaphore(
+            PropertiesReader.get('bq_load_job_slots'))
+
     return gcs_component, mysql_component, bq_component, hive_component
 
 
@@ -152,7 +160,8 @@ def main():
     """Migrates Hive tables to BigQuery.
 
     Establishes connection to Hive, MySQL, GCS and BigQuery. Validates the
-    user arguments and continues migration from the previous runs, if any.
+    user arguments and migrates the Hive table, or the Hive tables matching
+    the given names or patterns concurrently.
     """
 
     try:
@@ -175,6 +184,40 @@ def main():
     except (exceptions.NotFound, custom_exceptions.MySQLExecutionError) as error:
         raise RuntimeError from error
 
+    if PropertiesReader.get('hive_table_patterns'):
+        try:
+            TableMigrationDriver(
+                migrate_table, gcs_component, mysql_component, bq_component,
+                hive_component, PropertiesReader.get('max_parallel_tables')
+            ).run(PropertiesReader.get('hive_database'),
+                  PropertiesReader.get('hive_table_patterns'),
+                  PropertiesReader.get('incremental_cols'),
+                  PropertiesReader.get('incremental_col'))
+        except custom_exceptions.HiveExecutionError as error:
+            raise RuntimeError from error
+    else:
+        migrate_table(gcs_component, mysql_component, bq_component,
+                      hive_component)
+
+
+def migrate_table(gcs_component, mysql_component, bq_component,
+                  hive_component):
+    """Migrates the Hive table set in the Properties Reader to BigQuery.
+
+    Validates the resources of the table and continues migration from the
+    previous runs, if any.
+
+    Args:
+        gcs_component (:class:`GCSStorageComponent`): Instance of
+            GCSStorageComponent to do GCS operations.
+        mysql_component (:class:`MySQLComponent`): Instance of MySQLComponent
+            to connect to MySQL.
+        bq_component (:class:`BigQueryComponent`): Instance of
+            BigQueryComponent to do BigQuery operations.
+        hive_component (:class:`HiveComponent`): Instance of HiveComponent to
+            connect to Hive.
+    """
+
     try:
         # Validates the user provided resources.
         logger.debug("Validating the resources")
@@ -274,8 +317,8 @@ def main():
             gcs_component.stage_to_gcs(mysql_component, bq_component,
                                        hive_table_model, bq_table_model,
                                        PropertiesReader.get('gcs_bucket_name'))
-            bq_component.load_gcs_to_bq(mysql_component, hive_table_model,
-                                        bq_table_model)
+            bq_component.load_gcs_to_bq(mysql_component, gcs_component,
+                                        hive_table_model, bq_table_model)
             bq_component.update_bq_job_status(mysql_component, gcs_component,
                                               hive_table_model, bq_table_model,
                                               PropertiesReader.get(
@@ -22,6 +22,7 @@ import re
 from google.api_core import exceptions
 
 import custom_exceptions
+from hdfs_component import HDFS_COMPONENTS
 
 TIME_FORMAT = datetime.datetime.now().strftime("%Y_%m_%d_%H_%M_%S_%f")
 LOG_FILE_NAME = "hive_bq_migration_{}.log".format(TIME_FORMAT)
@@ -89,6 +90,43 @@ def validate_bq_table_name(table_name):
         raise exceptions.BadRequest(error_msg)
 
 
+def is_multi_table(hive_table):
+    """Checks whether the Hive table setting names several tables, either as
+    a list of names or as a pattern."""
+
+    return isinstance(hive_table, list) or '*' in hive_table or \
+        '?' in hive_table
+
+
+def table_properties(hive_table, bq_table=None, incremental_col=None):
+    """Returns the properties of one of the Hive tables to migrate.
+
+    Args:
+        hive_table (str): Hive table name.
+        bq_table (str): BigQuery table name. Defaults to the Hive table name.
+        incremental_col (str): Incremental column of the Hive table, if any.
+
+    Returns:
+        dict: Table properties, to be set in the Properties Reader.
+    """
+
+    hive_table = hive_table.lower()
+    if bq_table is None:
+        bq_table = hive_table
+
+    validate_bq_table_name(bq_table)
+
+    return {
+        "hive_table_name": hive_table,
+        "bq_table": bq_table,
+        "incremental_col": incremental_col,
+        "hive_bq_comparison_csv": "{}_metrics_hive_bq_{}.csv".format(
+            hive_table, TIME_FORMAT),
+        "hive_bq_comparison_table": "{}_metrics_hive_bq_{}".format(
+            hive_table, TIME_FORMAT)
+    }
+
+
 def validate_config_parameters(data):
     """Checks for all the parameters in the input configuration file and
     validates them."""
@@ -121,15 +159,57 @@ def validate_config_parameters(data):
         kms_crypto_key_id = data['KMS']['crypto_key_id']
 
         create_validation_table = data['create_validation_table']
+        validate_column_aggregates = data.get('validate_column_aggregates',
+                                              False)
+
+        # The pipelined migration of partition tables is optional.
+        pipeline = data.get('Pipeline', {})
+        use_migration_pipeline = pipeline.get('enabled', False)
+        hive_stage_workers = pipeline.get('hive_stage_workers', 2)
+        distcp_workers = pipeline.get('distcp_workers', 4)
+        bq_load_workers = pipeline.get('bq_load_workers', 2)
+
+        # The HDFS client to list the data files of Hive tables is optional.
+        hdfs = data.get('HDFS', {})
+        hdfs_client = hdfs.get('client', 'cli')
+        hdfs_user = hdfs.get('user')
+        webhdfs_url = hdfs.get('webhdfs_url')
+
+        # Migrating several tables in parallel is optional.
+        parallel = data.get('Parallel', {})
+        max_parallel_tables = parallel.get('max_tables', 4)
+        distcp_slots = parallel.get('distcp_slots')
+        bq_load_job_slots = parallel.get('bq_load_job_slots')
 
     except KeyError:
         raise
 
-    hive_table = hive_table.lower()
-    if bq_table is None:
-        bq_table = hive_table
-
-    validate_bq_table_name(bq_table)
+    # Several tables are migrated if the table is a list of names or
+    # patterns, in which case every table is loaded into the BigQuery table
+    # of the same name and the incremental column can be set per table.
+    hive_table_patterns = None
+    incremental_cols = {}
+    if is_multi_table(hive_table):
+        if bq_table is not None:
+            raise ValueError("BigQuery table name can't be set when migrating "
+                             "several Hive tables")
+        if isinstance(hive_table, list):
+            hive_table_patterns = [name.lower() for name in hive_table]
+        else:
+            hive_table_patterns = [hive_table.lower()]
+        if isinstance(incremental_col, dict):
+            incremental_cols = dict(
+                (name.lower(), col) for name, col in incremental_col.items())
+            incremental_col = None
+        properties = {
+            "hive_table_name": None,
+            "bq_table": None,
+            "incremental_col": incremental_col,
+            "hive_bq_comparison_csv": None,
+            "hive_bq_comparison_table": None
+        }
+    else:
+        properties = table_properties(hive_table, bq_table, incremental_col)
 
     if not isinstance(hive_port, int):
         raise TypeError("Hive port must be an integer")
@@ -137,6 +217,26 @@ def validate_config_parameters(data):
     if not isinstance(tracking_db_port,int):
         raise TypeError("Tracking database port must be an integer")
 
+    for n_workers in [hive_stage_workers, distcp_workers, bq_load_workers]:
+        if not isinstance(n_workers, int) or n_workers < 1:
+            raise ValueError("Number of pipeline workers must be a positive "
+                             "integer")
+
+    if not isinstance(max_parallel_tables, int) or max_parallel_tables < 1:
+        raise ValueError("Maximum number of parallel tables must be a positive "
+                         "integer")
+    for n_slots in [distcp_slots, bq_load_job_slots]:
+        if n_slots is not None and (not isinstance(n_slots, int) or
+                                    n_slots < 1):
+            raise ValueError("Number of distcp and BigQuery load job slots "
+                             "must be a positive integer")
+
+    if hdfs_client not in HDFS_COMPONENTS:
+        raise ValueError("HDFS client must be one of {}".format(
+            ", ".join(sorted(HDFS_COMPONENTS))))
+    if hdfs_client == 'webhdfs' and not webhdfs_url:
+        raise ValueError("WebHDFS URL is required to use the webhdfs client")
+
     if gcs_bucket_name.startswith('gs://'):
         gcs_bucket_name = gcs_bucket_name.split('gs://')[1]
     if gcs_bucket_name[-1] == '/':
@@ -147,9 +247,6 @@ def validate_config_parameters(data):
 
     bq_write_mode = bq_write_mode.lower()
 
-    hive_bq_comparison_csv = "{}_metrics_hive_bq_{}.csv".format(hive_table, TIME_FORMAT)
-    hive_bq_comparison_table = "{}_metrics_hive_bq_{}".format(hive_table, TIME_FORMAT)
-
     config = {
         "project_id": project_id,
         "gcs_bucket_name": gcs_bucket_name,
@@ -157,10 +254,9 @@ def validate_config_parameters(data):
         "hive_server_port": hive_port,
         "hive_server_username": hive_user,
         "hive_database": hive_database,
-        "hive_table_name": hive_table,
-        "incremental_col": incremental_col,
+        "hive_table_patterns": hive_table_patterns,
+        "incremental_cols": incremental_cols,
         "dataset_id": bq_dataset,
-        "bq_table": bq_table,
         "bq_table_write_mode": bq_write_mode,
         "use_clustering": use_clustering,
         "tracking_database_host": tracking_db_host,
@@ -173,10 +269,20 @@ def validate_config_parameters(data):
         "key_ring_id": kms_key_ring_id,
         "crypto_key_id": kms_crypto_key_id,
         "create_validation_table": create_validation_table,
-        "hive_bq_comparison_csv": hive_bq_comparison_csv,
-        "hive_bq_comparison_table": hive_bq_comparison_table,
+        "validate_column_aggregates": validate_column_aggregates,
+        "use_migration_pipeline": use_migration_pipeline,
+        "hive_stage_workers": hive_stage_workers,
+        "distcp_workers": distcp_workers,
+        "bq_load_workers": bq_load_workers,
+        "hdfs_client": hdfs_client,
+        "hdfs_user": hdfs_user,
+        "webhdfs_url": webhdfs_url,
+        "max_parallel_tables": max_parallel_tables,
+        "distcp_slots": distcp_slots,
+        "bq_load_job_slots": bq_load_job_slots,
         "log_file_name": LOG_FILE_NAME
     }
+    config.update(properties)
 
     return config
 
@@ -0,0 +1,292 @@
+# Copyright 2019 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to watch the BigQuery load jobs of a migration until they finish,
+re-submitting the failed ones and recording the outcome in the tracking
+table."""
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import time
+from uuid import uuid4
+
+from utilities import calculate_time
+
+logger = logging.getLogger('Hive2BigQuery')
+
+# Update this value to increase the maximum number of load job retries.
+BQ_LOAD_JOB_MAX_RETRIES = 3
+
+
+class LoadJobWatcher(object):
+    """Watches running BigQuery load jobs until all of them finish.
+
+    The jobs are checked concurrently. The wait between two checks starts at
+    min_poll_interval, is doubled after every check in which no job finished
+    up to max_poll_interval, and goes back to min_poll_interval as soon as a
+    job finishes, so that small loads are noticed within seconds.
+
+    A load job loads a group of files, which share its job ID in the
+    tracking table. A failed job of more than one file is split in two
+    halves which are re-submitted right away, so that a bad file ends up in
+    a job of its own without failing the other files of its group. A failed
+    job of a single file is re-submitted until it has been retried
+    BQ_LOAD_JOB_MAX_RETRIES times, after which it is marked FAILED.
+
+    Attributes:
+        bq_component (:class:`BigQueryComponent`): Instance of
+            BigQueryComponent to do BigQuery operations.
+        mysql_component (:class:`MySQLComponent`): Instance of MySQLComponent
+            to connect to MySQL.
+        gcs_component (:class:`GCSStorageComponent`): Instance of
+            GCSStorageComponent to do GCS operations.
+        hive_table_model (:class:`HiveTableModel`): Wrapper to Hive table
+            details.
+        bq_table_model (:class:`BigQueryTableModel`): Wrapper to BigQuery
+            table details.
+        gcs_bucket_name (str): GCS bucket name.
+        workers (int): Number of jobs which are checked concurrently.
+        min_poll_interval (float): Minimum wait in seconds between two checks.
+        max_poll_interval (float): Maximum wait in seconds between two checks.
+        latencies (dict): Time taken in seconds by every successful job, from
+            its creation till its end, keyed by job ID.
+    """
+
+    def __init__(self, bq_component, mysql_component, gcs_component,
+                 hive_table_model, bq_table_model, gcs_bucket_name, workers=8,
+                 min_poll_interval=1, max_poll_interval=60):
+
+        logger.debug("Initializing Load Job Watcher")
+        self.bq_component = bq_component
+        self.mysql_component = mysql_component
+        self.gcs_component = gcs_component
+        self.hive_table_model = hive_table_model
+        self.bq_table_model = bq_table_model
+        self.gcs_bucket_name = gcs_bucket_name
+        self.workers = workers
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.latencies = {}
+
+    def get_running_jobs(self):
+        """Fetches the jobs which are RUNNING from the tracking table.
+
+        Returns:
+            dict: GCS URIs of the files and bq_job_retries of every job, keyed
+                by job ID.
+        """
+
+        logger.info(
+            "Fetching information about BigQuery load jobs from tracking "
+            "table...")
+        query = "SELECT gcs_file_path,bq_job_id,bq_job_retries FROM {} WHERE " \
+                "bq_job_status='RUNNING'".format(
+                    self.hive_table_model.tracking_table_name)
+        results = self.mysql_component.execute_query(query)
+        running_jobs = {}
+        for gcs_file_path, bq_job_id, bq_job_retries in results:
+            gcs_file_paths, retries = running_jobs.get(bq_job_id, ([], 0))
+            gcs_file_paths.append(gcs_file_path)
+            running_jobs[bq_job_id] = (gcs_file_paths,
+                                       max(retries, bq_job_retries))
+        return running_jobs
+
+    def get_job(self, bq_job_id):
+        """Gets information about a load job.
+
+        Args:
+            bq_job_id (str): BigQuery job ID.
+
+        Returns:
+            google.cloud.bigquery.job.LoadJob: Load job.
+        """
+
+        return self.bq_component.client.get_job(
+            bq_job_id, location=self.bq_component.get_dataset_location(
+                self.bq_table_model.dataset_id))
+
+    def submit_job(self, bq_job_id, gcs_file_paths):
+        """Re-submits the files of a failed load job with a new job ID.
+
+        Args:
+            bq_job_id (str): ID of the failed job.
+            gcs_file_paths (List[str]): GCS URIs of the files to load.
+
+        Returns:
+            str: ID of the new job, or None if it could not be started.
+        """
+
+        new_job_id = "hive2bq-job-{}".format(uuid4())
+        try:
+            self.bq_component.start_load_job(self.bq_table_model,
+                                             gcs_file_paths, new_job_id)
+        except Exception as error:
+            logger.error("Failed to re-submit BigQuery job %s", bq_job_id,
+                         exc_info=error)
+            return None
+        logger.info("Re-submitted {} files of BigQuery job {} as {}".format(
+            len(gcs_file_paths), bq_job_id, new_job_id))
+        return new_job_id
+
+    def delete_file(self, gcs_file_path):
+        """Deletes the data file of a successful job in GCS.
+
+        Args:
+            gcs_file_path (str): GCS URI of the file.
+        """
+
+        self.gcs_component.delete_file(self.gcs_bucket_name, gcs_file_path)
+
+    def handle_finished_jobs(self, pool, finished_jobs, running_jobs):
+        """Records the outcome of the finished jobs in the tracking table.
+
+        Successful jobs are marked DONE and their files are deleted in GCS.
+        Failed jobs are split or re-submitted and their files keep the
+        RUNNING status with the new job IDs, unless they ran out of retries,
+        in which case they are marked FAILED. Files of a failed job which
+        can't be re-submitted are marked TODO, so that they are loaded again
+        in the next run.
+
+        Args:
+            pool (ThreadPoolExecutor): Pool to re-submit jobs and delete
+                files in.
+            finished_jobs (List[google.cloud.bigquery.job.LoadJob]): Jobs
+                which are DONE.
+            running_jobs (dict): Jobs being watched, keyed by job ID.
+                Re-submitted jobs are added to it.
+        """
+
+        done_jobs = []
+        done_files = []
+        failed_jobs = []
+        to_submit = []
+        for job in finished_jobs:
+            gcs_file_paths, bq_job_retries = running_jobs[job.job_id]
+            if job.errors is None:
+                done_jobs.append((job.job_id,))
+                done_files.extend(gcs_file_paths)
+                if job.created and job.ended:
+                    self.latencies[job.job_id] = (
+                        job.ended - job.created).total_seconds()
+                logger.info(
+                    "BigQuery job {} of {} files finished - Time taken - "
+                    "{}".format(job.job_id, len(gcs_file_paths), calculate_time(
+                        0, self.latencies.get(job.job_id, 0))))
+            elif len(gcs_file_paths) > 1:
+                # Splitting a group is not a retry of its files.
+                middle = len(gcs_file_paths) // 2
+                logger.info(
+                    "BigQuery job {} of {} files failed. Splitting it in two "
+                    "jobs".format(job.job_id, len(gcs_file_paths)))
+                to_submit.append((job.job_id, gcs_file_paths[:middle],
+                                  bq_job_retries))
+                to_submit.append((job.job_id, gcs_file_paths[middle:],
+                                  bq_job_retries))
+            elif bq_job_retries >= BQ_LOAD_JOB_MAX_RETRIES:
+                failed_jobs.append((job.job_id,))
+                logger.info(
+                    "BigQuery job {} failed. Tried for a maximum of {} times. "
+                    "Updating status RUNNING --> FAILED".format(
+                        job.job_id, BQ_LOAD_JOB_MAX_RETRIES))
+            else:
+                logger.info(
+                    "BigQuery job {} failed. Retry {} of {}".format(
+                        job.job_id, bq_job_retries + 1,
+                        BQ_LOAD_JOB_MAX_RETRIES))
+                to_submit.append((job.job_id, gcs_file_paths,
+                                  bq_job_retries + 1))
+
+        new_job_ids = pool.map(
+            lambda args: self.submit_job(args[0], args[1]), to_submit)
+        submitted_files = []
+        todo_files = []
+        for (_, gcs_file_paths, bq_job_retries), new_job_id in zip(
+                to_submit, new_job_ids):
+            if new_job_id is None:
+                todo_files.extend((bq_job_retries, gcs_file_path)
+                                  for gcs_file_path in gcs_file_paths)
+            else:
+                submitted_files.extend((new_job_id, bq_job_retries,
+                                        gcs_file_path)
+                                       for gcs_file_path in gcs_file_paths)
+                running_jobs[new_job_id] = (gcs_file_paths, bq_job_retries)
+
+        # Updates the status of all the finished jobs in one transaction.
+        tracking_table_name = self.hive_table_model.tracking_table_name
+        with self.mysql_component.transaction() as cursor:
+            if done_jobs:
+                cursor.executemany(
+                    "UPDATE {0} SET bq_job_status='DONE' WHERE "
+                    "bq_job_id=%s".format(tracking_table_name), done_jobs)
+            if failed_jobs:
+                cursor.executemany(
+                    "UPDATE {0} SET bq_job_status='FAILED' WHERE "
+                    "bq_job_id=%s".format(tracking_table_name), failed_jobs)
+            if submitted_files:
+                cursor.executemany(
+                    "UPDATE {0} SET bq_job_id=%s,bq_job_retries=%s WHERE "
+                    "gcs_file_path=%s".format(tracking_table_name),
+                    submitted_files)
+            if todo_files:
+                cursor.executemany(
+                    "UPDATE {0} SET bq_job_status='TODO',bq_job_retries=%s "
+                    "WHERE gcs_file_path=%s".format(tracking_table_name),
+                    todo_files)
+
+        # Deletes the data files of the successful jobs in GCS.
+        list(pool.map(self.delete_file, done_files))
+        for job in finished_jobs:
+            del running_jobs[job.job_id]
+
+    def run(self):
+        """Watches the RUNNING jobs of the tracking table until they finish."""
+
+        running_jobs = self.get_running_jobs()
+        if not running_jobs:
+            logger.info(
+                "No BigQuery job is in RUNNING state. No values to update")
+            return
+
+        start = time.time()
+        poll_interval = self.min_poll_interval
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while running_jobs:
+                jobs = list(pool.map(self.get_job, list(running_jobs)))
+                finished_jobs = [job for job in jobs if job.state == 'DONE']
+                for job in jobs:
+                    if job.state != 'DONE':
+                        logger.debug("job id %s job state %s", job.job_id,
+                                     job.state)
+                if finished_jobs:
+                    self.handle_finished_jobs(pool, finished_jobs,
+                                              running_jobs)
+                    poll_interval = self.min_poll_interval
+                elif running_jobs:
+                    poll_interval = min(poll_interval * 2,
+                                        self.max_poll_interval)
+                if running_jobs:
+                    logger.info("{} BigQuery jobs are running. Waiting for {} "
+                                "sec..".format(len(running_jobs),
+                                               poll_interval))
+                    time.sleep(poll_interval)
+
+        if self.latencies:
+            latencies = sorted(self.latencies.values())
+            logger.info(
+                "{} BigQuery load jobs finished - Median time taken - {} - "
+                "Max time taken - {} - Total time waited - {}".format(
+                    len(latencies),
+                    calculate_time(0, latencies[len(latencies) // 2]),
+                    calculate_time(0, latencies[-1]),
+                    calculate_time(start, time.time())))
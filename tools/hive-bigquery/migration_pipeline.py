@@ -0,0 +1,235 @@
+# Copyright 2019 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to migrate the partitions of a Hive table in a pipeline, so that
+staging, copying to GCS and loading to BigQuery of different partitions
+overlap."""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import logging
+import threading
+import time
+
+from utilities import calculate_time
+
+logger = logging.getLogger('Hive2BigQuery')
+
+# Stages that a partition goes through in the pipeline.
+HIVE_STAGE = 'hive_stage'
+DISTCP = 'distcp'
+BQ_LOAD = 'bq_load'
+
+
+class MigrationPipeline(object):
+    """Migrates partitions with a bounded worker pool for every stage.
+
+    A partition is staged in Hive, its files are copied to GCS with distcp and
+    the BigQuery load jobs for them are started, each stage in its own worker
+    pool. While partition N is being copied, partition N+1 is being staged
+    and the load jobs of partition N-1 are being started. Every stage reads
+    and updates the same tracking table states as the serial migration, so
+    an interrupted run is resumed in the same way.
+
+    Attributes:
+        hive_component (:class:`HiveComponent`): Instance of HiveComponent
+            whose connection parameters are used to connect the Hive workers.
+        mysql_component (:class:`MySQLComponent`): Instance of MySQLComponent
+            to connect to MySQL.
+        bq_component (:class:`BigQueryComponent`): Instance of
+            BigQueryComponent to do BigQuery operations.
+        gcs_component (:class:`GCSStorageComponent`): Instance of
+            GCSStorageComponent to do GCS operations.
+        hive_table_model (:class:`HiveTableModel`): Wrapper to Hive table
+            details.
+        bq_table_model (:class:`BigQueryTableModel`): Wrapper to BigQuery
+            table details.
+        gcs_bucket_name (str): GCS bucket name.
+        workers (dict): Number of workers of every stage.
+        max_staged_partitions (int): Maximum number of partitions which are
+            being staged or have been staged but not yet copied to GCS.
+    """
+
+    def __init__(self, hive_component, mysql_component, bq_component,
+                 gcs_component, hive_table_model, bq_table_model,
+                 gcs_bucket_name, hive_stage_workers=2, distcp_workers=4,
+                 bq_load_workers=2):
+
+        logger.debug("Initializing Migration Pipeline")
+        self.hive_component = hive_component
+        self.mysql_component = mysql_component
+        self.bq_component = bq_component
+        self.gcs_component = gcs_component
+        self.hive_table_model = hive_table_model
+        self.bq_table_model = bq_table_model
+        self.gcs_bucket_name = gcs_bucket_name
+        self.workers = {
+            HIVE_STAGE: hive_stage_workers,
+            DISTCP: distcp_workers,
+            BQ_LOAD: bq_load_workers
+        }
+        # Stages one batch of partitions ahead of the distcp workers, without
+        # filling HDFS with staging tables which are waiting to be copied.
+        self.max_staged_partitions = hive_stage_workers + distcp_workers
+        self._local = threading.local()
+        self._hive_components = []
+        self._hive_components_lock = threading.Lock()
+
+    def get_hive_component(self):
+        """Gets the Hive component of the current worker thread.
+
+        A Hive connection can't be shared between threads, so every Hive
+        worker connects with the parameters of hive_component.
+
+        Returns:
+            :class:`HiveComponent`: Hive component of the worker thread.
+        """
+
+        if not hasattr(self._local, 'hive_component'):
+            self._local.hive_component = type(self.hive_component)(
+                host=self.hive_component.host,
+                port=self.hive_component.port,
+                user=self.hive_component.user,
+                password=self.hive_component.password,
+                database=self.hive_component.database)
+            with self._hive_components_lock:
+                self._hive_components.append(self._local.hive_component)
+        return self._local.hive_component
+
+    def stage_partition(self, row):
+        """Stages a partition in Hive and lists its files.
+
+        Args:
+            row (tuple): Row of the partition from the tracking table.
+
+        Returns:
+            str: Staging table name of the partition.
+        """
+
+        return self.get_hive_component().stage_partition(
+            self.mysql_component, self.hive_table_model, row)
+
+    def copy_partition(self, table_name):
+        """Copies the staged files of a partition to GCS.
+
+        Args:
+            table_name (str): Staging table name of the partition.
+
+        Returns:
+            str: Staging table name of the partition.
+        """
+
+        self.gcs_component.stage_to_gcs(
+            self.mysql_component, self.bq_component, self.hive_table_model,
+            self.bq_table_model, self.gcs_bucket_name, table_name=table_name,
+            load_to_bq=False)
+        return table_name
+
+    def load_partition(self, table_name):
+        """Starts the BigQuery load jobs for the copied files of a partition.
+
+        Args:
+            table_name (str): Staging table name of the partition.
+
+        Returns:
+            str: Staging table name of the partition.
+        """
+
+        self.bq_component.load_gcs_to_bq(
+            self.mysql_component, self.gcs_component, self.hive_table_model,
+            self.bq_table_model, table_name=table_name)
+        return table_name
+
+    def run(self, table_data):
+        """Migrates the partitions in the pipeline.
+
+        Inserts a row for every partition in the tracking table and pushes
+        the partitions which are yet to be staged through the pipeline. Once
+        a stage fails, no more partitions are staged, the partitions already
+        in the pipeline are finished and the first error is raised.
+
+        Args:
+            table_data (List): Information of the partitions to migrate.
+        """
+
+        # Inserts a row in the tracking table for every partition.
+        self.hive_component.insert_pending_partitions(
+            self.mysql_component, self.hive_table_model, table_data)
+        pending = list(self.hive_component.get_pending_partitions(
+            self.mysql_component, self.hive_table_model))
+        pending.reverse()
+        logger.info("Migrating {} partitions in a pipeline with {} Hive "
+                    "staging, {} distcp and {} BigQuery load workers".format(
+                        len(pending), self.workers[HIVE_STAGE],
+                        self.workers[DISTCP], self.workers[BQ_LOAD]))
+
+        stage_functions = {
+            HIVE_STAGE: self.stage_partition,
+            DISTCP: self.copy_partition,
+            BQ_LOAD: self.load_partition
+        }
+        next_stage = {HIVE_STAGE: DISTCP, DISTCP: BQ_LOAD, BQ_LOAD: None}
+        pools = dict(
+            (stage, ThreadPoolExecutor(max_workers=n_workers))
+            for stage, n_workers in self.workers.items())
+        in_flight = {}
+        n_staged = 0
+        n_migrated = 0
+        errors = []
+        start = time.time()
+
+        def submit(stage, item):
+            future = pools[stage].submit(stage_functions[stage], item)
+            in_flight[future] = (stage, item, time.time())
+
+        try:
+            while True:
+                # Stages more partitions while there is room in the pipeline.
+                while pending and not errors and \
+                        n_staged < self.max_staged_partitions:
+                    submit(HIVE_STAGE, pending.pop())
+                    n_staged += 1
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, item, stage_start = in_flight.pop(future)
+                    # A partition leaves the staged partitions once it has
+                    # been copied or has failed to be staged.
+                    if stage == DISTCP or (
+                            stage == HIVE_STAGE and future.exception()):
+                        n_staged -= 1
+                    error = future.exception()
+                    if error:
+                        logger.error("Stage %s failed for %s", stage, item,
+                                     exc_info=error)
+                        errors.append(error)
+                        continue
+                    table_name = future.result()
+                    logger.debug("Stage %s finished for %s - Time taken - %s",
+                                 stage, table_name,
+                                 calculate_time(stage_start, time.time()))
+                    if next_stage[stage]:
+                        submit(next_stage[stage], table_name)
+                    else:
+                        n_migrated += 1
+        finally:
+            for pool in pools.values():
+                pool.shutdown()
+            for hive_component in self._hive_components:
+                hive_component.connection.close()
+
+        logger.info("Pipeline finished {} partitions - Time taken - {}".format(
+            n_migrated, calculate_time(start, time.time())))
+        if errors:
+            raise errors[0]
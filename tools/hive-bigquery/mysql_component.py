@@ -14,7 +14,9 @@
 
 """Module to handle MySQL related utilities."""
 
+from contextlib import contextmanager
 import logging
+import threading
 
 import pymysql
 
@@ -24,6 +26,17 @@ from properties_reader import PropertiesReader
 
 logger = logging.getLogger('Hive2BigQuery')
 
+# Indexes of the tracking table, which is looked up by these columns when
+# updating the status of every file.
+TRACKING_TABLE_INDEXES = {
+    'idx_table_name': 'table_name',
+    'idx_file_path': 'file_path',
+    'idx_gcs_file_path': 'gcs_file_path',
+    'idx_bq_job_id': 'bq_job_id',
+    'idx_gcs_copy_status': 'gcs_copy_status',
+    'idx_bq_job_status': 'bq_job_status'
+}
+
 
 class MySQLComponent(DatabaseComponent):
     """MySQL component to handle functions related to it.
@@ -40,12 +53,15 @@ class MySQLComponent(DatabaseComponent):
         port (int): Port to be used.
         connection (pymysql.connections.Connection): Connection to Cloud SQL
         instance.
+        lock (threading.RLock): Serializes the use of the connection, which
+            is shared by the worker threads of a pipelined migration.
 
     """
 
     def __init__(self, **kwargs):
 
         logger.debug("Initializing Cloud SQL Component")
+        self.lock = threading.RLock()
         super(MySQLComponent, self).__init__(**kwargs)
 
     def __str__(self):
@@ -82,37 +98,77 @@ class MySQLComponent(DatabaseComponent):
         cursor = self.connection.cursor()
         return cursor
 
-    def execute_transaction(self, query):
+    @contextmanager
+    def transaction(self):
+        """Runs the statements executed on the yielded cursor in a single
+        transaction, which is committed at the end of the with block.
+
+        Yields:
+            pymysql.cursors.Cursor: pymysql cursor object.
+        """
+
+        with self.lock:
+            cursor = self.get_cursor()
+            try:
+                yield cursor
+                self.connection.commit()
+            except pymysql.err.OperationalError as error:
+                self.connection.rollback()
+                logger.error("Failed to commit transaction to Cloud SQL table")
+                raise custom_exceptions.MySQLExecutionError from error
+
+    def execute_transaction(self, query, values=None):
         """Executes a transaction and commits to the database.
 
         Args:
             query (str): Transaction query to be executed.
+            values (tuple): Values of the %s placeholders in the query, if any.
         """
 
         try:
-            cursor = self.get_cursor()
-            cursor.execute(query)
-            self.connection.commit()
+            with self.lock:
+                cursor = self.get_cursor()
+                cursor.execute(query, values)
+                self.connection.commit()
         except pymysql.err.OperationalError as error:
-            self.connection.rollback()
+            with self.lock:
+                self.connection.rollback()
             logger.error("Failed to commit transaction {} to Cloud SQL "
                          "table".format(query))
             raise custom_exceptions.MySQLExecutionError from error
 
-    def execute_query(self, query):
+    def execute_many(self, query, values_list):
+        """Executes a query for every set of values with a single commit.
+
+        Multiple row INSERT statements are sent to the database in bulk.
+
+        Args:
+            query (str): Transaction query with %s placeholders.
+            values_list (List[tuple]): Values of the placeholders for every
+                execution of the query.
+        """
+
+        if not values_list:
+            return
+        with self.transaction() as cursor:
+            cursor.executemany(query, values_list)
+
+    def execute_query(self, query, values=None):
         """Executes query and returns the results.
 
         Args:
             query (str): Query to be executed.
+            values (tuple): Values of the %s placeholders in the query, if any.
 
         Returns:
             List: Results of the query.
         """
 
-        cursor = self.get_cursor()
         try:
-            cursor.execute(query)
-            return cursor.fetchall()
+            with self.lock:
+                cursor = self.get_cursor()
+                cursor.execute(query, values)
+                return cursor.fetchall()
         except pymysql.err.OperationalError as error:
             logger.error("Failed in querying Cloud SQL table - {}".format(query))
             raise custom_exceptions.MySQLExecutionError from error
@@ -178,11 +234,11 @@ class MySQLComponent(DatabaseComponent):
 
         results = self.execute_query(
             "SELECT tracking_table_name,inc_col_present,inc_col_name,"
-            "inc_col_type from {} WHERE hive_database='{}' AND "
-            "hive_table='{}' AND bq_table='{}'".format(
-                PropertiesReader.get('tracking_metatable_name'),
-                hive_table_model.db_name, hive_table_model.table_name,
-                hive_table_model.bq_table_name))
+            "inc_col_type from {} WHERE hive_database=%s AND "
+            "hive_table=%s AND bq_table=%s".format(
+                PropertiesReader.get('tracking_metatable_name')),
+            (hive_table_model.db_name, hive_table_model.table_name,
+             hive_table_model.bq_table_name))
         if results:
             hive_table_model.is_first_run = False
             hive_table_model.tracking_table_name = results[0][0]
@@ -197,6 +253,48 @@ class MySQLComponent(DatabaseComponent):
         else:
             logger.debug(
                 "Tracking table %s found", hive_table_model.tracking_table_name)
+            # Tracking tables created by previous versions have no indexes
+            # and no file sizes.
+            self.create_tracking_table_indexes(
+                hive_table_model.tracking_table_name)
+            self.create_tracking_table_file_size_column(
+                hive_table_model.tracking_table_name)
+
+    def create_tracking_table_indexes(self, table_name):
+        """Adds the missing indexes to the tracking table.
+
+        Args:
+            table_name (str): Tracking table name.
+        """
+
+        results = self.execute_query("SHOW INDEX FROM {}".format(table_name))
+        # The third column of SHOW INDEX is the index name.
+        existing_indexes = set(row[2] for row in results)
+        missing_indexes = [
+            "ADD INDEX {} ({})".format(index_name, column)
+            for index_name, column in sorted(TRACKING_TABLE_INDEXES.items())
+            if index_name not in existing_indexes]
+        if missing_indexes:
+            self.execute_transaction("ALTER TABLE {} {}".format(
+                table_name, ",".join(missing_indexes)))
+            logger.debug("Added %d indexes to tracking table %s",
+                         len(missing_indexes), table_name)
+
+    def create_tracking_table_file_size_column(self, table_name):
+        """Adds the file_size column to the tracking table if it's missing.
+
+        Args:
+            table_name (str): Tracking table name.
+        """
+
+        results = self.execute_query(
+            "SHOW COLUMNS FROM {} LIKE 'file_size'".format(table_name))
+        if not results:
+            self.execute_transaction(
+                "ALTER TABLE {} ADD COLUMN file_size BIGINT COMMENT 'Size "
+                "of the HDFS file in bytes' AFTER file_path".format(table_name))
+            logger.debug("Added file_size column to tracking table %s",
+                         table_name)
 
     def update_tracking_meta_table(self, hive_table_model, mode):
         """Updates the tracking metatable with details of the Hive table."""
@@ -204,22 +302,23 @@ class MySQLComponent(DatabaseComponent):
         if mode == "INSERT":
             query = "INSERT INTO {} (hive_database,hive_table,bq_table," \
                     "tracking_table_name,inc_col_present,inc_col_name," \
-                    "inc_col_type) VALUES('{}','{}','{}','{}',{},'{}'," \
-                    "'{}')".format(
-                PropertiesReader.get('tracking_metatable_name'),
-                hive_table_model.db_name, hive_table_model.table_name,
-                hive_table_model.bq_table_name,
-                hive_table_model.tracking_table_name,
-                hive_table_model.is_inc_col_present, hive_table_model.inc_col,
-                hive_table_model.inc_col_type)
+                    "inc_col_type) VALUES(%s,%s,%s,%s,%s,%s,%s)".format(
+                PropertiesReader.get('tracking_metatable_name'))
+            # A missing incremental column is stored as the string 'None'.
+            values = (hive_table_model.db_name, hive_table_model.table_name,
+                      hive_table_model.bq_table_name,
+                      hive_table_model.tracking_table_name,
+                      hive_table_model.is_inc_col_present,
+                      str(hive_table_model.inc_col),
+                      str(hive_table_model.inc_col_type))
 
         if mode == "DELETE":
-            query = "DELETE FROM {} WHERE hive_database='{}' AND " \
-                    "hive_table='{}' AND bq_table='{}'".format(
-                PropertiesReader.get('tracking_metatable_name'),
-                hive_table_model.db_name, hive_table_model.table_name,
-                hive_table_model.bq_table_name)
-        self.execute_query(query)
+            query = "DELETE FROM {} WHERE hive_database=%s AND " \
+                    "hive_table=%s AND bq_table=%s".format(
+                PropertiesReader.get('tracking_metatable_name'))
+            values = (hive_table_model.db_name, hive_table_model.table_name,
+                      hive_table_model.bq_table_name)
+        self.execute_query(query, values)
 
     def create_tracking_table(self, hive_table_model):
         """Creates tracking table in CloudSQL instance.
@@ -247,6 +346,7 @@ class MySQLComponent(DatabaseComponent):
                 clause VARCHAR(255) COMMENT 'Clause used while loading data 
                 into staging table',
                 file_path VARCHAR(255) COMMENT 'HDFS file path',
+                file_size BIGINT COMMENT 'Size of the HDFS file in bytes',
                 gcs_copy_status VARCHAR(10) COMMENT 'Status of Hadoop distcp 
                 operation to copy the file to GCS',
                 gcs_file_path VARCHAR(255) COMMENT 'Path of the file copied 
@@ -262,6 +362,7 @@ class MySQLComponent(DatabaseComponent):
                 clause VARCHAR(255) COMMENT 'Clause used while loading data 
                 into staging table',
                 file_path VARCHAR(255) COMMENT 'HDFS file path',
+                file_size BIGINT COMMENT 'Size of the HDFS file in bytes',
                 gcs_copy_status VARCHAR(10) COMMENT 'Status of Hadoop distcp 
                 operation to copy the file to GCS',
                 gcs_file_path VARCHAR(255) COMMENT 'Path of the file copied 
@@ -273,5 +374,6 @@ class MySQLComponent(DatabaseComponent):
                 )""".format(hive_table_model.tracking_table_name)
 
         self.execute_query(query)
+        self.create_tracking_table_indexes(hive_table_model.tracking_table_name)
         logger.info("Tracking table {} is created".format(
             hive_table_model.tracking_table_name))
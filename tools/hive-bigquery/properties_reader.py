@@ -14,11 +14,19 @@
 
 """Properties Reader module."""
 
+import threading
+
 
 class PropertiesReader(object):
-    """Properties reader to read properties from a dictionary."""
+    """Properties reader to read properties from a dictionary.
+
+    Properties set with set_table_properties override the properties of the
+    dictionary in the calling thread only, so that the threads migrating
+    different tables read the properties of their own table.
+    """
 
     properties = ''
+    _local = threading.local()
 
     def __init__(self, config):
         PropertiesReader.properties = config
@@ -37,8 +45,22 @@ class PropertiesReader(object):
             str: value of the property.
         """
 
+        table_properties = getattr(PropertiesReader._local, 'properties', {})
+        if key in table_properties:
+            return table_properties[key]
         if key in PropertiesReader.properties:
             return PropertiesReader.properties[key]
         else:
             raise KeyError(
                 "Key {} is not present in Properties Reader".format(key))
+
+    @staticmethod
+    def set_table_properties(table_properties):
+        """Overrides properties in the calling thread.
+
+        Args:
+            table_properties (dict): Properties of the table migrated by the
+                calling thread, or None to remove the overrides.
+        """
+
+        PropertiesReader._local.properties = table_properties or {}
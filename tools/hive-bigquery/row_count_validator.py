@@ -0,0 +1,280 @@
+# Copyright 2019 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to validate the migrated data by comparing the row counts of every
+partition and per-column aggregates of the Hive and BigQuery tables, with a
+single grouped query on each side."""
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+logger = logging.getLogger('Hive2BigQuery')
+
+# Aggregates computed for every comparable column, and the Hive data types
+# they are computed for. Sums are restricted to the integer types whose sum
+# cannot overflow a BIGINT/INT64.
+COLUMN_AGGREGATES = [
+    ('COUNT', ['tinyint', 'smallint', 'int', 'bigint', 'string', 'varchar',
+               'date', 'boolean']),
+    ('MIN', ['tinyint', 'smallint', 'int', 'bigint', 'string', 'varchar',
+             'date', 'boolean']),
+    ('MAX', ['tinyint', 'smallint', 'int', 'bigint', 'string', 'varchar',
+             'date', 'boolean']),
+    ('SUM', ['tinyint', 'smallint', 'int']),
+]
+
+# BigQuery data types whose values, cast to strings, match those of the
+# corresponding Hive data types.
+COMPARABLE_TYPES = {
+    'tinyint': 'INTEGER',
+    'smallint': 'INTEGER',
+    'int': 'INTEGER',
+    'bigint': 'INTEGER',
+    'string': 'STRING',
+    'varchar': 'STRING',
+    'date': 'DATE',
+    'boolean': 'BOOLEAN',
+}
+
+
+class RowCountValidator(object):
+    """Compares the Hive and BigQuery tables with one query on each side.
+
+    The row counts of all the partitions are fetched with a single
+    COUNT(*) GROUP BY query over the partition columns of each table, and
+    the two result sets are compared in memory. The values of the partition
+    columns are cast to strings on both sides so that they can be matched
+    regardless of the BigQuery column types. Likewise, the per-column
+    aggregates are fetched with one query on each table. The Hive and
+    BigQuery queries are run concurrently.
+
+    Attributes:
+        bq_component (:class:`BigQueryComponent`): Instance of
+            BigQueryComponent to do BigQuery operations.
+        hive_component (:class:`HiveComponent`): Instance of HiveComponent to
+            connect to Hive.
+        hive_table_model (:class:`HiveTableModel`): Wrapper to Hive table
+            details.
+        bq_table_model (:class:`BigQueryTableModel`): Wrapper to BigQuery
+            table details.
+    """
+
+    def __init__(self, bq_component, hive_component, hive_table_model,
+                 bq_table_model):
+
+        logger.debug("Initializing Row Count Validator")
+        self.bq_component = bq_component
+        self.hive_component = hive_component
+        self.hive_table_model = hive_table_model
+        self.bq_table_model = bq_table_model
+
+    @property
+    def partition_columns(self):
+        return list(self.hive_table_model.partition_info.keys())
+
+    @staticmethod
+    def partition_count_query(table, partition_columns):
+        """Returns the query counting the rows of every partition.
+
+        Args:
+            table (str): Fully qualified table name.
+            partition_columns (List[str]): Partition column names.
+
+        Returns:
+            str: Query that works both in Hive and BigQuery.
+        """
+
+        return "SELECT {0}, COUNT(*) AS n_rows FROM {1} GROUP BY {2}".format(
+            ', '.join('CAST({0} AS STRING) AS {0}'.format(col)
+                      for col in partition_columns),
+            table, ', '.join(partition_columns))
+
+    @staticmethod
+    def partition_clause(partition_columns, values):
+        """Returns the WHERE clause which selects a partition.
+
+        Args:
+            partition_columns (List[str]): Partition column names.
+            values (tuple): Values of the partition columns.
+
+        Returns:
+            str: WHERE clause in the format used by list_partitions.
+        """
+
+        conditions = []
+        for col, value in zip(partition_columns, values):
+            if value is None:
+                conditions.append('{} IS NULL'.format(col))
+            else:
+                conditions.append('{}="{}"'.format(col, value))
+        return 'WHERE ' + ' AND '.join(conditions)
+
+    def run_hive_query(self, query):
+        """Runs a query on Hive and returns the rows as tuples."""
+
+        logger.debug("Running Hive validation query %s", query)
+        return [tuple(row) for row in self.hive_component.execute_query(query)]
+
+    def run_bq_query(self, query):
+        """Runs a query on BigQuery and returns the rows as tuples."""
+
+        logger.debug("Running BigQuery validation query %s", query)
+        results = self.bq_component.client.query(query).result()
+        return [tuple(row.values()) for row in results]
+
+    def run_queries(self, hive_query, bq_query):
+        """Runs the Hive and BigQuery queries concurrently.
+
+        Args:
+            hive_query (str): Query to run on Hive.
+            bq_query (str): Query to run on BigQuery.
+
+        Returns:
+            tuple: Rows returned by Hive and by BigQuery.
+        """
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            hive_future = executor.submit(self.run_hive_query, hive_query)
+            bq_future = executor.submit(self.run_bq_query, bq_query)
+            return hive_future.result(), bq_future.result()
+
+    def get_partition_row_counts(self):
+        """Gets the number of rows of every partition in Hive and BigQuery.
+
+        Returns:
+            tuple: Two dicts, for Hive and BigQuery, mapping the tuple of
+                partition column values to the number of rows.
+        """
+
+        hive_rows, bq_rows = self.run_queries(
+            self.partition_count_query('{}.{}'.format(
+                self.hive_table_model.db_name,
+                self.hive_table_model.table_name), self.partition_columns),
+            self.partition_count_query('{}.{}'.format(
+                self.bq_table_model.dataset_id,
+                self.bq_table_model.table_name), self.partition_columns))
+        hive_counts = {row[:-1]: row[-1] for row in hive_rows}
+        bq_counts = {row[:-1]: row[-1] for row in bq_rows}
+        return hive_counts, bq_counts
+
+    def find_mismatched_partitions(self):
+        """Compares the row counts of every partition.
+
+        Returns:
+            List[dict]: WHERE clause and number of rows in Hive and BigQuery
+                of every partition whose counts do not match. A partition
+                missing on one side has 0 rows there.
+        """
+
+        hive_counts, bq_counts = self.get_partition_row_counts()
+        logger.debug("Compared %s Hive and %s BigQuery partitions",
+                     len(hive_counts), len(bq_counts))
+
+        mismatches = []
+        partitions = set(hive_counts) | set(bq_counts)
+        for values in sorted(partitions, key=lambda item: [
+                (value is None, value) for value in item]):
+            hive_table_rows = hive_counts.get(values, 0)
+            bq_table_rows = bq_counts.get(values, 0)
+            if hive_table_rows != bq_table_rows:
+                mismatches.append({
+                    'clause': self.partition_clause(self.partition_columns,
+                                                    values),
+                    'hive_rows': hive_table_rows,
+                    'bq_rows': bq_table_rows
+                })
+        return mismatches
+
+    def get_comparable_columns(self):
+        """Returns the columns whose aggregates can be compared.
+
+        Returns:
+            List[str]: Names of the top level columns with a primitive data
+                type which is loaded into the matching BigQuery data type.
+        """
+
+        bq_schema = self.bq_table_model.flat_schema
+        columns = []
+        for col, col_type in self.hive_table_model.flat_schema.items():
+            if bq_schema.get(col) == COMPARABLE_TYPES.get(col_type):
+                columns.append(col)
+        return columns
+
+    def get_column_aggregates(self):
+        """Computes the aggregates of the comparable columns on both sides.
+
+        Returns:
+            List[dict]: Rows for the comparison metrics file, one Hive and one
+                BigQuery row per aggregate followed by an "Aggregate Check"
+                row telling whether all the aggregates of every column match.
+                Empty if no column can be compared.
+        """
+
+        flat_schema = self.hive_table_model.flat_schema
+        columns = self.get_comparable_columns()
+        if not columns:
+            logger.debug("No column aggregates to compare")
+            return []
+
+        # Every aggregate of every column is a column of the query.
+        selected = []
+        for function, col_types in COLUMN_AGGREGATES:
+            for col in columns:
+                if flat_schema[col] in col_types:
+                    selected.append((function, col))
+        select_list = ', '.join(
+            'CAST({0}({1}) AS STRING)'.format(function, col)
+            for function, col in selected)
+
+        hive_rows, bq_rows = self.run_queries(
+            'SELECT {} FROM {}.{}'.format(select_list,
+                                          self.hive_table_model.db_name,
+                                          self.hive_table_model.table_name),
+            'SELECT {} FROM {}.{}'.format(select_list,
+                                          self.bq_table_model.dataset_id,
+                                          self.bq_table_model.table_name))
+        hive_values = dict(zip(selected, hive_rows[0]))
+        bq_values = dict(zip(selected, bq_rows[0]))
+
+        metrics_rows = []
+        healths = {
+            'operation': 'Aggregate Check',
+            'table_name': 'NA',
+            'num_cols': 'NA',
+            'schema': {col: 'NA' for col in flat_schema}
+        }
+        for function, _ in COLUMN_AGGREGATES:
+            for operation, table_name, values in [
+                    ('Hive', self.hive_table_model.table_name, hive_values),
+                    ('BigQuery', self.bq_table_model.table_name, bq_values)]:
+                schema = {col: 'NA' for col in flat_schema}
+                for (aggregate, col), value in values.items():
+                    if aggregate == function:
+                        schema[col] = 'NULL' if value is None else str(value)
+                metrics_rows.append({
+                    'operation': '{} {}'.format(operation, function),
+                    'table_name': table_name,
+                    'num_cols': str(len(columns)),
+                    'schema': schema
+                })
+
+        for col in columns:
+            healths['schema'][col] = 'Pass'
+        for key, value in hive_values.items():
+            if value != bq_values[key]:
+                logger.error("%s of column %s not matching in BigQuery and "
+                             "Hive tables", key[0], key[1])
+                healths['schema'][key[1]] = 'Fail'
+        metrics_rows.append(healths)
+        return metrics_rows
@@ -0,0 +1,198 @@
+# Copyright 2019 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to migrate several Hive tables of a database concurrently, sharing
+the connections and clients between the tables."""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+import fnmatch
+import logging
+import queue
+import threading
+import time
+
+import init_script
+from properties_reader import PropertiesReader
+from utilities import calculate_time
+
+logger = logging.getLogger('Hive2BigQuery')
+
+
+class TableMigrationDriver(object):
+    """Migrates Hive tables concurrently, with at most max_tables at a time.
+
+    Every table is migrated in a thread of its own by the same function that
+    migrates a single table, with the properties of the table set in the
+    Properties Reader for that thread. The MySQL connection and the BigQuery
+    and GCS clients are shared by all the tables. A Hive connection can't be
+    shared between threads, so the Hive connections are kept in a pool and
+    every table borrows one for the duration of its migration. The distcp and
+    BigQuery load job slots of the GCS and BigQuery components bound the
+    copies and load jobs across all the tables.
+
+    Attributes:
+        migrate_table (Callable): Function which migrates the table set in
+            the Properties Reader, given the GCS, MySQL, BigQuery and Hive
+            components.
+        gcs_component (:class:`GCSStorageComponent`): Instance of
+            GCSStorageComponent to do GCS operations.
+        mysql_component (:class:`MySQLComponent`): Instance of MySQLComponent
+            to connect to MySQL.
+        bq_component (:class:`BigQueryComponent`): Instance of
+            BigQueryComponent to do BigQuery operations.
+        hive_component (:class:`HiveComponent`): Instance of HiveComponent
+            whose connection parameters are used to connect the table workers.
+        max_tables (int): Maximum number of tables migrated at the same time.
+    """
+
+    def __init__(self, migrate_table, gcs_component, mysql_component,
+                 bq_component, hive_component, max_tables=4):
+
+        logger.debug("Initializing Table Migration Driver")
+        self.migrate_table = migrate_table
+        self.gcs_component = gcs_component
+        self.mysql_component = mysql_component
+        self.bq_component = bq_component
+        self.hive_component = hive_component
+        self.max_tables = max_tables
+        self._idle_hive_components = queue.LifoQueue()
+        self._idle_hive_components.put(hive_component)
+        self._hive_components = []
+        self._hive_components_lock = threading.Lock()
+
+    def resolve_tables(self, database_name, patterns):
+        """Lists the Hive tables matching the given names or patterns.
+
+        Args:
+            database_name (str): Hive database name.
+            patterns (List[str]): Table names or shell-style patterns, such
+                as sales_*.
+
+        Returns:
+            List[str]: Names of the matching tables, in the order of the
+                patterns.
+        """
+
+        results = self.hive_component.execute_query(
+            "SHOW TABLES FROM {}".format(database_name))
+        names = sorted(str(row[0]).lower() for row in results)
+        tables = []
+        for pattern in patterns:
+            matches = fnmatch.filter(names, pattern)
+            if not matches:
+                logger.error("No Hive table matching %s in database %s",
+                             pattern, database_name)
+            for name in matches:
+                if name not in tables:
+                    tables.append(name)
+        return tables
+
+    @contextmanager
+    def borrow_hive_component(self):
+        """Borrows a Hive component from the pool, connecting a new one if
+        all of them are in use.
+
+        Yields:
+            :class:`HiveComponent`: Hive component of the calling thread.
+        """
+
+        try:
+            hive_component = self._idle_hive_components.get_nowait()
+        except queue.Empty:
+            hive_component = type(self.hive_component)(
+                host=self.hive_component.host,
+                port=self.hive_component.port,
+                user=self.hive_component.user,
+                password=self.hive_component.password,
+                database=self.hive_component.database)
+            with self._hive_components_lock:
+                self._hive_components.append(hive_component)
+        try:
+            yield hive_component
+        finally:
+            self._idle_hive_components.put(hive_component)
+
+    def migrate(self, table_name, incremental_col):
+        """Migrates a Hive table in the calling thread.
+
+        Args:
+            table_name (str): Hive table name.
+            incremental_col (str): Incremental column of the table, if any.
+        """
+
+        logger.info("Migrating Hive table {}...".format(table_name))
+        start = time.time()
+        with self.borrow_hive_component() as hive_component:
+            PropertiesReader.set_table_properties(init_script.table_properties(
+                table_name, incremental_col=incremental_col))
+            try:
+                self.migrate_table(self.gcs_component, self.mysql_component,
+                                   self.bq_component, hive_component)
+            finally:
+                PropertiesReader.set_table_properties(None)
+        logger.info("Migrated Hive table {} - Time taken - {}".format(
+            table_name, calculate_time(start, time.time())))
+
+    def run(self, database_name, patterns, incremental_cols,
+            incremental_col=None):
+        """Migrates the Hive tables matching the patterns.
+
+        A failed table doesn't stop the migration of the other tables. Its
+        migration is resumed from the tracking table in the next run, as for
+        a single table.
+
+        Args:
+            database_name (str): Hive database name.
+            patterns (List[str]): Table names or shell-style patterns.
+            incremental_cols (dict): Incremental column of the tables which
+                have one, keyed by table name.
+            incremental_col (str): Incremental column of the other tables,
+                if any.
+
+        Raises:
+            RuntimeError: If no table matches or a table failed to migrate.
+        """
+
+        tables = self.resolve_tables(database_name, patterns)
+        if not tables:
+            raise RuntimeError("No Hive table to migrate")
+        logger.info("Migrating {} Hive tables, {} at a time".format(
+            len(tables), self.max_tables))
+
+        start = time.time()
+        failed_tables = []
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_tables) as executor:
+                futures = dict(
+                    (executor.submit(self.migrate, table_name,
+                                     incremental_cols.get(table_name,
+                                                          incremental_col)),
+                     table_name) for table_name in tables)
+                for future in as_completed(futures):
+                    error = future.exception()
+                    if error:
+                        logger.error("Failed to migrate Hive table %s",
+                                     futures[future], exc_info=error)
+                        failed_tables.append(futures[future])
+        finally:
+            for hive_component in self._hive_components:
+                hive_component.connection.close()
+
+        logger.info("Migrated {} of {} Hive tables - Time taken - {}".format(
+            len(tables) - len(failed_tables), len(tables),
+            calculate_time(start, time.time())))
+        if failed_tables:
+            raise RuntimeError("Failed to migrate Hive tables {}".format(
+                ", ".join(sorted(failed_tables))))
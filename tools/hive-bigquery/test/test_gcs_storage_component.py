@@ -0,0 +1,141 @@
+# Copyright 2019 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the verification of the files copied to GCS by distcp. HDFS is
+stood in for by the local filesystem and GCS by a local directory.
+
+Run from the hive-bigquery directory with:
+
+    python3 -m pytest test/test_gcs_storage_component.py
+"""
+
+from collections import namedtuple
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import gcs_storage_component
+from gcs_storage_component import GCSStorageComponent
+from hdfs_component import LocalFileSystemComponent
+
+Blob = namedtuple('Blob', ['name', 'size'])
+
+
+class FakeGCSClient(object):
+    """Lists the blobs of buckets stored as directories under a root."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def list_blobs(self, bucket_name, prefix=''):
+        bucket_dir = os.path.join(self.root, bucket_name)
+        blobs = []
+        for directory, _, file_names in os.walk(bucket_dir):
+            for file_name in file_names:
+                path = os.path.join(directory, file_name)
+                name = os.path.relpath(path, bucket_dir)
+                if name.startswith(prefix):
+                    blobs.append(Blob(name, os.path.getsize(path)))
+        return blobs
+
+
+class TestStageToGCS(unittest.TestCase):
+
+    def setUp(self):
+        self.hdfs_root = tempfile.mkdtemp()
+        self.gcs_root = tempfile.mkdtemp()
+        with mock.patch.object(GCSStorageComponent, 'get_client',
+                               return_value=FakeGCSClient(self.gcs_root)):
+            self.gcs_component = GCSStorageComponent('project')
+        self.gcs_component.upload_file = mock.MagicMock()
+        self.hdfs_component = LocalFileSystemComponent()
+        self.hive_table_model = mock.MagicMock(
+            db_name='default', table_name='sales',
+            tracking_table_name='sales_tracking')
+        self.mysql_component = mock.MagicMock()
+        # Source paths of the files that distcp copies only partially.
+        self.truncated = set()
+        # Source paths of the files deleted from HDFS after the copy.
+        self.deleted = set()
+
+    def tearDown(self):
+        shutil.rmtree(self.hdfs_root)
+        shutil.rmtree(self.gcs_root)
+
+    def write_hdfs_file(self, file_name, content):
+        path = os.path.join(self.hdfs_root, file_name)
+        with open(path, 'w') as data_file:
+            data_file.write(content)
+        return path
+
+    def distcp(self, cmd):
+        """Copies the source files into the local GCS directory."""
+        target_dir = os.path.join(self.gcs_root,
+                                  cmd[-1][len('gs://'):])
+        os.makedirs(target_dir, exist_ok=True)
+        for source_path in cmd[2:-1]:
+            target_path = os.path.join(target_dir,
+                                       os.path.basename(source_path))
+            shutil.copyfile(source_path, target_path)
+            if source_path in self.truncated:
+                with open(target_path, 'r+') as target_file:
+                    target_file.truncate(1)
+            if source_path in self.deleted:
+                os.remove(source_path)
+
+    def stage_to_gcs(self, rows):
+        """Stages the tracked files and returns the source paths of the files
+        which are marked as copied."""
+        self.mysql_component.execute_query.side_effect = [rows, []]
+        with mock.patch.object(gcs_storage_component, 'get_hdfs_component',
+                               return_value=self.hdfs_component), \
+                mock.patch.object(gcs_storage_component, 'execute_command',
+                                  side_effect=self.distcp):
+            self.gcs_component.stage_to_gcs(
+                self.mysql_component, None, self.hive_table_model, None,
+                'bucket', load_to_bq=False)
+        copied_files = self.mysql_component.execute_many.call_args[0][1]
+        for target_location, source_location in copied_files:
+            self.assertTrue(target_location.startswith(
+                'gs://bucket/BQ_staging/default/sales/'))
+            self.assertTrue(target_location.endswith(
+                os.path.basename(source_location)))
+        return sorted(source for _, source in copied_files)
+
+    def test_compares_tracked_sizes(self):
+        matching = self.write_hdfs_file('000000_0', 'abcdef')
+        mismatching = self.write_hdfs_file('000001_0', 'abcdef')
+        self.truncated.add(mismatching)
+        with mock.patch.object(self.hdfs_component, 'list_files') as \
+                list_files:
+            copied = self.stage_to_gcs([('sales', matching, 6),
+                                        ('sales', mismatching, 6)])
+        self.assertEqual(copied, [matching])
+        # The tracked sizes are used instead of listing HDFS again.
+        list_files.assert_not_called()
+
+    def test_lists_untracked_sizes(self):
+        listed = self.write_hdfs_file('000000_0', 'abcdef')
+        deleted = self.write_hdfs_file('000001_0', 'abcdef')
+        self.deleted.add(deleted)
+        copied = self.stage_to_gcs([('sales', listed, None),
+                                    ('sales', deleted, None)])
+        # The size of the deleted file is unknown so its copy isn't trusted.
+        self.assertEqual(copied, [listed])
+
+
+if __name__ == '__main__':
+    unittest.main()
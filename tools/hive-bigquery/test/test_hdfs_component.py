@@ -0,0 +1,71 @@
+# Copyright 2019 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the listing of the data files of Hive tables, using the local
+filesystem as a stand-in for HDFS.
+
+Run from the hive-bigquery directory with:
+
+    python3 -m pytest test/test_hdfs_component.py
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from hdfs_component import HDFSFile, LocalFileSystemComponent
+
+
+class TestLocalFileSystemComponent(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.location = 'file://' + self.root
+        self.hdfs_component = LocalFileSystemComponent()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write_file(self, relative_path, content):
+        path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as data_file:
+            data_file.write(content)
+
+    def test_list_files(self):
+        self.write_file('000000_0', 'abc')
+        self.write_file('year=2019/000000_0', 'abcdef')
+        self.assertEqual(
+            sorted(self.hdfs_component.list_files(self.location)),
+            [HDFSFile(self.location + '/000000_0', 3),
+             HDFSFile(self.location + '/year=2019/000000_0', 6)])
+
+    def test_list_data_files(self):
+        self.write_file('000000_0', 'abc')
+        self.write_file('year=2019/000001_0', 'abcdef')
+        # Empty files and the files Hive doesn't read are filtered out.
+        self.write_file('000002_0', '')
+        self.write_file('_SUCCESS', 'abc')
+        self.write_file('.000000_0.crc', 'abc')
+        self.write_file('_temporary/000003_0', 'abc')
+        self.write_file('.hive-staging/000004_0', 'abc')
+        self.assertEqual(
+            sorted(self.hdfs_component.list_data_files(self.location + '/')),
+            [HDFSFile(self.location + '/000000_0', 3),
+             HDFSFile(self.location + '/year=2019/000001_0', 6)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+# Copyright 2019 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the validation of the input configuration file.
+
+Run from the hive-bigquery directory with:
+
+    python3 -m pytest test/test_init_script.py
+"""
+
+import copy
+import json
+import os
+import unittest
+
+from google.api_core import exceptions
+
+import init_script
+
+TEST_CONFIG = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'test_config.json')
+
+
+class TestInitScript(unittest.TestCase):
+
+    def setUp(self):
+        with open(TEST_CONFIG) as config_json:
+            self.data = json.load(config_json)
+        self.data['Tracking_DB']['password_file_path'] = \
+            'gs://bucket/password.enc'
+
+    def test_table_properties(self):
+        properties = init_script.table_properties('Sales', incremental_col='id')
+        self.assertEqual(properties['hive_table_name'], 'sales')
+        self.assertEqual(properties['bq_table'], 'sales')
+        self.assertEqual(properties['incremental_col'], 'id')
+        self.assertTrue(
+            properties['hive_bq_comparison_table'].startswith('sales_'))
+        self.assertEqual(
+            init_script.table_properties('sales', 'sales_bq')['bq_table'],
+            'sales_bq')
+        with self.assertRaises(exceptions.BadRequest):
+            init_script.table_properties('sales', 'sales-bq')
+
+    def test_single_table_config(self):
+        self.data['Hive']['table'] = 'Text_NonPartitioned'
+        config = init_script.validate_config_parameters(self.data)
+        self.assertEqual(config['hive_table_name'], 'text_nonpartitioned')
+        self.assertEqual(config['bq_table'], 'text_nonpartitioned')
+        self.assertEqual(config['incremental_col'], 'int_column')
+        self.assertIsNone(config['hive_table_patterns'])
+        self.assertEqual(config['incremental_cols'], {})
+
+    def test_multi_table_config(self):
+        self.data['Hive']['table'] = ['Sales_*', 'orders']
+        self.data['Hive']['incremental_col'] = {'Orders': 'order_id'}
+        config = init_script.validate_config_parameters(self.data)
+        self.assertEqual(config['hive_table_patterns'], ['sales_*', 'orders'])
+        self.assertEqual(config['incremental_cols'], {'orders': 'order_id'})
+        self.assertIsNone(config['hive_table_name'])
+        self.assertIsNone(config['bq_table'])
+        self.assertIsNone(config['incremental_col'])
+
+        data = copy.deepcopy(self.data)
+        data['BigQuery']['table'] = 'sales'
+        with self.assertRaises(ValueError):
+            init_script.validate_config_parameters(data)
+
+
+if __name__ == '__main__':
+    unittest.main()
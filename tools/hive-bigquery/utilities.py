@@ -14,6 +14,7 @@
 
 """Provides utility functions to other modules."""
 
+from contextlib import contextmanager
 import logging
 import subprocess
 
@@ -50,6 +51,23 @@ def calculate_time(start, end):
     return output
 
 
+@contextmanager
+def acquire_slot(semaphore):
+    """Holds a slot of the semaphore, if any, for the duration of the with
+    block.
+
+    Args:
+        semaphore (threading.Semaphore): Semaphore bounding the use of a
+            shared resource, or None if it is unbounded.
+    """
+
+    if semaphore is None:
+        yield
+        return
+    with semaphore:
+        yield
+
+
 def execute_command(cmd):
     """Executes system command using subprocess module and logs the stdout
     and stderr.